@@ -3,28 +3,29 @@
 
 import tempfile
 import os
-from typing import List
+import shutil
+from time import perf_counter
+from typing import List, Dict, Any, Optional
 from fastapi import APIRouter, File, UploadFile, HTTPException, Depends
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
-from app.services.document_processor import DocumentProcessor
-from app.services.vector_store import VECTOR_STORE
+from app.services.retrieval import RetrievalEngine, RETRIEVAL_ENGINE
+from app.services.ingestion_jobs import INGESTION_JOBS, PersistSink
 from app.services.db_utils import get_engine, ensure_documents_table, insert_documents, ensure_employees_table, insert_employees
+from app.services.cache import QUERY_CACHE, DOCS_VERSION, connection_fingerprint, table_version_name
 from app.api.routes import schema as schema_route
-from app.api.routes.schema import get_query_engine_instance
 
 router = APIRouter()
 
-try:
-    GLOBAL_DP = DocumentProcessor()
-except Exception as e:
-    print(f"CRITICAL: Failed to initialize DocumentProcessor: {e}")
-    GLOBAL_DP = None
+# uploads are copied to disk this many bytes at a time, never read whole into memory
+UPLOAD_COPY_CHUNK_BYTES = int(os.getenv("UPLOAD_COPY_CHUNK_BYTES", str(1 << 20)))
 
-def get_document_processor() -> DocumentProcessor:
-    if GLOBAL_DP is None:
-        raise HTTPException(status_code=500, detail="Document processor not initialized.")
-    return GLOBAL_DP
+def get_retrieval_engine() -> RetrievalEngine:
+    # shared with QueryEngine so both see the same index and embedding model
+    if RETRIEVAL_ENGINE is None:
+        raise HTTPException(status_code=500, detail="Retrieval engine not initialized.")
+    return RETRIEVAL_ENGINE
 
 class DatabaseConnectRequest(BaseModel):
     connection_string: str
@@ -34,87 +35,137 @@ async def connect_database(request: DatabaseConnectRequest):
     # legacy: keep for compatibility
     return {"status": "ok", "connection_string": request.connection_string}
 
-@router.post("/upload-documents")
+def _write_stats(rows: int, inserted: int, seconds: float) -> Dict[str, Any]:
+    return {
+        "rows": rows,
+        "inserted": inserted,
+        "duration_ms": round(seconds * 1000, 2),
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+    }
+
+class DatabaseSink(PersistSink):
+    """
+    Final ingestion stage: each indexed batch's chunks/rows are written to the
+    connected DB as it arrives; finish() invalidates caches and refreshes the schema.
+    """
+    def __init__(self):
+        self.resolved = False
+        self.database_url: Optional[str] = None
+        self.connected: Optional[str] = None
+        self.writes: Dict[str, List[float]] = {}  # table -> [rows, inserted, seconds]
+        self.employees_ready = False
+
+    def _resolve(self):
+        # Persist raw chunks into documents table if DB connected (DATABASE_URL or last connection)
+        self.connected = schema_route.active_connection_string()
+        self.database_url = os.getenv("DATABASE_URL") or self.connected
+        self.resolved = True
+        if self.database_url:
+            ensure_documents_table(get_engine(self.database_url))
+
+    def _record(self, table: str, rows: int, inserted: int, seconds: float):
+        totals = self.writes.setdefault(table, [0, 0, 0.0])
+        totals[0] += rows
+        totals[1] += inserted
+        totals[2] += seconds
+        if inserted:
+            QUERY_CACHE.bump(table_version_name(connection_fingerprint(self.database_url), table))
+
+    def write(self, chunks: List[Dict[str, Any]], extracted_rows: List[Dict[str, Any]]):
+        if chunks:
+            # doc-search results cached before these chunks were indexed are now stale
+            QUERY_CACHE.bump(DOCS_VERSION)
+        if not self.resolved:
+            self._resolve()
+        if not self.database_url:
+            return
+        engine = get_engine(self.database_url)
+        # only this job's new chunks; the documents table dedupes on (source, content hash)
+        start = perf_counter()
+        self._record("documents", len(chunks), insert_documents(engine, chunks), perf_counter() - start)
+        if extracted_rows:
+            # ensure employees table exists then insert extracted rows
+            if not self.employees_ready:
+                ensure_employees_table(engine)
+                self.employees_ready = True
+            start = perf_counter()
+            self._record("employees", len(extracted_rows), insert_employees(engine, extracted_rows),
+                         perf_counter() - start)
+
+    def finish(self) -> Dict[str, Any]:
+        # refresh the cached schema so the UI and query engine see the new rows/tables;
+        # only changed tables are re-inspected and the live QueryEngine keeps its cache
+        written = [t for t, (_, inserted, _) in self.writes.items() if inserted]
+        schema_refresh = None
+        if written and self.database_url == self.connected:
+            try:
+                schema_refresh = schema_route.refresh_schema(resample=written)
+            except Exception as e:
+                print(f"[Ingestion] Schema refresh failed: {e}")
+        return {
+            "inserted_documents": int(self.writes.get("documents", [0, 0])[1]),
+            "inserted_structured_rows": int(self.writes.get("employees", [0, 0])[1]),
+            "db_writes": {t: _write_stats(int(rows), int(inserted), seconds)
+                          for t, (rows, inserted, seconds) in self.writes.items()},
+            "schema_refresh": schema_refresh,
+        }
+
+@router.post("/upload-documents", status_code=202)
 async def upload_documents(
     files: List[UploadFile] = File(...),
-    dp: DocumentProcessor = Depends(get_document_processor)
+    wait: bool = False,
+    retrieval: RetrievalEngine = Depends(get_retrieval_engine)
 ):
+    """
+    Save the uploads and queue an ingestion job; returns the job id immediately.
+    Poll /api/ingestion-jobs/{job_id} for per-stage progress, or pass ?wait=true
+    to block until the job finishes.
+    """
     saved_paths: List[str] = []
     try:
         for f in files:
             suffix = os.path.splitext(f.filename)[1]
             tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-            content = await f.read()
-            tmp_file.write(content)
-            tmp_file.close()
             saved_paths.append(tmp_file.name)
+            try:
+                await run_in_threadpool(shutil.copyfileobj, f.file, tmp_file, UPLOAD_COPY_CHUNK_BYTES)
+            finally:
+                tmp_file.close()
+                await f.close()
 
-        # process -> chunk ids and structured rows
-        chunk_ids, extracted_rows = dp.process_documents(saved_paths)
-
-        # Add chunks to Chroma (persistent)
-        # Build texts, metadatas, ids from dp.chunks_metadata for newly added chunks
-        # dp.process_documents appended new_chunks_metadata to dp.chunks_metadata in order; we'll map by chunk_ids
-        id_to_chunk = {c["chunk_id"]: c for c in dp.chunks_metadata}
-        new_texts = []
-        new_metas = []
-        new_ids = []
-        for cid in chunk_ids:
-            c = id_to_chunk.get(cid)
-            if c:
-                new_ids.append(cid)
-                new_texts.append(c["text"])
-                new_metas.append({"source": c.get("source", "")})
-
-        added = 0
-        if new_texts:
-            added = VECTOR_STORE.add_documents(new_ids, new_texts, new_metas)
-
-        # Persist raw chunks into documents table if DB connected (DATABASE_URL or last connection)
-        DATABASE_URL = os.getenv("DATABASE_URL") or getattr(schema_route, "_LAST_CONNECTION_STRING", None)
-        inserted_docs = 0
-        inserted_emp = 0
-        if DATABASE_URL:
-            engine = get_engine(DATABASE_URL)
-            ensure_documents_table(engine)
-            inserted_docs = insert_documents(engine, dp.chunks_metadata or [])
-
-            # ensure employees table exists then insert extracted rows
-            if extracted_rows:
-                ensure_employees_table(engine)
-                inserted_emp = insert_employees(engine, extracted_rows)
-                # after inserting structured rows, refresh schema cache so UI sees new rows/tables
-                try:
-                    get_query_engine_instance(reset=True)
-                    sd = schema_route.SchemaDiscovery(DATABASE_URL)
-                    schema_route._LAST_SCHEMA_CACHE = sd.analyze_database()
-                    # reset QueryEngine instance so it picks up new schema (if present)
-                    # from app.api.routes.schema import _QUERY_ENGINE_INSTANCE
-                    # if _QUERY_ENGINE_INSTANCE:
-                    #     # Re-initialize QueryEngine with refreshed schema (simple approach)
-                    #     _QUERY_ENGINE_INSTANCE = None
-                except Exception as e:
-                    print(f"[Ingestion] Schema refresh failed: {e}")
-
-        return {
-            "status": "ok",
-            "filenames": [f.filename for f in files],
-            "processed_chunks": len(chunk_ids),
-            "chroma_added": added,
-            "inserted_documents": inserted_docs,
-            "inserted_structured_rows": inserted_emp
-        }
-
+        # the job owns (and deletes) the temp files from here on
+        job = INGESTION_JOBS.submit(saved_paths, [f.filename for f in files], persist=DatabaseSink())
     except Exception as e:
         print(f"Ingestion error: {e}")
-        raise HTTPException(status_code=500, detail=f"Document ingestion failed: {str(e)}")
-
-    finally:
         for path in saved_paths:
             try:
                 if os.path.exists(path):
                     os.remove(path)
             except Exception as cleanup_err:
                 print(f"[Ingestion] Cleanup warning: {cleanup_err}")
+        raise HTTPException(status_code=500, detail=f"Document ingestion failed: {str(e)}")
 
-
+    if wait:
+        await job.task
+        if job.status == "failed":
+            raise HTTPException(status_code=500, detail=f"Document ingestion failed: {job.error}")
+        return job.to_dict()
+
+    return {
+        "status": "accepted",
+        "job_id": job.id,
+        "filenames": job.filenames,
+        "status_url": f"/api/ingestion-jobs/{job.id}",
+    }
+
+@router.get("/ingestion-jobs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    # jobs run by other workers are read from the shared job store
+    status = await run_in_threadpool(INGESTION_JOBS.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown ingestion job.")
+    return status
+
+@router.get("/ingestion-jobs")
+async def list_ingestion_jobs():
+    return {"jobs": await run_in_threadpool(INGESTION_JOBS.recent)}
@@ -2,13 +2,17 @@
 # backend/app/api/routes/query.py
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Literal, Optional, Union
 from time import time
-from sqlalchemy import text
+import json
+from starlette.concurrency import run_in_threadpool
 from app.api.routes.schema import get_query_engine
+from app.api.routes.ingestion import get_retrieval_engine
 from app.services.query_engine import QueryEngine
-from app.services.vector_store import VECTOR_STORE
+from app.services.retrieval import RetrievalEngine
+from app.services.search_filter import ChunkFilter
 import os
 import google.generativeai as genai
 import os
@@ -22,10 +26,51 @@ if GEMINI_KEY:
 
 router = APIRouter()
 
+# largest number of queries accepted by /query/batch
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "100"))
+
+# accepted retrieval_mode values (anything else is rejected with a 422)
+RetrievalMode = Literal["hybrid", "dense", "lexical"]
+
 class QueryRequest(BaseModel):
     query: str
     limit: int = 50
     offset: int = 0
+    # per-request ANN tuning (ignored by index types that don't use them)
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    # "hybrid" (dense + BM25), "dense" or "lexical"; defaults to RETRIEVAL_MODE
+    retrieval_mode: Optional[RetrievalMode] = None
+    # keyset cursor for list queries: sql_page.next_after of the previous page (replaces offset)
+    after: Optional[Union[int, str]] = None
+
+class StreamQueryRequest(BaseModel):
+    query: str
+    # None streams every row
+    limit: Optional[int] = None
+    offset: int = 0
+    after: Optional[Union[int, str]] = None
+
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    limit: int = 50
+    offset: int = 0
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    retrieval_mode: Optional[RetrievalMode] = None
+
+class SearchRequest(BaseModel):
+    queries: List[str]
+    top_k: int = 5
+    # metadata filters pushed down into the index; fields left empty match everything
+    sources: Optional[List[str]] = None
+    doc_types: Optional[List[str]] = None
+    # ISO dates/datetimes; ingested_after is inclusive, ingested_before exclusive
+    ingested_after: Optional[str] = None
+    ingested_before: Optional[str] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    retrieval_mode: Optional[RetrievalMode] = None
 
 # def synthesize_with_gemini(question: str, snippets: list) -> str:
 #     """
@@ -68,49 +113,79 @@ router = APIRouter()
 @router.post("/query")
 async def process_user_query(req: QueryRequest, qe: QueryEngine = Depends(get_query_engine)) -> Dict[str, Any]:
     start = time()
-    cache_key = f"{req.query}|{req.limit}|{req.offset}"
-    # check cache
-    cached = qe.cache.get(cache_key)
-    if cached:
-        cached["cache_status"] = "HIT"
-        cached["execution_time_ms"] = round((time() - start) * 1000, 2)
-        return {"status": "ok", "results": cached}
-
-    results: Dict[str, Any] = {"query": req.query}
-    qtype = qe.classify_query(req.query)
-    results["query_type"] = qtype
-
-    # SQL
-    if qtype in ("sql", "hybrid"):
-        sql, params = qe.generate_sql(req.query, req.limit, req.offset)
-        if sql:
-            try:
-                sql_start = time()
-                with qe.engine.connect() as conn:
-                    # pass params as dict to execute
-                    res = conn.execute(text(sql), params)
-                    rows = [dict(r) for r in res.mappings()]
-                results["sql_results"] = rows
-                results["sql_time_ms"] = round((time() - sql_start) * 1000, 2)
-            except Exception as e:
-                results["sql_error"] = str(e)
-
-    # Document (Chroma) retrieval
-    if qtype in ("doc", "hybrid"):
-        doc_start = time()
-        docs = VECTOR_STORE.query(req.query, top_k=min(5, req.limit))
-        results["doc_time_ms"] = round((time() - doc_start) * 1000, 2)
-        results["doc_results"] = docs
+    # SQL (async engine) and document retrieval run concurrently for hybrid queries
+    results = await qe.aprocess_query(req.query, req.limit, req.offset,
+                                      nprobe=req.nprobe, ef_search=req.ef_search,
+                                      retrieval_mode=req.retrieval_mode, after=req.after)
+    docs = results.get("doc_results")
+    if docs:
         # optionally synthesize with Gemini
-        if docs:
-            synth = synthesize_with_gemini(req.query, docs)
-            results["doc_answer"] = synth
-
+        results["doc_answer"] = synthesize_with_gemini(req.query, docs)
     results["execution_time_ms"] = round((time() - start) * 1000, 2)
-    # cache store
-    qe.cache.set(cache_key, results)
-    results["cache_status"] = "MISS"
-    results["cache_stats"] = qe.cache.get_stats()
-
     return {"status": "ok", "results": results}
 
+@router.post("/query/stream")
+async def stream_user_query(req: StreamQueryRequest, qe: QueryEngine = Depends(get_query_engine)) -> StreamingResponse:
+    """
+    SQL results as NDJSON, read from a server-side cursor a batch at a time so
+    memory stays constant however many rows match. Lines: {"type":"columns"},
+    then {"type":"rows"} batches of value lists, then {"type":"end"} (or "error").
+    """
+    sql, params = qe.generate_sql(req.query, req.limit, req.offset, after=req.after, stream=True)
+    if sql is None:
+        raise HTTPException(status_code=404, detail="No table to query.")
+
+    async def lines():
+        start = time()
+        count = 0
+        columns_sent = False
+        try:
+            async for columns, rows in qe.astream_sql(sql, params):
+                if not columns_sent:
+                    yield json.dumps({"type": "columns", "query": req.query, "columns": columns}) + "\n"
+                    columns_sent = True
+                if rows:
+                    count += len(rows)
+                    yield json.dumps({"type": "rows", "rows": rows}, default=str) + "\n"
+        except Exception as e:
+            print(f"SQL Execution Error: {e}")
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+            return
+        yield json.dumps({"type": "end", "rows": count, "execution_time_ms": round((time() - start) * 1000, 2)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/query/batch")
+async def process_user_queries(req: BatchQueryRequest, qe: QueryEngine = Depends(get_query_engine)) -> Dict[str, Any]:
+    """Answer a list of queries in one call (shared embedding pass, duplicate SQL run once)."""
+    if not req.queries:
+        raise HTTPException(status_code=400, detail="No queries given.")
+    if len(req.queries) > QUERY_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {QUERY_BATCH_MAX} queries per batch.")
+    start = time()
+    batch = await run_in_threadpool(qe.process_queries, req.queries, req.limit, req.offset,
+                                    req.nprobe, req.ef_search, req.retrieval_mode)
+    for query, results in zip(req.queries, batch["results"]):
+        docs = results.get("doc_results")
+        if docs:
+            results["doc_answer"] = synthesize_with_gemini(query, docs)
+    batch["execution_time_ms"] = round((time() - start) * 1000, 2)
+    return {"status": "ok", **batch}
+
+@router.post("/search")
+async def search_documents(req: SearchRequest, retrieval: RetrievalEngine = Depends(get_retrieval_engine)) -> Dict[str, Any]:
+    """Document search only: a batch of queries under metadata filters, answered as compact arrays."""
+    if not req.queries:
+        raise HTTPException(status_code=400, detail="No queries given.")
+    if len(req.queries) > QUERY_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {QUERY_BATCH_MAX} queries per batch.")
+    if req.top_k <= 0:
+        raise HTTPException(status_code=400, detail="top_k must be positive.")
+    try:
+        filters = ChunkFilter(sources=req.sources, doc_types=req.doc_types,
+                              ingested_after=req.ingested_after, ingested_before=req.ingested_before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    results = await run_in_threadpool(retrieval.search_batch, req.queries, req.top_k, req.nprobe,
+                                      req.ef_search, req.retrieval_mode, filters)
+    return {"status": "ok", **results}
@@ -1,11 +1,19 @@
 # backend/app/api/routes/schema.py
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
-
-from app.services.schema_discovery import SchemaDiscovery
+from typing import Dict, Any, Optional, List
+from time import perf_counter
+import os
+import time
+import threading
+
+from app.services.schema_discovery import SchemaDiscovery, schema_fingerprint
+from app.services.column_index import ColumnIndex
 from app.services.query_engine import QueryEngine
 from app.services.db_utils import get_engine, ensure_employees_table  # New import
+from app.services.engine_registry import ENGINE_REGISTRY
+from app.services.schema_store import SCHEMA_STORE
+from app.services.cache import connection_fingerprint
 
 router = APIRouter()
 
@@ -16,25 +24,129 @@ _LAST_SCHEMA_CACHE: Dict[str, Any] = {}
 _LAST_CONNECTION_STRING: str = ""
 _QUERY_ENGINE_INSTANCE: Optional[QueryEngine] = None
 
-def get_query_engine_instance(reset: bool = False) -> QueryEngine:
+# how often a worker checks whether another worker switched the active connection
+SCHEMA_ACTIVE_CHECK_SECONDS = float(os.getenv("SCHEMA_ACTIVE_CHECK_SECONDS", "2"))
+_STATE_LOCK = threading.RLock()
+_ACTIVE_CHECKED_AT = 0.0
+
+
+def _snapshot(schema: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Returns the active QueryEngine.
-    If reset=True, re-initializes it using the last connection string and schema.
+    What gets persisted per connection: the schema (with its inferences and
+    catalog signatures) and the precomputed column index.
     """
-    global _QUERY_ENGINE_INSTANCE, _LAST_CONNECTION_STRING, _LAST_SCHEMA_CACHE
+    engine = _QUERY_ENGINE_INSTANCE
+    if engine is not None and engine.column_index.version == schema_fingerprint(schema):
+        column_index = engine.column_index
+    else:
+        column_index = ColumnIndex(schema)
+    return {"schema": schema, "column_index": column_index}
+
+
+def _save_snapshot(connection_string: str, schema: Dict[str, Any], active: bool = False):
+    try:
+        SCHEMA_STORE.save(connection_string, _snapshot(schema))
+        if active:
+            SCHEMA_STORE.set_active(connection_string)
+    except Exception as e:
+        print(f"[Schema] Saving schema snapshot failed: {e}")
+
 
-    if reset or _QUERY_ENGINE_INSTANCE is None:
+def _activate(connection_string: str, schema: Dict[str, Any], column_index: Optional[ColumnIndex] = None):
+    """Make connection_string/schema the worker's live state, reusing the QueryEngine when possible."""
+    global _LAST_SCHEMA_CACHE, _LAST_CONNECTION_STRING, _QUERY_ENGINE_INSTANCE
+    with _STATE_LOCK:
+        if _LAST_CONNECTION_STRING and _LAST_CONNECTION_STRING != connection_string:
+            # switching databases: close the previous pool instead of leaking it
+            ENGINE_REGISTRY.dispose(_LAST_CONNECTION_STRING)
+            _QUERY_ENGINE_INSTANCE = None
+        _LAST_SCHEMA_CACHE = schema
+        _LAST_CONNECTION_STRING = connection_string
+        if _QUERY_ENGINE_INSTANCE is not None:
+            _QUERY_ENGINE_INSTANCE.update_schema(schema, column_index)
+        else:
+            _QUERY_ENGINE_INSTANCE = QueryEngine(connection_string, schema, column_index)
+
+
+def warm_start() -> bool:
+    """
+    Serve from the persisted snapshot of the active connection (no catalog
+    queries), then validate it against the live database in the background.
+    """
+    try:
+        loaded = SCHEMA_STORE.load_active()
+    except Exception as e:
+        print(f"[Schema] Reading schema snapshot failed: {e}")
+        return False
+    if loaded is None or not loaded[1].get("schema"):
+        return False
+    connection_string, snapshot = loaded
+    start = perf_counter()
+    _activate(connection_string, snapshot["schema"], snapshot.get("column_index"))
+    print(f"[Schema] Warm start from snapshot {connection_fingerprint(connection_string)} "
+          f"in {round((perf_counter() - start) * 1000, 2)} ms")
+    validate_in_background()
+    return True
+
+
+def validate_in_background():
+    def run():
+        try:
+            refresh_schema()
+        except Exception as e:
+            print(f"[Schema] Background schema validation failed: {e}")
+    threading.Thread(target=run, daemon=True, name="schema-validate").start()
+
+
+def sync_with_store():
+    """Pick up the active connection persisted by any worker (throttled)."""
+    global _ACTIVE_CHECKED_AT
+    now = time.monotonic()
+    if _QUERY_ENGINE_INSTANCE is not None and now - _ACTIVE_CHECKED_AT < SCHEMA_ACTIVE_CHECK_SECONDS:
+        return
+    _ACTIVE_CHECKED_AT = now
+    try:
+        active = SCHEMA_STORE.active_fingerprint()
+    except Exception as e:
+        print(f"[Schema] Reading schema snapshot failed: {e}")
+        return
+    if active is None:
+        return
+    if _LAST_CONNECTION_STRING and active == connection_fingerprint(_LAST_CONNECTION_STRING):
+        return
+    warm_start()
+
+
+def active_connection_string() -> str:
+    sync_with_store()
+    return _LAST_CONNECTION_STRING
+
+
+def refresh_schema(resample: List[str] = ()) -> Dict[str, Any]:
+    """
+    Incrementally refresh the cached schema of the connected database and push it
+    into the live QueryEngine. resample lists tables whose sample rows should be
+    re-read even if their structure didn't change (e.g. tables just written to).
+    """
+    global _LAST_SCHEMA_CACHE
+    with _STATE_LOCK:
         if not _LAST_CONNECTION_STRING:
-            raise HTTPException(status_code=404, detail="No database connected yet.")
-        # Re-analyze schema
+            return {"mode": "none"}
+        start = perf_counter()
         sd = SchemaDiscovery(_LAST_CONNECTION_STRING)
-        _LAST_SCHEMA_CACHE = sd.analyze_database()
-        # Re-initialize engine
-        _QUERY_ENGINE_INSTANCE = QueryEngine(_LAST_CONNECTION_STRING, _LAST_SCHEMA_CACHE)
-    return _QUERY_ENGINE_INSTANCE
+        schema, summary = sd.refresh(_LAST_SCHEMA_CACHE, resample=list(resample))
+        _LAST_SCHEMA_CACHE = schema
+        if _QUERY_ENGINE_INSTANCE is not None:
+            _QUERY_ENGINE_INSTANCE.update_schema(schema)
+        if not summary.get("unchanged"):
+            _save_snapshot(_LAST_CONNECTION_STRING, schema)
+    summary["duration_ms"] = round((perf_counter() - start) * 1000, 2)
+    print(f"[Schema] Refreshed schema: {summary}")
+    return summary
 
 
 def get_query_engine() -> QueryEngine:
+    sync_with_store()
     if _QUERY_ENGINE_INSTANCE is None:
         raise HTTPException(
             status_code=404,
@@ -44,27 +156,29 @@ def get_query_engine() -> QueryEngine:
 
 @router.post("/connect-database")
 async def connect_database(req: ConnectRequest):
-    global _LAST_SCHEMA_CACHE, _LAST_CONNECTION_STRING, _QUERY_ENGINE_INSTANCE
-
     try:
         # Step 0: Ensure employees table exists
         engine = get_engine(req.connection_string)
         ensure_employees_table(engine)
 
-        # Step 1: Analyze Schema
+        # Step 1: Analyze Schema (a persisted snapshot only needs its changed tables re-inspected)
         sd = SchemaDiscovery(req.connection_string)
-        schema = sd.analyze_database()
-
-        # Step 2: Cache results
-        _LAST_SCHEMA_CACHE = schema
-        _LAST_CONNECTION_STRING = req.connection_string
-
-        # Step 3: Initialize QueryEngine
-        _QUERY_ENGINE_INSTANCE = QueryEngine(req.connection_string, schema)
+        snapshot = SCHEMA_STORE.load(req.connection_string)
+        if snapshot and snapshot.get("schema"):
+            schema, _ = sd.refresh(snapshot["schema"])
+            schema_source = "snapshot"
+        else:
+            schema = sd.analyze_database()
+            schema_source = "discovered"
+
+        # Step 2 + 3: Cache results and initialize QueryEngine; persist for other workers/restarts
+        _activate(req.connection_string, schema)
+        _save_snapshot(req.connection_string, schema, active=True)
 
         return {
             "status": "ok",
             "message": "Database connected, schema discovered, and query engine initialized.",
+            "schema_source": schema_source,
             "schema": schema,
         }
 
@@ -75,7 +189,9 @@ async def connect_database(req: ConnectRequest):
         )
 
 @router.get("/get-schema")
-async def get_schema():
+def get_schema():
+    # plain def: FastAPI runs it in the threadpool, so the snapshot-store read never blocks the event loop
+    sync_with_store()
     if not _LAST_SCHEMA_CACHE:
         raise HTTPException(status_code=404, detail="No schema found. Connect to a database first.")
     return {"schema": _LAST_SCHEMA_CACHE}
@@ -0,0 +1,52 @@
+# backend/app/api/routes/stats.py
+
+from fastapi import APIRouter, Query
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Any
+import os
+
+from app.services.embedding_service import EMBEDDING_SERVICE
+from app.services.embedding_batcher import EMBEDDING_BATCHER
+from app.services.document_processor import DOCUMENT_PROCESSOR
+from app.services.retrieval import RETRIEVAL_ENGINE
+from app.services.engine_registry import ENGINE_REGISTRY
+
+# largest k the index reports accept
+INDEX_REPORT_MAX_K = int(os.getenv("INDEX_REPORT_MAX_K", "100"))
+# largest query sample the index reports accept (each query also runs an exact flat search)
+INDEX_REPORT_MAX_QUERIES = int(os.getenv("INDEX_REPORT_MAX_QUERIES", "1000"))
+
+router = APIRouter()
+
+@router.get("/stats/embeddings")
+async def embedding_stats() -> Dict[str, Any]:
+    """Load time and memory footprint of the shared embedding model, plus batcher metrics."""
+    return {
+        "status": "ok",
+        "embeddings": EMBEDDING_SERVICE.get_stats(),
+        "batcher": EMBEDDING_BATCHER.get_stats(),
+    }
+
+@router.get("/stats/index")
+async def index_stats() -> Dict[str, Any]:
+    """Active retrieval backend; for FAISS, index type, size and background rebuild status."""
+    return {"status": "ok", "index": await run_in_threadpool(RETRIEVAL_ENGINE.get_stats)}
+
+@router.get("/stats/index/recall-report")
+async def index_recall_report(k: int = Query(10, ge=1, le=INDEX_REPORT_MAX_K),
+                              queries: int = Query(200, ge=1, le=INDEX_REPORT_MAX_QUERIES)) -> Dict[str, Any]:
+    """recall@k vs latency of the live FAISS index against exact flat search."""
+    report = await run_in_threadpool(DOCUMENT_PROCESSOR.recall_report, k, queries)
+    return {"status": "ok", "report": report}
+
+@router.get("/stats/index/precision-report")
+async def index_precision_report(k: int = Query(10, ge=1, le=INDEX_REPORT_MAX_K),
+                                 queries: int = Query(200, ge=1, le=INDEX_REPORT_MAX_QUERIES)) -> Dict[str, Any]:
+    """recall@k, latency and memory per million chunks for float32 / float16 / int8 / binary vectors."""
+    report = await run_in_threadpool(DOCUMENT_PROCESSOR.precision_report, k, queries)
+    return {"status": "ok", "report": report}
+
+@router.get("/stats/db-pools")
+async def db_pool_stats() -> Dict[str, Any]:
+    """Per-database pool size, saturation and connection checkout latency."""
+    return {"status": "ok", "db": ENGINE_REGISTRY.get_stats()}
@@ -1,10 +1,34 @@
 ## backend/app/main.py
+import threading
 from fastapi import FastAPI
-from app.api.routes import ingestion, query, schema
+from app.api.routes import ingestion, query, schema, stats
+from app.services.engine_registry import ENGINE_REGISTRY
+from app.services.retrieval import RETRIEVAL_ENGINE
 
 app = FastAPI(title="NLP Query Engine")
 
 app.include_router(ingestion.router, prefix="/api", tags=["ingest"])
 app.include_router(query.router, prefix="/api", tags=["query"])
 app.include_router(schema.router, prefix="/api", tags=["schema"])
+app.include_router(stats.router, prefix="/api", tags=["stats"])
+
+@app.on_event("startup")
+def warm_start_schema():
+    # serve queries straight from the persisted schema snapshot, validated in the background
+    schema.warm_start()
+
+@app.on_event("startup")
+def build_lexical_index():
+    # BM25 index for hybrid/lexical search, built in the background instead of on the first query
+    def run():
+        try:
+            RETRIEVAL_ENGINE.build_lexical()
+        except Exception as e:
+            print(f"[Startup] Building the BM25 index failed: {e}")
+    threading.Thread(target=run, daemon=True, name="lexical-build").start()
+
+@app.on_event("shutdown")
+def dispose_engines():
+    # close pooled DB connections cleanly
+    ENGINE_REGISTRY.dispose_all()
 
@@ -0,0 +1,381 @@
+# backend/app/services/ann_index.py
+
+import os
+import math
+from time import perf_counter
+from typing import Dict, Any, List, Optional, Callable
+import numpy as np
+import faiss
+
+# "auto" starts flat and promotes to FAISS_ANN_TYPE once the corpus passes the threshold;
+# any other value pins the index type.
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto").lower()
+FAISS_ANN_TYPE = os.getenv("FAISS_ANN_TYPE", "hnsw").lower()
+FAISS_ANN_PROMOTE_THRESHOLD = int(os.getenv("FAISS_ANN_PROMOTE_THRESHOLD", "50000"))
+
+HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))  # 0 = 4 * sqrt(n)
+IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("FAISS_PQ_M", "48"))
+PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", "8"))
+
+# "float32" (exact), "float16" / "int8" (scalar quantization), or "binary"
+# (sign bits searched by Hamming distance, top candidates re-scored on float vectors)
+FAISS_VECTOR_PRECISION = os.getenv("FAISS_VECTOR_PRECISION", "float32").lower()
+BINARY_RERANK_FACTOR = int(os.getenv("FAISS_BINARY_RERANK_FACTOR", "10"))
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+PRECISIONS = ("float32", "float16", "int8", "binary")
+_SQ_TYPES = {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+_SQ_TRAIN_SAMPLE = 65536
+
+# faiss wants roughly this many training points per IVF centroid
+_MIN_POINTS_PER_CENTROID = 39
+_ADD_BATCH = 65536
+
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    """One sign bit per dimension, packed 8 per byte."""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+class BinaryRerankIndex:
+    """
+    Binary-code index with the float index's add/search interface. Codes are
+    d/8 bytes per vector; each search takes BINARY_RERANK_FACTOR * k Hamming
+    candidates and re-scores them by exact L2 against the float vectors
+    (memory-mapped from disk, so they do not count against RAM).
+    """
+    def __init__(self, d: int, binary: Optional[faiss.IndexBinary] = None):
+        self.d = d
+        self.binary = binary if binary is not None else faiss.IndexBinaryFlat(d)
+        self.vectors: Optional[Callable[[], np.ndarray]] = None
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.binary.ntotal)
+
+    @property
+    def code_size(self) -> int:
+        return int(self.binary.code_size)
+
+    def attach_vectors(self, vectors: Optional[Callable[[], np.ndarray]]):
+        """Source of float vectors for the rerank; without one, Hamming order is returned."""
+        self.vectors = vectors
+
+    def add(self, vectors: np.ndarray):
+        self.binary.add(binarize(vectors))
+
+    def search(self, queries: np.ndarray, k: int, params=None):
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.d)
+        stored = self.vectors() if self.vectors is not None else None
+        candidates = min(self.ntotal, k * max(BINARY_RERANK_FACTOR, 1) if stored is not None else k)
+        hamming, found = self.binary.search(binarize(queries), candidates)
+        if stored is None:
+            return hamming.astype(np.float32), found
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        labels = np.full((len(queries), k), -1, dtype=np.int64)
+        for row, (query, ids) in enumerate(zip(queries, found)):
+            # sorted ids read the memory-mapped vectors front to back
+            ids = np.sort(ids[(ids >= 0) & (ids < len(stored))])
+            if not len(ids):
+                continue
+            diff = np.asarray(stored[ids], dtype=np.float32) - query
+            exact = np.einsum("ij,ij->i", diff, diff)
+            top = np.argsort(exact, kind="stable")[:k]
+            distances[row, :len(top)] = exact[top]
+            labels[row, :len(top)] = ids[top]
+        return distances, labels
+
+
+def resolve_precision(precision: str = FAISS_VECTOR_PRECISION) -> str:
+    if precision not in PRECISIONS:
+        print(f"[ANNIndex] Unknown vector precision '{precision}'; using float32.")
+        return "float32"
+    return precision
+
+
+def _binary_fits(precision: str, dim: int) -> bool:
+    # binary codes pack 8 dimensions per byte; other dims fall back to float32
+    return precision == "binary" and dim % 8 == 0
+
+
+def _pq_fits(dim: int) -> bool:
+    # PQ splits vectors into PQ_M equal sub-vectors; other dims fall back to IVF-Flat/SQ
+    return dim % PQ_M == 0
+
+
+def index_precision(kind: str, precision: str, dim: int) -> str:
+    """Precision build_index gives an index of this kind and dimension (PQ has its own compression)."""
+    if _binary_fits(precision, dim):
+        return "binary"
+    if kind == "ivf_pq" and _pq_fits(dim):
+        return "pq"
+    return "float32" if precision == "binary" else precision
+
+
+def _storage(index: faiss.Index) -> faiss.Index:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.downcast_index(index.storage)
+    return index
+
+
+def precision_of(index) -> Optional[str]:
+    """Vector precision of a live index ("float32", "float16", "int8", "binary", "pq")."""
+    if index is None:
+        return None
+    if isinstance(index, BinaryRerankIndex):
+        return "binary"
+    storage = _storage(index)
+    if isinstance(storage, faiss.IndexIVFPQ):
+        return "pq"
+    sq = getattr(storage, "sq", None)
+    if sq is not None:
+        return "float16" if sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "int8"
+    return "float32"
+
+
+def code_bytes(index) -> Optional[int]:
+    """Bytes stored per vector (codes only; graph links and list ids excluded)."""
+    if index is None:
+        return None
+    if isinstance(index, BinaryRerankIndex):
+        return index.code_size
+    storage = _storage(index)
+    if hasattr(storage, "code_size"):
+        return int(storage.code_size)
+    return int(storage.d) * 4
+
+
+def _sample(vectors: np.ndarray, size: int) -> np.ndarray:
+    n = vectors.shape[0]
+    if n <= size:
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+    rows = np.sort(np.random.default_rng(0).choice(n, size=size, replace=False))
+    return np.ascontiguousarray(vectors[rows], dtype=np.float32)
+
+
+def empty_index(dim: int, precision: str, first_batch: np.ndarray):
+    """The index a new store starts with: flat, at the configured precision."""
+    if _binary_fits(precision, dim):
+        return BinaryRerankIndex(dim)
+    if precision in _SQ_TYPES:
+        index = faiss.IndexScalarQuantizer(dim, _SQ_TYPES[precision], faiss.METRIC_L2)
+        # the first batch alone may not span later vectors; unit bounds cover
+        # normalized embeddings until the next rebuild retrains on real data
+        bounds = np.vstack([-np.ones((1, dim)), np.ones((1, dim))]).astype(np.float32)
+        index.train(np.vstack([_sample(first_batch, _SQ_TRAIN_SAMPLE), bounds]))
+        return index
+    return faiss.IndexFlatL2(dim)
+
+
+def read_index_file(path: str, io_flags: int = 0):
+    """Read an index written by write_index_file (float or binary)."""
+    try:
+        return faiss.read_index(path, io_flags) if io_flags else faiss.read_index(path)
+    except RuntimeError:
+        binary = faiss.read_index_binary(path)
+        return BinaryRerankIndex(binary.d, binary)
+
+
+def write_index_file(index, path: str):
+    if isinstance(index, BinaryRerankIndex):
+        faiss.write_index_binary(index.binary, path)
+    else:
+        faiss.write_index(index, path)
+
+
+def index_kind(index: Optional[faiss.Index]) -> Optional[str]:
+    """Name of the index type ("flat", "hnsw", "ivf_flat", "ivf_pq")."""
+    if index is None:
+        return None
+    if isinstance(index, BinaryRerankIndex):
+        return "flat"
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def _nlist_for(n: int) -> int:
+    nlist = IVF_NLIST or int(4 * math.sqrt(max(n, 1)))
+    # never ask for more centroids than the data can train
+    return max(1, min(nlist, n // _MIN_POINTS_PER_CENTROID))
+
+
+def target_kind(n: int, dim: int, configured: str = FAISS_INDEX_TYPE, precision: str = "float32") -> str:
+    """Index type a corpus of n dim-dimensional vectors should use (as build_index will build it)."""
+    if _binary_fits(precision, dim):
+        # Hamming scans over d/8-byte codes stay fast without an ANN structure
+        return "flat"
+    kind = configured
+    if configured == "auto":
+        kind = FAISS_ANN_TYPE if n >= FAISS_ANN_PROMOTE_THRESHOLD else "flat"
+    if kind not in INDEX_TYPES:
+        print(f"[ANNIndex] Unknown index type '{kind}'; using flat.")
+        return "flat"
+    # IVF needs enough points to train its coarse quantizer
+    if kind.startswith("ivf") and n < _MIN_POINTS_PER_CENTROID:
+        return "flat"
+    if kind == "ivf_pq" and not _pq_fits(dim):
+        return "ivf_flat"
+    return kind
+
+
+def build_index(kind: str, vectors: np.ndarray, precision: str = "float32"):
+    """Create, train (if needed) and fill an index of the given type and vector precision."""
+    n, dim = vectors.shape
+    qtype = _SQ_TYPES.get(precision)
+    if _binary_fits(precision, dim):
+        index = BinaryRerankIndex(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWSQ(dim, qtype, HNSW_M) if qtype is not None else faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    elif kind in ("ivf_flat", "ivf_pq"):
+        quantizer = faiss.IndexFlatL2(dim)
+        nlist = _nlist_for(n)
+        if kind == "ivf_pq" and _pq_fits(dim):
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, PQ_M, PQ_NBITS)
+        elif qtype is not None:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        # a bounded random sample is enough to train the coarse quantizer / codebooks
+        sample_size = min(n, nlist * 256)
+        sample = vectors[np.sort(np.random.default_rng(0).choice(n, size=sample_size, replace=False))]
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+        index.nprobe = min(IVF_NPROBE, nlist)
+    elif qtype is not None:
+        index = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_L2)
+    else:
+        index = faiss.IndexFlatL2(dim)
+    if not isinstance(index, BinaryRerankIndex) and not index.is_trained:
+        # scalar quantizers learn per-dimension ranges
+        index.train(_sample(vectors, _SQ_TRAIN_SAMPLE))
+    # add in slices so a memory-mapped source is never copied into RAM at once
+    for start in range(0, n, _ADD_BATCH):
+        index.add(np.ascontiguousarray(vectors[start:start + _ADD_BATCH], dtype=np.float32))
+    return index
+
+
+def search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                  selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Per-request search parameters; the shared index itself is never mutated.
+    selector restricts the search to the ids it accepts (metadata filters).
+    """
+    kind = index_kind(index)
+    if kind == "hnsw" and (ef_search or selector is not None):
+        # parameter objects carry their own defaults, so keep the index's setting unless overridden
+        ef_search = ef_search or faiss.downcast_index(index).hnsw.efSearch
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search), sel=selector)
+    if kind in ("ivf_flat", "ivf_pq") and (nprobe or selector is not None):
+        nprobe = nprobe or faiss.downcast_index(index).nprobe
+        return faiss.SearchParametersIVF(nprobe=int(nprobe), sel=selector)
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+
+def recall_latency_report(index: faiss.Index, vectors: np.ndarray, k: int = 10, num_queries: int = 200,
+                          nprobes: List[int] = (1, 4, 16, 64), ef_searches: List[int] = (16, 32, 64, 128, 256),
+                          seed: int = 0) -> Dict[str, Any]:
+    """
+    recall@k and per-query latency of the live index versus exact (flat) search.
+    Queries are sampled from the indexed vectors themselves.
+    """
+    n = int(vectors.shape[0])
+    if n == 0:
+        return {"kind": index_kind(index), "vectors": 0, "results": []}
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(n, size=min(num_queries, n), replace=False))
+    queries = np.ascontiguousarray(vectors[rows], dtype=np.float32)
+
+    start = perf_counter()
+    _, truth = faiss.knn(queries, np.ascontiguousarray(vectors, dtype=np.float32), k)
+    flat_ms = (perf_counter() - start) * 1000 / len(queries)
+
+    def measure(params) -> Dict[str, Any]:
+        start = perf_counter()
+        _, found = index.search(queries, k, params=params)
+        per_query_ms = (perf_counter() - start) * 1000 / len(queries)
+        hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+        return {"recall_at_k": round(hits / truth.size, 4), "latency_ms": round(per_query_ms, 4)}
+
+    kind = index_kind(index)
+    results = []
+    if kind == "hnsw":
+        for ef in ef_searches:
+            results.append({"ef_search": ef, **measure(search_params(index, ef_search=ef))})
+    elif kind in ("ivf_flat", "ivf_pq"):
+        for nprobe in nprobes:
+            results.append({"nprobe": nprobe, **measure(search_params(index, nprobe=nprobe))})
+    else:
+        results.append(measure(None))
+
+    return {
+        "kind": kind,
+        "vectors": n,
+        "queries": len(queries),
+        "k": k,
+        "flat_baseline_latency_ms": round(flat_ms, 4),
+        "results": results,
+    }
+
+
+def precision_report(vectors: np.ndarray, k: int = 10, num_queries: int = 200,
+                     max_vectors: int = 100000, seed: int = 0) -> Dict[str, Any]:
+    """
+    recall@k, per-query latency and memory per million chunks of a flat index
+    at every precision, over (a sample of) the stored vectors. Queries are
+    sampled from the vectors themselves, as in recall_latency_report.
+    """
+    n = int(vectors.shape[0])
+    if n == 0:
+        return {"vectors": 0, "results": []}
+    base = _sample(vectors, max_vectors)
+    n, dim = base.shape
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+    queries = np.ascontiguousarray(base[np.sort(rng.choice(n, size=min(num_queries, n), replace=False))])
+    _, truth = faiss.knn(queries, base, k)
+
+    variants = [(p, True) for p in PRECISIONS] + [("binary", False)]
+    results = []
+    for precision, rerank in variants:
+        start = perf_counter()
+        index = build_index("flat", base, precision)
+        build_ms = (perf_counter() - start) * 1000
+        if isinstance(index, BinaryRerankIndex):
+            index.attach_vectors((lambda: base) if rerank else None)
+        start = perf_counter()
+        _, found = index.search(queries, k)
+        per_query_ms = (perf_counter() - start) * 1000 / len(queries)
+        hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+        per_vector = code_bytes(index)
+        results.append({
+            "precision": precision if rerank or precision != "binary" else "binary_no_rerank",
+            "bytes_per_vector": per_vector,
+            "memory_per_million_chunks_mb": round(per_vector * 1_000_000 / 2 ** 20, 1),
+            "recall_at_k": round(hits / truth.size, 4),
+            "latency_ms": round(per_query_ms, 4),
+            "build_ms": round(build_ms, 2),
+        })
+    return {
+        "vectors": n,
+        "dim": dim,
+        "queries": len(queries),
+        "k": k,
+        # binary rerank reads these from the memory-mapped vectors file, not RAM
+        "float_vectors_on_disk_per_million_chunks_mb": round(dim * 4 * 1_000_000 / 2 ** 20, 1),
+        "results": results,
+    }
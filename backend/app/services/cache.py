@@ -1,67 +1,218 @@
 # backend/app/services/cache.py
 
-from typing import Dict, Any, Optional
-import time
-from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Iterable
+import os
+import re
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+import numpy as np
+
+from app.services.cache_backends import CacheBackend, build_cache_backend
 
 # Define the default cache expiration time
 CACHE_TTL = timedelta(minutes=5)
 
+# Per query type TTLs (sql/doc/hybrid), overridable via env, e.g. QUERY_CACHE_TTL_SQL=600
+CACHE_TTLS: Dict[str, timedelta] = {
+    qtype: timedelta(seconds=float(os.getenv(f"QUERY_CACHE_TTL_{qtype.upper()}", CACHE_TTL.total_seconds())))
+    for qtype in ("sql", "doc", "hybrid")
+}
+
+# Result cache bounds
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "1024"))
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Max number of query embeddings kept in memory
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+
+# Data-version names cached results can depend on
+DOCS_VERSION = "docs"
+
+def normalize_query(query: str) -> str:
+    """Case-fold, strip punctuation and collapse whitespace."""
+    return " ".join(_PUNCT_RE.sub(" ", query.casefold()).split())
+
+def connection_fingerprint(connection_string: str) -> str:
+    return hashlib.sha1(connection_string.encode()).hexdigest()[:12]
+
+def schema_version_name(conn_fp: str) -> str:
+    return f"{conn_fp}:schema"
+
+def table_version_name(conn_fp: str, table: str) -> str:
+    return f"{conn_fp}:table:{table}"
+
 class QueryCache:
     """
-    Simple in-memory cache for storing query results.
+    Bounded cache for storing query results.
+    Storage, LRU/TTL eviction and serialization are delegated to a pluggable
+    backend (in-memory by default, or a SQLite file shared by all local workers).
+
+    Each entry records the versions of the data it was computed from (schema,
+    document index, touched tables). Ingestion bumps only the versions it
+    changes, so unrelated entries keep serving hits.
     """
-    def __init__(self):
-        # Cache structure: {query_string: {"result": Any, "timestamp": datetime}}
-        self._cache: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES, max_bytes: int = QUERY_CACHE_MAX_BYTES,
+                 ttls: Optional[Dict[str, timedelta]] = None, backend: Optional[CacheBackend] = None):
+        self.backend = backend or build_cache_backend(max_entries, max_bytes)
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
         self.hits = 0
         self.misses = 0
 
-    def _is_valid(self, entry: Dict[str, Any]) -> bool:
-        """Checks if a cache entry is still valid."""
-        return datetime.now() < entry["timestamp"] + CACHE_TTL
+    def ttl_for(self, query_type: Optional[str]) -> timedelta:
+        return self.ttls.get(query_type or "", CACHE_TTL)
 
     def get(self, query: str) -> Optional[Dict[str, Any]]:
         """
         Retrieves a result from the cache if it is valid.
-        Returns the cached result dictionary (excluding timestamp) or None.
+        Returns a copy of the cached result dictionary or None.
         """
-        if query in self._cache:
-            if self._is_valid(self._cache[query]):
-                self.hits += 1
-                # Return only the useful part of the result
-                return self._cache[query]["result"]
-            else:
-                # Invalidate and remove expired entry
-                del self._cache[query]
-                self.misses += 1
-                return None
-        
-        self.misses += 1
-        return None
+        try:
+            entry = self.backend.get(query)
+            if entry is not None:
+                result, deps = entry
+                # drop entries whose underlying data has changed since they were cached
+                if deps and self.backend.get_versions(list(deps)) != deps:
+                    self.backend.delete(query, "stale")
+                    entry = None
+        except Exception as e:
+            print(f"[QueryCache] get failed: {e}")
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
 
-    def set(self, query: str, result: Dict[str, Any]):
+    def versions(self, names: Iterable[str]) -> Dict[str, str]:
         """
-        Stores a new result in the cache.
+        Current versions of the named data. Take this snapshot before computing
+        a result and hand it to set(), so a bump() that lands while the query
+        runs leaves the entry stale instead of stamping it with the new version.
         """
-        self._cache[query] = {
-            "result": result,
-            "timestamp": datetime.now()
-        }
+        try:
+            return self.backend.get_versions(sorted(set(names)))
+        except Exception as e:
+            print(f"[QueryCache] version read failed: {e}")
+            return {}
+
+    def set(self, query: str, result: Dict[str, Any], query_type: Optional[str] = None,
+            depends_on: Iterable[str] = (), versions: Optional[Dict[str, str]] = None):
+        """
+        Stores a new result in the cache; the TTL depends on the query type.
+        depends_on names the data versions (see bump()) the result was computed from;
+        versions is the snapshot of them taken (with versions()) before computing it.
+        """
+        query_type = query_type or result.get("query_type")
+        names = sorted(set(depends_on))
+        if names and versions is None:
+            # without a snapshot the entry cannot be proven fresh; don't cache it
+            return
+        try:
+            # a name missing from the snapshot never matches a current version
+            deps = {name: versions.get(name, "?") for name in names}
+            self.backend.set(query, result, self.ttl_for(query_type).total_seconds(), query_type, deps)
+        except Exception as e:
+            print(f"[QueryCache] set failed: {e}")
+
+    def bump(self, *names: str):
+        """Mark data as changed; entries that depend on any of these names become stale."""
+        if names:
+            self.set_versions({name: uuid.uuid4().hex[:12] for name in names})
+
+    def set_versions(self, versions: Dict[str, str]):
+        """Record explicit versions (e.g. a schema fingerprint); unchanged values invalidate nothing."""
+        try:
+            self.backend.set_versions(versions)
+        except Exception as e:
+            print(f"[QueryCache] version update failed: {e}")
 
     def clear(self):
         """Clears the entire cache. Required for schema/data updates."""
-        self._cache = {}
+        self.backend.clear()
         self.hits = 0
         self.misses = 0
         
-    def get_stats(self) -> Dict[str, int | str]:
+    def get_stats(self) -> Dict[str, Any]:
         """Returns current cache statistics."""
         total = self.hits + self.misses
         hit_rate = f"{self.hits / total * 100:.2f}%" if total > 0 else "0.00%"
+        stats: Dict[str, Any] = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": hit_rate,
+            "ttl_seconds": {k: v.total_seconds() for k, v in self.ttls.items()},
+        }
+        try:
+            stats.update(self.backend.get_stats())
+        except Exception as e:
+            stats["backend_error"] = str(e)
+        return stats
+
+# shared by every QueryEngine so rebuilding the engine keeps valid entries
+QUERY_CACHE = QueryCache()
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query embeddings keyed on normalized query text.
+    Vectors are stored as compact, read-only float32 arrays.
+    """
+    def __init__(self, max_entries: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self.max_entries = max(max_entries, 1)
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        key = normalize_query(query)
+        with self._lock:
+            vec = self._cache.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def set(self, query: str, vector: np.ndarray):
+        key = normalize_query(query)
+        vec = np.array(vector, dtype=np.float32).reshape(-1)
+        vec.flags.writeable = False
+        with self._lock:
+            self._cache[key] = vec
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def get_stats(self) -> Dict[str, int | str]:
+        total = self.hits + self.misses
+        hit_rate = f"{self.hits / total * 100:.2f}%" if total > 0 else "0.00%"
+        with self._lock:
+            entries = len(self._cache)
+            nbytes = sum(v.nbytes for v in self._cache.values())
         return {
-            "entries": len(self._cache),
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "bytes": nbytes,
             "hits": self.hits,
             "misses": self.misses,
+            "evictions": self.evictions,
             "hit_rate": hit_rate
         }
+
+# shared by the Chroma and FAISS search paths
+QUERY_EMBEDDING_CACHE = QueryEmbeddingCache()
@@ -0,0 +1,355 @@
+# backend/app/services/cache_backends.py
+
+import os
+import json
+import time
+import heapq
+import pickle
+import sqlite3
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
+
+# "memory" (per-process, default) or "sqlite" (shared by all local workers)
+QUERY_CACHE_BACKEND = os.getenv("QUERY_CACHE_BACKEND", "memory").lower()
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "indexes/query_cache.db")
+
+EVICTION_REASONS = ("lru", "memory", "ttl", "too_large", "stale")
+
+
+def serialize_result(result: Dict[str, Any]) -> bytes:
+    """Compact binary encoding of a cached result (pickle + fast zlib)."""
+    return zlib.compress(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+def deserialize_result(blob: bytes) -> Dict[str, Any]:
+    return pickle.loads(zlib.decompress(blob))
+
+
+class CacheBackend(ABC):
+    """
+    Storage interface behind QueryCache.
+    Backends own expiry and eviction; QueryCache only counts hits and misses.
+    Each entry carries the data versions it was computed against, and the
+    backend also stores the current versions so every worker sees the same ones.
+    """
+    name = "base"
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max(max_entries, 1)
+        self.max_bytes = max(max_bytes, 1)
+        self.evictions: Dict[str, int] = {reason: 0 for reason in EVICTION_REASONS}
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], Dict[str, str]]]:
+        """Returns (result, versions it depends on) or None."""
+
+    @abstractmethod
+    def set(self, key: str, result: Dict[str, Any], ttl_seconds: float, query_type: Optional[str] = None,
+            deps: Optional[Dict[str, str]] = None):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str, reason: Optional[str] = None):
+        ...
+
+    @abstractmethod
+    def get_versions(self, names: List[str]) -> Dict[str, str]:
+        """Current version token per name ("" if never bumped)."""
+
+    @abstractmethod
+    def set_versions(self, versions: Dict[str, str]):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Any]:
+        ...
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Per-process LRU store. Entries are evicted in LRU order once max_entries or
+    max_bytes is exceeded, and expired entries are swept on every get/set
+    (amortized via an expiry heap).
+    """
+    name = "memory"
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        super().__init__(max_entries, max_bytes)
+        # {key: {"result": dict, "deps": dict, "expires_at": float, "size": int, "query_type": str}}
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._versions: Dict[str, str] = {}
+        # (expires_at, key) min-heap; stale items are skipped lazily
+        self._expiry: List[Tuple[float, str]] = []
+        self._lock = threading.RLock()
+        self.bytes = 0
+
+    def _remove(self, key: str, reason: Optional[str] = None):
+        entry = self._cache.pop(key, None)
+        if entry is None:
+            return
+        self.bytes -= entry["size"]
+        if reason:
+            self.evictions[reason] += 1
+
+    def _sweep_expired(self, now: float):
+        """Drop every entry whose TTL has passed."""
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry)
+            entry = self._cache.get(key)
+            # the key may have been overwritten or evicted since it was pushed
+            if entry is not None and entry["expires_at"] == expires_at:
+                self._remove(key, "ttl")
+        # keep the heap from growing without bound under heavy overwrites
+        if len(self._expiry) > 2 * len(self._cache) + 64:
+            self._expiry = [(e["expires_at"], k) for k, e in self._cache.items()]
+            heapq.heapify(self._expiry)
+
+    def _enforce_bounds(self):
+        while len(self._cache) > self.max_entries:
+            self._remove(next(iter(self._cache)), "lru")
+        while self.bytes > self.max_bytes and self._cache:
+            self._remove(next(iter(self._cache)), "memory")
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], Dict[str, str]]]:
+        with self._lock:
+            self._sweep_expired(time.monotonic())
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            self._cache.move_to_end(key)
+            return dict(entry["result"]), dict(entry["deps"])
+
+    def set(self, key: str, result: Dict[str, Any], ttl_seconds: float, query_type: Optional[str] = None,
+            deps: Optional[Dict[str, str]] = None):
+        stored = dict(result)
+        try:
+            size = len(pickle.dumps(stored, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            size = 0
+        with self._lock:
+            now = time.monotonic()
+            self._sweep_expired(now)
+            self._remove(key)
+            if size > self.max_bytes:
+                self.evictions["too_large"] += 1
+                return
+            expires_at = now + ttl_seconds
+            self._cache[key] = {
+                "result": stored,
+                "deps": dict(deps or {}),
+                "expires_at": expires_at,
+                "size": size,
+                "query_type": query_type,
+            }
+            self.bytes += size
+            heapq.heappush(self._expiry, (expires_at, key))
+            self._enforce_bounds()
+
+    def delete(self, key: str, reason: Optional[str] = None):
+        with self._lock:
+            self._remove(key, reason)
+
+    def get_versions(self, names: List[str]) -> Dict[str, str]:
+        with self._lock:
+            return {name: self._versions.get(name, "") for name in names}
+
+    def set_versions(self, versions: Dict[str, str]):
+        with self._lock:
+            self._versions.update(versions)
+
+    def clear(self):
+        with self._lock:
+            self._cache = OrderedDict()
+            self._expiry = []
+            self.bytes = 0
+            self.evictions = {reason: 0 for reason in EVICTION_REASONS}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._sweep_expired(time.monotonic())
+            return {
+                "backend": self.name,
+                "entries": len(self._cache),
+                "max_entries": self.max_entries,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": sum(self.evictions.values()),
+                "evictions_by_reason": dict(self.evictions),
+            }
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    On-disk store shared by every worker on the host (SQLite in WAL mode).
+    Results are stored as compressed pickles; LRU order is tracked with a
+    last_access column and expiry uses wall-clock time so all processes agree.
+    Eviction counters are per process.
+    """
+    name = "sqlite"
+
+    def __init__(self, max_entries: int, max_bytes: int, path: str = QUERY_CACHE_PATH):
+        super().__init__(max_entries, max_bytes)
+        self.path = path
+        self._local = threading.local()
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                query_type TEXT,
+                deps TEXT,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        try:
+            conn.execute("ALTER TABLE cache_entries ADD COLUMN deps TEXT")
+        except sqlite3.OperationalError:
+            pass  # column already present
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS data_versions (
+                name TEXT PRIMARY KEY,
+                version TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache_entries (expires_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_access ON cache_entries (last_access)")
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; autocommit, waits on other writers."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _sweep_expired(self, conn: sqlite3.Connection, now: float):
+        cur = conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+        self.evictions["ttl"] += max(cur.rowcount, 0)
+
+    def _enforce_bounds(self, conn: sqlite3.Connection):
+        entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+        if entries > self.max_entries:
+            cur = conn.execute(
+                "DELETE FROM cache_entries WHERE key IN "
+                "(SELECT key FROM cache_entries ORDER BY last_access LIMIT ?)",
+                (entries - self.max_entries,),
+            )
+            self.evictions["lru"] += max(cur.rowcount, 0)
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+        if total > self.max_bytes:
+            # walk the LRU end until enough bytes are freed
+            excess = total - self.max_bytes
+            victims = []
+            for key, size in conn.execute("SELECT key, size FROM cache_entries ORDER BY last_access"):
+                victims.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            conn.executemany("DELETE FROM cache_entries WHERE key = ?", victims)
+            self.evictions["memory"] += len(victims)
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], Dict[str, str]]]:
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at, deps FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            self.evictions["ttl"] += 1
+            return None
+        conn.execute("UPDATE cache_entries SET last_access = ? WHERE key = ?", (now, key))
+        try:
+            return deserialize_result(row[0]), json.loads(row[2] or "{}")
+        except Exception as e:
+            print(f"[QueryCache] Dropping unreadable cache entry: {e}")
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            return None
+
+    def set(self, key: str, result: Dict[str, Any], ttl_seconds: float, query_type: Optional[str] = None,
+            deps: Optional[Dict[str, str]] = None):
+        blob = serialize_result(dict(result))
+        if len(blob) > self.max_bytes:
+            self.evictions["too_large"] += 1
+            return
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._sweep_expired(conn, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, size, query_type, deps, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, blob, len(blob), query_type, json.dumps(deps or {}), now + ttl_seconds, now),
+            )
+            self._enforce_bounds(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, key: str, reason: Optional[str] = None):
+        cur = self._conn().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        if reason and cur.rowcount > 0:
+            self.evictions[reason] += 1
+
+    def get_versions(self, names: List[str]) -> Dict[str, str]:
+        versions = {name: "" for name in names}
+        if names:
+            placeholders = ",".join("?" * len(names))
+            rows = self._conn().execute(
+                f"SELECT name, version FROM data_versions WHERE name IN ({placeholders})", list(names)
+            )
+            versions.update(dict(rows.fetchall()))
+        return versions
+
+    def set_versions(self, versions: Dict[str, str]):
+        self._conn().executemany(
+            "INSERT INTO data_versions (name, version) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET version = excluded.version",
+            list(versions.items()),
+        )
+
+    def clear(self):
+        self._conn().execute("DELETE FROM cache_entries")
+        self.evictions = {reason: 0 for reason in EVICTION_REASONS}
+
+    def get_stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        self._sweep_expired(conn, time.time())
+        entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "evictions": sum(self.evictions.values()),
+            "evictions_by_reason": dict(self.evictions),
+        }
+
+
+def build_cache_backend(max_entries: int, max_bytes: int, kind: str = QUERY_CACHE_BACKEND) -> CacheBackend:
+    """Create the result-cache backend selected by QUERY_CACHE_BACKEND."""
+    if kind == "sqlite":
+        try:
+            return SQLiteCacheBackend(max_entries, max_bytes)
+        except Exception as e:
+            print(f"[QueryCache] SQLite backend unavailable ({e}); falling back to memory.")
+    elif kind != "memory":
+        print(f"[QueryCache] Unknown cache backend '{kind}'; using memory.")
+    return MemoryCacheBackend(max_entries, max_bytes)
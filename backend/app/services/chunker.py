@@ -0,0 +1,257 @@
+# backend/app/services/chunker.py
+
+import os
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.services.embedding_service import EMBEDDING_SERVICE, EmbeddingService
+
+# "tokens": pack sentences up to a token budget (default); "paragraph": one chunk per blank-line block
+CHUNKER_MODE = os.getenv("CHUNKER_MODE", "tokens").lower()
+# MiniLM reads at most 256 tokens per text; stay below that
+CHUNK_TARGET_TOKENS = int(os.getenv("CHUNK_TARGET_TOKENS", "200"))
+# trailing sentences (up to this many tokens) repeated at the start of the next chunk
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+# a stream with no sentence or paragraph break for this many characters is cut anyway
+CHUNK_STREAM_MAX_BUFFER = int(os.getenv("CHUNK_STREAM_MAX_BUFFER", str(1 << 20)))
+
+# sentence ends and line breaks; separators stay attached to the text before them
+_UNIT_BOUNDARY = re.compile(r"(?<=[.!?])[ \t]+|\n+")
+_WORD = re.compile(r"\S+\s*")
+_APPROX_TOKEN = re.compile(r"\w+|[^\w\s]")
+_HISTOGRAM_EDGES = (32, 64, 128, 192, 256, 384, 512)
+
+# (text, token count)
+Piece = Tuple[str, int]
+
+
+class TokenCounter:
+    """
+    Counts tokens with the embedding model's tokenizer. Without one (or if it
+    fails) falls back to counting words and punctuation, which is close for
+    WordPiece vocabularies.
+    """
+    def __init__(self, embedder: EmbeddingService = EMBEDDING_SERVICE):
+        self.embedder = embedder
+        self._tokenizer = None
+        self._resolved = False
+
+    @property
+    def tokenizer(self):
+        if not self._resolved:
+            try:
+                self._tokenizer = self.embedder.tokenizer
+            except Exception as e:
+                print(f"[Chunker] Tokenizer unavailable ({e}); approximating token counts.")
+            self._resolved = True
+        return self._tokenizer
+
+    @property
+    def model_limit(self) -> Optional[int]:
+        return self.embedder.max_seq_length if self.embedder.is_loaded else None
+
+    def counts(self, texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        tokenizer = self.tokenizer
+        if tokenizer is not None:
+            try:
+                ids = tokenizer(texts, add_special_tokens=False, return_attention_mask=False,
+                                return_token_type_ids=False, verbose=False)["input_ids"]
+                return [len(x) for x in ids]
+            except Exception as e:
+                print(f"[Chunker] Tokenizer failed ({e}); approximating token counts.")
+                self._tokenizer = None
+        return [len(_APPROX_TOKEN.findall(t)) for t in texts]
+
+
+class ParagraphSplitter:
+    """Legacy chunking: one chunk per blank-line separated block."""
+    def __init__(self, counter: TokenCounter):
+        self.counter = counter
+        self.buffer = ""
+
+    def _pieces(self, text: str) -> List[Piece]:
+        paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
+        return list(zip(paragraphs, self.counter.counts(paragraphs)))
+
+    def feed(self, text: str) -> List[Piece]:
+        self.buffer += text
+        cut = self.buffer.rfind("\n\n")
+        if cut < 0:
+            if len(self.buffer) < CHUNK_STREAM_MAX_BUFFER:
+                return []
+            cut = len(self.buffer)
+        head, self.buffer = self.buffer[:cut], self.buffer[cut + 2:]
+        return self._pieces(head)
+
+    def close(self) -> List[Piece]:
+        tail, self.buffer = self.buffer, ""
+        return self._pieces(tail)
+
+
+class TokenChunker:
+    """
+    Single-pass streaming chunker. Text is cut into sentences/lines, which are
+    packed greedily into chunks of at most target_tokens; the last sentences
+    of a chunk (up to overlap_tokens) open the next one. A sentence longer
+    than the budget is split at word boundaries. Line breaks are kept in the
+    chunk text, so line-oriented extraction still sees the original lines.
+    """
+    def __init__(self, counter: TokenCounter, target_tokens: int = CHUNK_TARGET_TOKENS,
+                 overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+        self.counter = counter
+        self.target = max(target_tokens, 1)
+        self.overlap = max(min(overlap_tokens, self.target // 2), 0)
+        self.pending = ""
+        self.pack: List[Piece] = []
+        self.pack_tokens = 0
+        self.fresh = 0  # units in the pack that are not overlap from the previous chunk
+
+    def _emit(self) -> List[Piece]:
+        if not self.fresh:
+            return []
+        text = "".join(u for u, _ in self.pack).strip()
+        out = [(text, self.pack_tokens)] if text else []
+        tail: List[Piece] = []
+        tokens = 0
+        for unit in reversed(self.pack):
+            if tokens + unit[1] > self.overlap:
+                break
+            tail.insert(0, unit)
+            tokens += unit[1]
+        self.pack, self.pack_tokens, self.fresh = tail, tokens, 0
+        return out
+
+    def _add(self, unit: str, tokens: int) -> List[Piece]:
+        if not unit.strip():
+            if self.pack:
+                self.pack.append((unit, 0))
+            return []
+        out: List[Piece] = []
+        if tokens > self.target:
+            out.extend(self._emit())
+            self.pack, self.pack_tokens = [], 0
+            return out + self._split_long(unit)
+        if self.pack_tokens + tokens > self.target:
+            out.extend(self._emit())
+            if self.pack_tokens + tokens > self.target:
+                self.pack, self.pack_tokens = [], 0
+        self.pack.append((unit, tokens))
+        self.pack_tokens += tokens
+        self.fresh += 1
+        return out
+
+    def _split_long(self, unit: str) -> List[Piece]:
+        words = _WORD.findall(unit)
+        out: List[Piece] = []
+        text, tokens = "", 0
+        for word, n in zip(words, self.counter.counts(words)):
+            if text and tokens + n > self.target:
+                out.append((text.strip(), tokens))
+                text, tokens = "", 0
+            text += word
+            tokens += n
+        if text.strip():
+            out.append((text.strip(), tokens))
+        return out
+
+    def _units(self, text: str) -> List[Piece]:
+        units = [u for u in _split_units(text) if u] if text else []
+        # whitespace-only units carry no tokens but keep the line structure
+        counts = self.counter.counts([u.strip() for u in units])
+        return list(zip(units, counts))
+
+    def feed(self, text: str) -> List[Piece]:
+        self.pending += text
+        last = None
+        for last in _UNIT_BOUNDARY.finditer(self.pending):
+            pass
+        if last is None:
+            if len(self.pending) < CHUNK_STREAM_MAX_BUFFER:
+                return []
+            complete, self.pending = self.pending, ""
+        else:
+            complete, self.pending = self.pending[:last.end()], self.pending[last.end():]
+        out: List[Piece] = []
+        for unit, tokens in self._units(complete):
+            out.extend(self._add(unit, tokens))
+        return out
+
+    def close(self) -> List[Piece]:
+        tail, self.pending = self.pending, ""
+        out: List[Piece] = []
+        for unit, tokens in self._units(tail):
+            out.extend(self._add(unit, tokens))
+        return out + self._emit()
+
+
+def _split_units(text: str) -> List[str]:
+    units, start = [], 0
+    for m in _UNIT_BOUNDARY.finditer(text):
+        units.append(text[start:m.end()])
+        start = m.end()
+    units.append(text[start:])
+    return units
+
+
+def chunker_signature(mode: str = CHUNKER_MODE) -> str:
+    """The settings that decide chunk boundaries; a file chunked under other settings is re-ingested."""
+    if mode == "paragraph":
+        return mode
+    return f"tokens:{CHUNK_TARGET_TOKENS}:{CHUNK_OVERLAP_TOKENS}"
+
+
+def make_splitter(mode: str = CHUNKER_MODE, counter: Optional[TokenCounter] = None):
+    """Splitter selected by CHUNKER_MODE; both expose feed(text) / close() -> [(text, tokens)]."""
+    counter = counter or TokenCounter()
+    if mode == "paragraph":
+        return ParagraphSplitter(counter)
+    if mode != "tokens":
+        print(f"[Chunker] Unknown chunker mode '{mode}'; using token chunking.")
+    return TokenChunker(counter)
+
+
+class ChunkStats:
+    """Chunk-size histogram and throughput for one ingestion."""
+    def __init__(self, mode: str = CHUNKER_MODE):
+        self.mode = mode
+        self.sizes: List[int] = []
+        self.chars = 0
+        self.seconds = 0.0
+        self.model_limit: Optional[int] = None
+
+    def record(self, chars: int, seconds: float, sizes: List[int]):
+        self.chars += chars
+        self.seconds += seconds
+        self.sizes.extend(sizes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        sizes = sorted(self.sizes)
+        def pct(p: float) -> Optional[int]:
+            return sizes[min(len(sizes) - 1, int(p * len(sizes)))] if sizes else None
+        histogram: Dict[str, int] = {}
+        low = 0
+        for edge in _HISTOGRAM_EDGES + (None,):
+            label = f"{low}-{edge - 1}" if edge is not None else f"{low}+"
+            histogram[label] = sum(1 for n in sizes if n >= low and (edge is None or n < edge))
+            low = edge
+        return {
+            "mode": self.mode,
+            "target_tokens": CHUNK_TARGET_TOKENS,
+            "overlap_tokens": CHUNK_OVERLAP_TOKENS,
+            "chunks": len(sizes),
+            "chars": self.chars,
+            "tokens": sum(sizes),
+            "tokens_per_chunk": {
+                "mean": round(sum(sizes) / len(sizes), 1) if sizes else None,
+                "p50": pct(0.50),
+                "p95": pct(0.95),
+                "max": sizes[-1] if sizes else None,
+            },
+            "histogram": histogram,
+            "over_model_limit": sum(1 for n in sizes if n > self.model_limit) if self.model_limit else None,
+            "duration_ms": round(self.seconds * 1000, 2),
+            "chars_per_sec": round(self.chars / self.seconds, 1) if self.seconds > 0 else None,
+            "chunks_per_sec": round(len(sizes) / self.seconds, 1) if self.seconds > 0 else None,
+        }
@@ -0,0 +1,131 @@
+# backend/app/services/column_index.py
+
+import os
+import re
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from rapidfuzz import process as rf_process
+
+from app.services.schema_discovery import schema_fingerprint
+
+# below this many columns scoring everything is already cheap, so skip the prefilter
+COLUMN_INDEX_FULL_SCAN = int(os.getenv("COLUMN_INDEX_FULL_SCAN", "64"))
+# how many prefiltered candidates are handed to the fuzzy scorer
+COLUMN_INDEX_CANDIDATES = int(os.getenv("COLUMN_INDEX_CANDIDATES", "48"))
+# embed "table column: sample values" for semantic matching (loads the embedding model)
+COLUMN_INDEX_EMBEDDINGS = os.getenv("COLUMN_INDEX_EMBEDDINGS", "false").lower() in ("1", "true", "yes")
+
+_TOKEN_WEIGHT = 3
+_CAMEL = re.compile(r"([a-z0-9])([A-Z])")
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(name: str) -> str:
+    """"employeeID" / "dept_name" / "Dept-Name" -> "employee id" / "dept name"."""
+    return _NON_ALNUM.sub(" ", _CAMEL.sub(r"\1 \2", name).lower()).strip()
+
+
+def name_tokens(text: str) -> set:
+    # crude singularization so "employees" and "employee" share a posting list
+    return {t[:-1] if len(t) > 3 and t.endswith("s") and not t.endswith("ss") else t for t in text.split()}
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ColumnIndex:
+    """
+    Precomputed lookup over every "table.column" of a schema, built once per
+    schema version. Token and trigram inverted lists narrow a query to a few
+    candidates before fuzzy scoring; optional embeddings allow semantic matches.
+    Picklable, so it is persisted with the schema snapshot.
+    """
+    def __init__(self, schema: Dict[str, Any], embedder=None):
+        self.version = schema_fingerprint(schema)
+        self.names: List[str] = []
+        self.normalized: List[str] = []
+        descriptions: List[str] = []
+        for tname, tinfo in schema.get("tables", {}).items():
+            samples = tinfo.get("sample") or []
+            for c in tinfo.get("columns", []):
+                self.names.append(f"{tname}.{c['name']}")
+                self.normalized.append(f"{normalize_name(tname)} {normalize_name(c['name'])}")
+                values = [str(row.get(c["name"])) for row in samples[:3] if row.get(c["name"]) is not None]
+                descriptions.append(f"{tname} {c['name']}: {', '.join(values)}" if values else f"{tname} {c['name']}")
+
+        tokens: Dict[str, List[int]] = defaultdict(list)
+        grams: Dict[str, List[int]] = defaultdict(list)
+        for i, norm in enumerate(self.normalized):
+            for tok in name_tokens(norm):
+                tokens[tok].append(i)
+            for g in trigrams(norm):
+                grams[g].append(i)
+        self.token_postings = {k: np.asarray(v, dtype=np.int32) for k, v in tokens.items()}
+        self.trigram_postings = {k: np.asarray(v, dtype=np.int32) for k, v in grams.items()}
+        # per-column feature count, to turn raw overlap into a Dice-style similarity
+        self.feature_counts = np.asarray(
+            [len(trigrams(norm)) + _TOKEN_WEIGHT * len(name_tokens(norm)) for norm in self.normalized],
+            dtype=np.float32,
+        )
+
+        self.embeddings: Optional[np.ndarray] = None
+        if embedder is None and COLUMN_INDEX_EMBEDDINGS and self.names:
+            from app.services.embedding_service import EMBEDDING_SERVICE
+            embedder = EMBEDDING_SERVICE
+        if embedder is not None and self.names:
+            self.embeddings = np.asarray(embedder.encode(descriptions, batch_size=64), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def candidates(self, q: str) -> np.ndarray:
+        """Ids of the columns sharing the most tokens/trigrams with q."""
+        n = len(self.names)
+        if n <= COLUMN_INDEX_FULL_SCAN:
+            return np.arange(n, dtype=np.int32)
+        norm = normalize_name(q)
+        q_grams, q_tokens = trigrams(norm), name_tokens(norm)
+        postings = [self.trigram_postings[g] for g in q_grams if g in self.trigram_postings]
+        # a whole shared token outweighs the handful of trigrams it contributes
+        postings += [self.token_postings[t] for t in q_tokens if t in self.token_postings] * _TOKEN_WEIGHT
+        if not postings:
+            return np.zeros(0, dtype=np.int32)
+        counts = np.bincount(np.concatenate(postings), minlength=n)
+        k = min(COLUMN_INDEX_CANDIDATES, int(np.count_nonzero(counts)))
+        if k == 0:
+            return np.zeros(0, dtype=np.int32)
+        scores = counts / (self.feature_counts + len(q_grams) + _TOKEN_WEIGHT * len(q_tokens))
+        return np.sort(np.argpartition(-scores, k - 1)[:k]).astype(np.int32)
+
+    def match(self, q: str, topn: int = 3) -> List[Tuple[str, float, int]]:
+        """
+        Same contract as rapidfuzz.process.extract over all "table.column" names:
+        [(name, score, index)], index into self.names.
+        """
+        ids = self.candidates(q)
+        if len(ids) == 0:
+            return []
+        found = rf_process.extract(q, [self.names[i] for i in ids], limit=topn)
+        return [(name, score, int(ids[pos])) for name, score, pos in found]
+
+    def semantic_match(self, query_embedding: np.ndarray, topn: int = 3) -> List[Tuple[str, float, int]]:
+        """Columns whose name/sample-value embedding is closest to the query (cosine)."""
+        if self.embeddings is None or not len(self.names):
+            return []
+        q = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        norms = np.linalg.norm(self.embeddings, axis=1) * (np.linalg.norm(q) or 1.0)
+        scores = self.embeddings @ q / np.where(norms == 0, 1.0, norms)
+        top = np.argsort(-scores)[:topn]
+        return [(self.names[i], float(scores[i]), int(i)) for i in top]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "columns": len(self.names),
+            "tokens": len(self.token_postings),
+            "trigrams": len(self.trigram_postings),
+            "embeddings": self.embeddings is not None,
+        }
@@ -1,9 +1,19 @@
 # backend/app/services/db_utils.py
-from sqlalchemy import create_engine, text
+from sqlalchemy import text, inspect
 from typing import List, Dict, Any
+import os
+import io
+import hashlib
+from app.services.engine_registry import ENGINE_REGISTRY
+
+# rows per multi-row INSERT statement
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "1000"))
+# below this many rows a plain INSERT beats creating a staging table for COPY
+DB_COPY_MIN_ROWS = int(os.getenv("DB_COPY_MIN_ROWS", "500"))
 
 def get_engine(connection_string: str):
-    return create_engine(connection_string, future=True)
+    # pooled engine shared with schema discovery and the query engine
+    return ENGINE_REGISTRY.get(connection_string)
 
 def ensure_documents_table(engine):
     ddl = """
@@ -16,15 +26,129 @@ def ensure_documents_table(engine):
     """
     with engine.begin() as conn:
         conn.execute(text(ddl))
+        # content_hash makes re-inserting the same chunk a no-op (older tables get the column added;
+        # ADD COLUMN IF NOT EXISTS is PostgreSQL-only, so look first)
+        if "content_hash" not in {c["name"] for c in inspect(conn).get_columns("documents")}:
+            conn.execute(text("ALTER TABLE documents ADD COLUMN content_hash TEXT"))
+        if str(engine.url) not in _HASHES_BACKFILLED:
+            _backfill_content_hashes(conn)
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS documents_source_hash_idx ON documents (source_file, content_hash)"
+        ))
+    _HASHES_BACKFILLED.add(str(engine.url))
+
+# databases whose documents rows from before content_hash were hashed by this process
+_HASHES_BACKFILLED: set = set()
+
+def _backfill_content_hashes(conn) -> int:
+    """
+    Hash rows stored before content_hash existed; NULL hashes never conflict, so
+    those chunks would otherwise be inserted again. A row whose hash a stored row
+    of the same file already has is a duplicate and keeps NULL.
+    """
+    # SQLite's SERIAL id is not a rowid alias (and may be NULL); rowid always identifies the row
+    key = "rowid" if conn.dialect.name == "sqlite" else "id"
+    rows = conn.execute(text(f"SELECT {key}, source_file, content FROM documents WHERE content_hash IS NULL")).fetchall()
+    for batch in _batches(rows, DB_WRITE_BATCH_SIZE):
+        conn.execute(
+            text(f"""
+                UPDATE documents SET content_hash = :hash
+                 WHERE {key} = :key AND NOT EXISTS (
+                       SELECT 1 FROM documents d WHERE d.source_file = :source AND d.content_hash = :hash)
+            """),
+            [{"key": k, "source": source, "hash": hashlib.sha1((content or "").encode("utf-8")).hexdigest()}
+             for k, source, content in batch],
+        )
+    if rows:
+        print(f"[DB] Backfilled content_hash for {len(rows)} documents rows.")
+    return len(rows)
+
+def _batches(items: List[Dict[str, Any]], size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _insert_values(conn, table: str, columns: List[str], rows: List[Dict[str, Any]],
+                   conflict: str, batch_size: int) -> int:
+    """
+    Insert rows as multi-row VALUES statements (one round-trip per batch).
+    Returns the number of rows actually inserted.
+    """
+    inserted = 0
+    for batch in _batches(rows, batch_size):
+        placeholders = ", ".join(
+            "(" + ", ".join(f":{col}_{i}" for col in columns) + ")" for i in range(len(batch))
+        )
+        params = {f"{col}_{i}": row.get(col) for i, row in enumerate(batch) for col in columns}
+        result = conn.execute(
+            text(f"INSERT INTO {table} ({', '.join(columns)}) VALUES {placeholders} ON CONFLICT {conflict} DO NOTHING"),
+            params,
+        )
+        inserted += max(result.rowcount or 0, 0)
+    return inserted
 
-def insert_documents(engine, chunks: List[Dict[str, Any]]):
+def _copy_field(value: Any) -> str:
+    # COPY csv reads an unquoted empty field as NULL and a quoted one as '', so
+    # every value is quoted and only None is left bare
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+def _copy_merge(conn, table: str, columns: List[str], rows: List[Dict[str, Any]],
+                conflict_columns: List[str]) -> int:
+    """
+    PostgreSQL: COPY rows into a temp staging table, then merge with one
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING. Returns rows inserted.
+    """
+    staging = f"_{table}_staging"
+    cols = ", ".join(columns)
+    conn.execute(text(
+        f"CREATE TEMP TABLE IF NOT EXISTS {staging} AS SELECT {cols} FROM {table} WITH NO DATA"
+    ))
+    conn.execute(text(f"TRUNCATE {staging}"))
+
+    buf = io.StringIO()
+    for row in rows:
+        buf.write(",".join(_copy_field(row.get(col)) for col in columns) + "\n")
+    buf.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {staging} ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cursor.close()
+
+    keys = ", ".join(conflict_columns)
+    result = conn.execute(text(f"""
+        INSERT INTO {table} ({cols})
+        SELECT {cols} FROM {staging}
+        ON CONFLICT ({keys}) DO NOTHING
+    """))
+    return max(result.rowcount or 0, 0)
+
+def _use_copy(conn) -> bool:
+    # COPY goes through psycopg2's cursor.copy_expert
+    return conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2"
+
+def insert_documents(engine, chunks: List[Dict[str, Any]], batch_size: int = DB_WRITE_BATCH_SIZE):
+    """Insert chunks not already stored; returns the number of rows actually inserted."""
     if not chunks:
         return 0
-    insert_sql = text("INSERT INTO documents (content, source_file) VALUES (:content, :source)")
+    rows = []
+    seen = set()
+    for c in chunks:
+        content = c.get("text", "")
+        row = {
+            "content": content,
+            "source_file": c.get("source", ""),
+            "content_hash": hashlib.sha1(content.encode("utf-8")).hexdigest(),
+        }
+        # no point sending the same chunk twice
+        if (row["source_file"], row["content_hash"]) in seen:
+            continue
+        seen.add((row["source_file"], row["content_hash"]))
+        rows.append(row)
     with engine.begin() as conn:
-        for c in chunks:
-            conn.execute(insert_sql, {"content": c.get("text", ""), "source": c.get("source", "")})
-    return len(chunks)
+        return _insert_values(conn, "documents", ["content", "source_file", "content_hash"], rows,
+                              "(source_file, content_hash)", batch_size)
 
 def ensure_employees_table(engine):
     ddl = """
@@ -41,21 +165,17 @@ def ensure_employees_table(engine):
     with engine.begin() as conn:
         conn.execute(text(ddl))
 
-def insert_employees(engine, rows: List[Dict[str, Any]]):
+def insert_employees(engine, rows: List[Dict[str, Any]], batch_size: int = DB_WRITE_BATCH_SIZE):
+    """
+    Insert extracted employee rows, skipping existing (name, role, department).
+    Uses COPY + merge on PostgreSQL for large inputs, multi-row VALUES otherwise.
+    Returns the number of rows actually inserted.
+    """
     if not rows:
         return 0
-    # Use ON CONFLICT to avoid duplicates
-    insert_sql = text("""
-        INSERT INTO employees (name, role, department, raw_text)
-        VALUES (:name, :role, :department, :raw_text)
-        ON CONFLICT (name, role, department) DO NOTHING
-    """)
+    columns = ["name", "role", "department", "raw_text"]
+    rows = [{**r, "raw_text": r.get("raw_text", "")} for r in rows]
     with engine.begin() as conn:
-        for r in rows:
-            conn.execute(insert_sql, {
-                "name": r.get("name"),
-                "role": r.get("role"),
-                "department": r.get("department"),
-                "raw_text": r.get("raw_text", "")
-            })
-    return len(rows)
+        if len(rows) >= DB_COPY_MIN_ROWS and _use_copy(conn):
+            return _copy_merge(conn, "employees", columns, rows, ["name", "role", "department"])
+        return _insert_values(conn, "employees", columns, rows, "(name, role, department)", batch_size)
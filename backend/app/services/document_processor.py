@@ -1,138 +1,499 @@
 # backend/app/services/document_processor.py
 
 import os
+import json
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import closing, contextmanager
 from typing import List, Dict, Any
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import faiss
-from pypdf import PdfReader
 import re
 from datetime import datetime
+from time import perf_counter
+from app.services.embedding_service import EMBEDDING_SERVICE
+from app.services.document_reader import doc_type_of
+from app.services.chunker import ChunkStats, make_splitter, chunker_signature
+from app.services.search_filter import ChunkColumns, ChunkFilter
+from app.services.ann_index import (
+    FAISS_INDEX_TYPE, FAISS_VECTOR_PRECISION, BinaryRerankIndex, build_index, code_bytes, empty_index,
+    index_kind, index_precision, precision_of, precision_report, read_index_file, recall_latency_report,
+    resolve_precision, search_params, target_kind, write_index_file,
+)
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: no cross-process lock
+    fcntl = None
+
+# Where the FAISS index and its chunk metadata are persisted
+FAISS_INDEX_DIR = os.getenv("FAISS_INDEX_DIR", "indexes")
+INDEX_FILENAME = "faiss.index"
+META_FILENAME = "meta.db"
+# raw float32 vectors in index order; ANN rebuilds (incl. lossy PQ) train from these
+VECTORS_FILENAME = "vectors.f32"
+
+# filters selecting at most this many chunks are searched exactly over the stored vectors
+FILTER_EXACT_MAX = int(os.getenv("FILTER_EXACT_MAX", "4096"))
+# filter selections kept for reuse (each is dropped once the index grows)
+FILTER_CACHE_SIZE = int(os.getenv("FILTER_CACHE_SIZE", "32"))
+
+# memory-map the flat vector codes when this faiss build supports it
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+def content_hash(text: str) -> str:
+    """Stable digest of a chunk's text."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def make_chunk_id(source: str, text: str) -> str:
+    """Chunk identity: the same text from the same file always gets the same id."""
+    return f"{source}_{content_hash(text)[:16]}"
+
+def file_digest(file_path: str) -> str:
+    """sha256 of a file's bytes, read in blocks."""
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class ChunkStream:
+    """
+    Incremental chunker for one file: feed() text as pages arrive and get
+    back the chunks completed so far; close() flushes the tail. Only the
+    unfinished tail is buffered, so whole documents are never held in memory.
+    """
+    def __init__(self, splitter, filename: str, stats: ChunkStats | None = None):
+        self.splitter = splitter
+        self.filename = filename
+        self.stats = stats
+        self.seen: set[str] = set()
+        self.emitted = 0
+        # filterable metadata stored with every chunk of this file
+        self.doc_type = doc_type_of(filename)
+        self.ingested_at = datetime.now().isoformat(timespec="seconds")
+
+    def _finish(self, pieces: List[tuple], chars: int, start: float) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        sizes: List[int] = []
+        for txt, tokens in pieces:
+            # content-addressed id; repeated text within a file is kept once
+            chunk_id = make_chunk_id(self.filename, txt)
+            if chunk_id in self.seen:
+                continue
+            self.seen.add(chunk_id)
+            out.append({"text": txt, "source": self.filename, "chunk_id": chunk_id,
+                        "doc_type": self.doc_type, "ingested_at": self.ingested_at})
+            sizes.append(tokens)
+        self.emitted += len(out)
+        if self.stats is not None:
+            self.stats.record(chars, perf_counter() - start, sizes)
+        return out
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        start = perf_counter()
+        return self._finish(self.splitter.feed(text), len(text), start)
+
+    def close(self) -> List[Dict[str, Any]]:
+        start = perf_counter()
+        out = self._finish(self.splitter.close(), 0, start)
+        if not self.emitted:
+            print(f"[DocumentProcessor] No text extracted from {self.filename}")
+        if self.stats is not None:
+            self.stats.model_limit = self.splitter.counter.model_limit
+        return out
+
+class FilterSelection:
+    """Index positions chosen by a metadata filter, plus a FAISS selector over them."""
+    def __init__(self, mask: np.ndarray):
+        self.positions = np.flatnonzero(mask)
+        # the selector reads this bitmap in place, so it must live as long as the selector
+        self._bitmap = np.packbits(mask, bitorder="little")
+        self.selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(self._bitmap))
+
+    def __len__(self) -> int:
+        return len(self.positions)
 
 class DocumentProcessor:
-    def __init__(self):
-        # lazy model load
-        self._model = None
+    def __init__(self, index_dir: str = FAISS_INDEX_DIR):
         self.index: faiss.Index | None = None
         self.chunks_metadata: List[Dict[str, Any]] = []
+        # identities of indexed chunks, used to skip re-embedding unchanged text
+        self.chunk_ids: set[str] = set()
+        self.index_dir = index_dir
+        # a memory-mapped index is read-only; it is reloaded into RAM before the next add
+        self._index_mmapped = False
+        self._index_signature: tuple | None = None
+        self._write_lock = threading.Lock()
+        self.index_type = FAISS_INDEX_TYPE
+        self.precision = resolve_precision(FAISS_VECTOR_PRECISION)
+        self._rebuild_thread: threading.Thread | None = None
+        self.last_rebuild: Dict[str, Any] | None = None
+        # columnar metadata and recent filter selections for filtered search
+        self._columns = ChunkColumns()
+        self._columns_source: int | None = None
+        self._columns_lock = threading.Lock()
+        self._selections: OrderedDict = OrderedDict()
+        self._selections_lock = threading.Lock()
+        self.load()
 
     @property
     def model(self):
-        """Load SentenceTransformer on first access."""
-        if self._model is None:
-            self._model = SentenceTransformer('all-MiniLM-L6-v2')
-        return self._model
+        """Shared process-wide SentenceTransformer (loaded on first access)."""
+        return EMBEDDING_SERVICE.model
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.index_dir, INDEX_FILENAME)
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.index_dir, META_FILENAME)
 
-    def dynamic_chunking(self, content: str, filename: str) -> List[Dict[str, str]]:
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.index_dir, VECTORS_FILENAME)
+
+    def _meta_conn(self) -> sqlite3.Connection:
+        os.makedirs(self.index_dir, exist_ok=True)
+        conn = sqlite3.connect(self.meta_path, timeout=30.0)
+        # position is the vector's row in the FAISS index
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS index_chunks (
+                position INTEGER PRIMARY KEY,
+                chunk_id TEXT,
+                source TEXT,
+                text TEXT,
+                metadata TEXT
+            )
+        """)
+        # files already ingested, so an unchanged re-upload is skipped before parsing;
+        # chunker holds the chunking settings used, so changing them re-ingests the file
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingested_files (
+                source TEXT,
+                file_hash TEXT,
+                chunks INTEGER,
+                ingested_at TEXT,
+                chunker TEXT,
+                PRIMARY KEY (source, file_hash)
+            )
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(ingested_files)")}
+        if "chunker" not in columns:
+            # stores from before chunker was recorded: their files are chunked again on the next upload
+            conn.execute("ALTER TABLE ingested_files ADD COLUMN chunker TEXT")
+        return conn
+
+    def _disk_signature(self) -> tuple | None:
+        try:
+            st = os.stat(self.index_path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    @contextmanager
+    def _store_lock(self):
+        """Serialize index writers in this process and across workers sharing index_dir."""
+        with self._write_lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.index_dir, exist_ok=True)
+            with open(os.path.join(self.index_dir, ".lock"), "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self) -> bool:
         """
-        Split text into paragraph-like chunks.
-        Returns list of {"text","source","chunk_id"} dicts.
+        Load the persisted index (memory-mapped) and its chunk metadata.
+        Returns False and keeps the current state if nothing usable is on disk.
         """
-        paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
-        chunks: List[Dict[str, str]] = []
-        for i, p in enumerate(paragraphs):
-            chunks.append({
-                "text": p,
-                "source": filename,
-                "chunk_id": f"{filename}_{i}"
-            })
-        return chunks
-
-    def _read_file(self, file_path: str) -> str:
+        signature = self._disk_signature()
+        if signature is None:
+            return False
+        try:
+            try:
+                index = read_index_file(self.index_path, _MMAP_FLAGS)
+                # binary codes are read into RAM (they are d/8 bytes per vector)
+                mmapped = not isinstance(index, BinaryRerankIndex)
+            except Exception:
+                index = read_index_file(self.index_path)
+                mmapped = False
+            with closing(self._meta_conn()) as conn:
+                rows = conn.execute(
+                    "SELECT chunk_id, source, text, metadata FROM index_chunks WHERE position < ? ORDER BY position",
+                    (int(index.ntotal),),
+                ).fetchall()
+                first_ingested = dict(conn.execute(
+                    "SELECT source, MIN(ingested_at) FROM ingested_files GROUP BY source"
+                ).fetchall())
+        except Exception as e:
+            print(f"[DocumentProcessor] Failed to load persisted index: {e}")
+            return False
+
+        if len(rows) != index.ntotal:
+            print(f"[DocumentProcessor] Persisted index has {index.ntotal} vectors but {len(rows)} chunks; ignoring it.")
+            return False
+
+        chunks = []
+        for chunk_id, source, text, metadata in rows:
+            chunk = json.loads(metadata) if metadata else {}
+            chunk.update({"text": text, "source": source, "chunk_id": chunk_id})
+            # chunks stored before these were recorded: type from the name, time of the file's first ingestion
+            chunk.setdefault("doc_type", doc_type_of(source))
+            chunk.setdefault("ingested_at", first_ingested.get(source))
+            chunks.append(chunk)
+
+        self.index = self._attach(index)
+        self.chunks_metadata = chunks
+        # recomputed from text so stores written with positional ids dedupe too
+        self.chunk_ids = {make_chunk_id(c.get("source", ""), c["text"]) for c in chunks}
+        self._index_mmapped = mmapped
+        self._index_signature = signature
+        print(f"[DocumentProcessor] Loaded {len(chunks)} chunks from {self.index_path} (mmap={mmapped})")
+        return True
+
+    def refresh_if_changed(self):
+        """Reload when another worker has persisted a newer index."""
+        signature = self._disk_signature()
+        if signature is not None and signature != self._index_signature:
+            self.load()
+
+    def is_file_ingested(self, source: str, file_hash: str) -> bool:
+        """Whether these exact bytes were ingested under the current chunker settings."""
+        with closing(self._meta_conn()) as conn:
+            row = conn.execute("SELECT 1 FROM ingested_files WHERE source = ? AND file_hash = ? AND chunker = ?",
+                               (source, file_hash, chunker_signature())).fetchone()
+        return row is not None
+
+    def record_ingested_files(self, files: List[tuple]):
+        """Remember (source, file_hash, chunk_count) for fully ingested files."""
+        if not files:
+            return
+        now = datetime.now().isoformat()
+        chunker = chunker_signature()
+        with closing(self._meta_conn()) as conn:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO ingested_files (source, file_hash, chunks, ingested_at, chunker) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(source, file_hash, chunks, now, chunker) for source, file_hash, chunks in files],
+                )
+
+    def existing_chunk_ids(self, chunk_ids: List[str]) -> set[str]:
+        """Subset of chunk_ids already in the index."""
+        self.refresh_if_changed()
+        return {cid for cid in chunk_ids if cid in self.chunk_ids}
+
+    def _attach(self, index):
+        """Binary indexes rerank against the stored float vectors."""
+        if isinstance(index, BinaryRerankIndex):
+            index.attach_vectors(self._rerank_vectors)
+        return index
+
+    def _rerank_vectors(self) -> np.ndarray:
+        # whatever is on disk; vectors of a concurrent add may not be written yet
+        dim = int(self.index.d) if self.index is not None else 0
+        rows = os.path.getsize(self.vectors_path) // (dim * 4) if dim and os.path.exists(self.vectors_path) else 0
+        if rows == 0:
+            return np.zeros((0, dim), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, dim))
+
+    def _ensure_writable(self):
+        """Bring a memory-mapped index into RAM so it can be appended to."""
+        if self.index is not None and self._index_mmapped:
+            self.index = self._attach(read_index_file(self.index_path))
+            self._index_mmapped = False
+
+    def save(self, new_chunks: List[Dict[str, Any]], start_position: int, embeddings: np.ndarray | None = None):
         """
-        Read file content. For PDFs, extract text per page and skip None pages.
-        Returns empty string on failure.
+        Persist the index and append metadata (and raw vectors) for chunks added at start_position.
+        Metadata and vectors are written first; load() ignores rows beyond the index
+        size, so a crash between the steps leaves a consistent store.
         """
-        file_path_lower = file_path.lower()
+        if self.index is None:
+            return
+        if embeddings is not None and len(embeddings):
+            self._write_vectors(embeddings, start_position)
+        rows = []
+        for offset, chunk in enumerate(new_chunks):
+            extra = {k: v for k, v in chunk.items() if k not in ("text", "source", "chunk_id")}
+            rows.append((start_position + offset, chunk.get("chunk_id"), chunk.get("source", ""),
+                         chunk.get("text", ""), json.dumps(extra, default=str)))
+        with closing(self._meta_conn()) as conn:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO index_chunks (position, chunk_id, source, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        self._write_index_file()
+
+    def _write_index_file(self):
+        # write-then-rename so readers that mmapped the old file are unaffected
+        tmp_path = f"{self.index_path}.tmp"
+        write_index_file(self.index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+        self._index_signature = self._disk_signature()
+
+    def _write_vectors(self, embeddings: np.ndarray, start_position: int):
+        row_bytes = embeddings.shape[1] * 4
+        mode = "r+b" if os.path.exists(self.vectors_path) else "wb"
+        with open(self.vectors_path, mode) as f:
+            f.seek(start_position * row_bytes)
+            np.ascontiguousarray(embeddings, dtype=np.float32).tofile(f)
+            f.truncate()
+
+    def stored_vectors(self) -> np.ndarray:
+        """
+        Raw vectors for every indexed chunk, memory-mapped from disk.
+        Backfilled from a flat index when the file is missing (e.g. older stores).
+        """
+        if self.index is None or self.index.ntotal == 0:
+            return np.zeros((0, self.index.d if self.index is not None else 0), dtype=np.float32)
+        n, dim = int(self.index.ntotal), int(self.index.d)
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        if size < n * dim * 4:
+            if index_kind(self.index) != "flat" or precision_of(self.index) != "float32":
+                raise RuntimeError("Raw vectors are missing and cannot be recovered from an ANN index.")
+            self._write_vectors(self.index.reconstruct_n(0, n), 0)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n, dim))
+
+    def maybe_promote(self):
+        """Start a background rebuild when the configured index type no longer matches the corpus."""
+        if self.index is None:
+            return
+        n, dim = int(self.index.ntotal), int(self.index.d)
+        wanted = target_kind(n, dim, self.index_type, self.precision)
+        if wanted == index_kind(self.index) and \
+                precision_of(self.index) == index_precision(wanted, self.precision, dim):
+            return
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return
+        self._rebuild_thread = threading.Thread(target=self._rebuild, args=(wanted,), daemon=True,
+                                                name="faiss-rebuild")
+        self._rebuild_thread.start()
+
+    def _rebuild(self, kind: str):
+        """Train/build a new index off the request path, then swap it in."""
+        start = perf_counter()
+        try:
+            vectors = self.stored_vectors()
+            built_from = int(vectors.shape[0])
+            print(f"[DocumentProcessor] Rebuilding FAISS index as {kind} over {built_from} vectors")
+            new_index = self._attach(build_index(kind, vectors, self.precision))
+            with self._store_lock():
+                self.refresh_if_changed()
+                total = int(self.index.ntotal)
+                # catch up with chunks ingested while we were building
+                if total > built_from:
+                    new_index.add(np.ascontiguousarray(self.stored_vectors()[built_from:total]))
+                self.index = new_index
+                self._index_mmapped = False
+                self._write_index_file()
+            self.last_rebuild = {"kind": kind, "vectors": int(new_index.ntotal),
+                                 "duration_ms": round((perf_counter() - start) * 1000, 2)}
+            print(f"[DocumentProcessor] FAISS index rebuilt as {kind}: {self.last_rebuild}")
+        except Exception as e:
+            self.last_rebuild = {"kind": kind, "error": str(e)}
+            print(f"[DocumentProcessor] FAISS rebuild failed: {e}")
+
+    def index_stats(self) -> Dict[str, Any]:
+        ntotal = int(self.index.ntotal) if self.index is not None else 0
+        return {
+            "kind": index_kind(self.index),
+            "configured_type": self.index_type,
+            "target_kind": target_kind(ntotal, int(self.index.d), self.index_type, self.precision)
+            if self.index is not None else None,
+            "precision": precision_of(self.index),
+            "configured_precision": self.precision,
+            "bytes_per_vector": code_bytes(self.index),
+            "vectors": ntotal,
+            "chunks": len(self.chunks_metadata),
+            "mmapped": self._index_mmapped,
+            "rebuilding": self._rebuild_thread is not None and self._rebuild_thread.is_alive(),
+            "last_rebuild": self.last_rebuild,
+        }
+
+    def recall_report(self, k: int = 10, num_queries: int = 200) -> Dict[str, Any]:
+        """recall@k vs latency of the live index against the flat baseline."""
+        if self.index is None:
+            return {"kind": None, "vectors": 0, "results": []}
+        return recall_latency_report(self.index, self.stored_vectors(), k=k, num_queries=num_queries)
 
-        if file_path_lower.endswith('.pdf'):
-            try:
-                reader = PdfReader(file_path)
-                text = ""
-                for page in reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                return text
-            except Exception as e:
-                # keep the error visible in logs
-                print(f"[DocumentProcessor] PDF read error for {file_path}: {e}")
-                return ""
+    def precision_report(self, k: int = 10, num_queries: int = 200) -> Dict[str, Any]:
+        """recall@k, latency and memory per million chunks at each vector precision."""
+        if self.index is None:
+            return {"vectors": 0, "results": []}
+        return precision_report(self.stored_vectors(), k=k, num_queries=num_queries)
 
-        # fallback for plain text files
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        except Exception:
-            return ""
+    def chunk_stream(self, filename: str, stats: ChunkStats | None = None) -> ChunkStream:
+        """Incremental chunker for one file (see ChunkStream); sizes/throughput go to stats."""
+        return ChunkStream(make_splitter(), filename, stats)
 
-    def process_documents(self, file_paths: List[str]) -> tuple[list,list]:
+    def add_embeddings(self, new_chunks_metadata: List[Dict[str, Any]], embeddings: np.ndarray) -> List[str]:
         """
-        Processes multiple documents, generates embeddings, and indexes them into FAISS.
-        Returns a list of chunk IDs that were added.
+        Index precomputed embeddings (one row per chunk) into FAISS and persist them.
+        Chunks that are already indexed are skipped.
+        Returns the chunk IDs that were added.
         """
-        all_chunks_text: List[str] = []
-        new_chunks_metadata: List[Dict[str, Any]] = []
-
-        # 1) chunk and collect text
-        for file_path in file_paths:
-            filename = os.path.basename(file_path)
-            content = self._read_file(file_path)
-            chunks = self.dynamic_chunking(content, filename)
-
-            if not content or not content.strip():
-                print(f"[DocumentProcessor] No text extracted from {filename}")
-                continue
+        if not new_chunks_metadata:
+            return []
 
-            chunks = self.dynamic_chunking(content, filename)
+        # convert to numpy float32 and ensure 2D shape
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings.reshape(1, -1)
 
-            # fallback: if dynamic_chunking returned nothing, add full content as one chunk
-            if not chunks:
-                chunks = [{"text": content, "source": filename, "chunk_id": f"{filename}_0"}]
+        with self._store_lock():
+            # pick up anything other workers persisted since we last loaded
+            self.refresh_if_changed()
 
-            for chunk in chunks:
-                # ensure chunk has text
-                txt = chunk.get("text", "").strip()
-                if not txt:
-                    continue
-                all_chunks_text.append(txt)
-                new_chunks_metadata.append(chunk)
+            # another request may have indexed the same chunks since they were filtered
+            keep = [i for i, c in enumerate(new_chunks_metadata) if c["chunk_id"] not in self.chunk_ids]
+            if len(keep) < len(new_chunks_metadata):
+                new_chunks_metadata = [new_chunks_metadata[i] for i in keep]
+                embeddings = embeddings[keep]
+            if not new_chunks_metadata:
+                return []
 
-        if not all_chunks_text:
-            print("[DocumentProcessor] No chunks to index after processing all files.")
-            return [],[]
+            self._ensure_writable()
 
-        # 2) generate embeddings (ensure we get a numpy array)
-        try:
-            embeddings = self.model.encode(all_chunks_text, convert_to_tensor=False, batch_size=32).astype(np.float32)
-        except Exception as e:
-            print(f"[DocumentProcessor] Embedding generation failed: {e}")
-            return []
+            # initialize FAISS index if needed
+            if self.index is None:
+                embedding_dim = embeddings.shape[1]
+                self.index = self._attach(empty_index(embedding_dim, self.precision, embeddings))
+                print(f"[DocumentProcessor] Initialized FAISS index with dim {embedding_dim} ({self.precision})")
 
-        # convert to numpy float32 and ensure 2D shape
-        embeddings = np.array(embeddings, dtype=np.float32)
-        if embeddings.ndim == 1:
-            embeddings = embeddings.reshape(1, -1)
+            # add to index
+            start_position = len(self.chunks_metadata)
+            try:
+                self.index.add(embeddings)
+            except Exception as e:
+                print(f"[DocumentProcessor] FAISS add failed: {e}")
+                return []
 
-        # 3) initialize FAISS index if needed
-        if self.index is None:
-            embedding_dim = embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(embedding_dim)
-            print(f"[DocumentProcessor] Initialized FAISS index with dim {embedding_dim}")
+            # update metadata (order must match index vectors)
+            self.chunks_metadata.extend(new_chunks_metadata)
+            self.chunk_ids.update(c["chunk_id"] for c in new_chunks_metadata)
 
-        # 4) add to index
-        try:
-            self.index.add(embeddings)
-        except Exception as e:
-            print(f"[DocumentProcessor] FAISS add failed: {e}")
-            return []
+            # persist index + metadata for fast cold starts and other workers
+            try:
+                self.save(new_chunks_metadata, start_position, embeddings)
+            except Exception as e:
+                print(f"[DocumentProcessor] Persisting FAISS index failed: {e}")
 
-        # 5) update metadata (order must match index vectors)
-        self.chunks_metadata.extend(new_chunks_metadata)
+        # promote flat -> ANN (or apply a changed FAISS_INDEX_TYPE) in the background
+        self.maybe_promote()
 
         print(f"[DocumentProcessor] Indexed {len(new_chunks_metadata)} chunks. Total chunks: {len(self.chunks_metadata)}")
+        return [c['chunk_id'] for c in new_chunks_metadata]
 
-        return [c['chunk_id'] for c in new_chunks_metadata],self.extract_structured_rows()
     def extract_structured_rows(self, chunks: List[Dict[str, Any]] | None = None) -> List[Dict[str, Any]]:
         """
         Extracts structured employee info from given document chunks.
@@ -142,10 +503,14 @@ class DocumentProcessor:
             chunks = self.chunks_metadata
 
         rows = []
+        # overlapping chunks repeat lines; each line yields at most one row
+        seen_lines = set()
         for chunk in chunks:
             text = chunk["text"]
             lines = text.split("\n")
             for line in lines:
+                if line.strip() in seen_lines:
+                    continue
                 match = re.search(
                     r"Name\s*[:\-]?\s*(?P<name>[^\n,]+).*?Role\s*[:\-]?\s*(?P<role>[^\n,]+).*?(Dept|Department)\s*[:\-]?\s*(?P<department>[^\n,]+)",
                     line, re.IGNORECASE
@@ -157,14 +522,68 @@ class DocumentProcessor:
                         "department": match.group("department").strip(),
                         "raw_text": line.strip()
                     })
+                    seen_lines.add(line.strip())
         return rows
 
 
-    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def chunk_columns(self) -> ChunkColumns:
+        """Filterable metadata of every indexed chunk, kept in step with chunks_metadata."""
+        chunks = self.chunks_metadata
+        with self._columns_lock:
+            # chunks_metadata only grows in place or is replaced on reload
+            if self._columns_source != id(chunks) or len(self._columns) > len(chunks):
+                self._columns = ChunkColumns()
+                self._columns_source = id(chunks)
+            if len(self._columns) < len(chunks):
+                self._columns.extend(chunks[len(self._columns):])
+            return self._columns
+
+    def select(self, filters: ChunkFilter | None) -> FilterSelection | None:
+        """
+        Index positions passing filters (None when there is nothing to filter).
+        Selections are cached per filter until the index changes, so a batch
+        or a repeated filter evaluates the predicates once.
         """
-        Search FAISS for the query and return matched chunk metadata.
-        This function is robust to small index sizes and returns [] if nothing is found.
+        if filters is None or filters.is_empty:
+            return None
+        self.refresh_if_changed()
+        columns = self.chunk_columns()
+        key = (filters.key, self._columns_source, len(columns))
+        with self._selections_lock:
+            selection = self._selections.get(key)
+            if selection is not None:
+                self._selections.move_to_end(key)
+                return selection
+        selection = FilterSelection(filters.mask(columns))
+        with self._selections_lock:
+            self._selections[key] = selection
+            while len(self._selections) > FILTER_CACHE_SIZE:
+                self._selections.popitem(last=False)
+        return selection
+
+    def filter_chunk_ids(self, filters: ChunkFilter | None) -> set[str] | None:
+        """chunk_ids passing filters (None when there is nothing to filter)."""
+        selection = self.select(filters)
+        if selection is None:
+            return None
+        chunks = self.chunks_metadata
+        return {chunks[int(i)]["chunk_id"] for i in selection.positions if i < len(chunks)}
+
+    def _search_exact(self, qvec: np.ndarray, k: int, positions: np.ndarray) -> tuple:
+        """Brute-force L2 over a filtered subset of the stored raw vectors."""
+        vectors = np.asarray(self.stored_vectors()[positions], dtype=np.float32)
+        D, I = faiss.knn(qvec, vectors, k)
+        return D, np.where(I >= 0, positions[I], -1)
+
+    def search_by_vector(self, qvec: np.ndarray, top_k: int = 5, nprobe: int | None = None,
+                         ef_search: int | None = None, filters: ChunkFilter | None = None) -> List[Dict[str, Any]]:
         """
+        Search FAISS with a precomputed query vector.
+        filters are pushed into the index as an ID selector; small selections
+        are instead scanned exactly over the stored vectors.
+        Returns copies of the matched chunk metadata with an added "distance".
+        """
+        self.refresh_if_changed()
         if self.index is None:
             print("[DocumentProcessor] FAISS index not initialized (search).")
             return []
@@ -174,25 +593,34 @@ class DocumentProcessor:
             print("[DocumentProcessor] No vectors indexed (search).")
             return []
 
-        # encode query vector
-        try:
-            qvec = self.model.encode([query], convert_to_tensor=False)
-        except Exception as e:
-            print(f"[DocumentProcessor] Query embedding failed: {e}")
-            return []
-
-        qvec = np.array(qvec, dtype=np.float32)
+        qvec = np.asarray(qvec, dtype=np.float32)
         if qvec.ndim == 1:
             qvec = qvec.reshape(1, -1)
 
-        # ensure k is <= number of indexed vectors and > 0
-        k = min(top_k, total_vectors)
+        selection = self.select(filters)
+        # ensure k is <= number of indexed (or selected) vectors and > 0
+        k = min(top_k, total_vectors if selection is None else len(selection))
         if k <= 0:
             return []
 
         # perform search
         try:
-            D, I = self.index.search(qvec, k)
+            index = self.index
+            # binary codes cannot take a selector; their rerank needs the float vectors anyway
+            exact = selection is not None and \
+                (len(selection) <= FILTER_EXACT_MAX or isinstance(index, BinaryRerankIndex))
+            if exact:
+                try:
+                    D, I = self._search_exact(qvec, k, selection.positions)
+                except RuntimeError:
+                    # no raw vectors to scan (older ANN store); let the index filter
+                    if isinstance(index, BinaryRerankIndex):
+                        raise
+                    exact = False
+            if not exact:
+                selector = selection.selector if selection is not None else None
+                D, I = index.search(qvec, k, params=search_params(index, nprobe=nprobe, ef_search=ef_search,
+                                                                  selector=selector))
         except Exception as e:
             print(f"[DocumentProcessor] FAISS search failed: {e}")
             return []
@@ -201,11 +629,12 @@ class DocumentProcessor:
         print(f"[DocumentProcessor] FAISS returned indices: {I} distances: {D}")
 
         results: List[Dict[str, Any]] = []
-        for idx in I[0]:
+        for idx, dist in zip(I[0], D[0]):
             # FAISS may return -1 for empty slots; ensure valid index before read
-            if idx is None:
-                continue
-            if isinstance(idx, (int, np.integer)) and 0 <= int(idx) < len(self.chunks_metadata):
-                results.append(self.chunks_metadata[int(idx)])
+            if 0 <= int(idx) < len(self.chunks_metadata):
+                results.append({**self.chunks_metadata[int(idx)], "distance": float(dist)})
 
         return results
+
+# shared instance used by ingestion and the query engine
+DOCUMENT_PROCESSOR = DocumentProcessor()
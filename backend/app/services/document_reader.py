@@ -0,0 +1,86 @@
+# backend/app/services/document_reader.py
+
+# Kept free of model/index imports so it is cheap to load in parse worker processes.
+import os
+from typing import Iterator, List, Optional
+from pypdf import PdfReader
+
+# plain-text files are read this many bytes at a time
+TEXT_READ_BLOCK_BYTES = int(os.getenv("TEXT_READ_BLOCK_BYTES", str(1 << 20)))
+
+
+def is_pdf(file_path: str) -> bool:
+    return file_path.lower().endswith('.pdf')
+
+
+def doc_type_of(filename: str) -> str:
+    """Document type used for metadata filters: the lower-case extension ("pdf", "txt"), or "text"."""
+    ext = os.path.splitext(filename)[1].lstrip(".").lower()
+    return ext or "text"
+
+
+def pdf_page_count(file_path: str) -> int:
+    """Number of pages (0 if the PDF cannot be opened)."""
+    try:
+        return len(PdfReader(file_path).pages)
+    except Exception as e:
+        print(f"[DocumentProcessor] PDF read error for {file_path}: {e}")
+        return 0
+
+
+def _iter_pdf_pages(file_path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    # one reader per call; pypdf parses page objects only when they are accessed
+    try:
+        pages = PdfReader(file_path).pages
+    except Exception as e:
+        print(f"[DocumentProcessor] PDF read error for {file_path}: {e}")
+        return
+    for i in range(start, len(pages) if stop is None else min(stop, len(pages))):
+        try:
+            yield pages[i].extract_text() or ""
+        except Exception as e:
+            print(f"[DocumentProcessor] PDF page {i} read error for {file_path}: {e}")
+            yield ""
+
+
+def read_pdf_pages(file_path: str, start: int, stop: int) -> List[str]:
+    """
+    Text of pages [start, stop) of a PDF, one string per page ("" for pages
+    without text). Runs in parse workers, so each call opens its own reader.
+    """
+    return list(_iter_pdf_pages(file_path, start, stop))
+
+
+def iter_text_blocks(file_path: str, block_size: int = TEXT_READ_BLOCK_BYTES) -> Iterator[str]:
+    """Yield a UTF-8 text file in blocks of about block_size characters."""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    return
+                yield block
+    except Exception as e:
+        print(f"[DocumentProcessor] Text read error for {file_path}: {e}")
+
+
+def iter_document_pages(file_path: str) -> Iterator[str]:
+    """
+    Lazily yield a document's text: one newline-terminated string per PDF page
+    with text, or successive blocks of a plain text file. Concatenated, the
+    pieces equal read_document(file_path).
+    """
+    if not is_pdf(file_path):
+        yield from iter_text_blocks(file_path)
+        return
+    for text in _iter_pdf_pages(file_path):
+        if text:
+            yield text + "\n"
+
+
+def read_document(file_path: str) -> str:
+    """
+    Read file content. For PDFs, extract text per page and skip None pages.
+    Returns empty string on failure.
+    """
+    return "".join(iter_document_pages(file_path))
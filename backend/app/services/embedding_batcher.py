@@ -0,0 +1,145 @@
+# backend/app/services/embedding_batcher.py
+
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import List, Dict, Any, Tuple
+import numpy as np
+
+from app.services.embedding_service import EMBEDDING_SERVICE, EmbeddingService
+
+# How long the first request in a batch waits for company, and the batch size cap
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "3"))
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+
+
+class EmbeddingBatcher:
+    """
+    Asyncio micro-batcher in front of the embedding model.
+    Concurrent callers are grouped into one model.encode() call that runs in a
+    worker thread, so the event loop is never blocked by a forward pass.
+    """
+    def __init__(self, embedder: EmbeddingService = EMBEDDING_SERVICE,
+                 window_ms: float = EMBED_BATCH_WINDOW_MS, max_batch_size: int = EMBED_BATCH_MAX_SIZE):
+        self.embedder = embedder
+        self.window_s = max(window_ms, 0.0) / 1000.0
+        self.max_batch_size = max(max_batch_size, 1)
+        # a single worker thread keeps forward passes serialized
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed-batcher")
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        # metrics
+        self.batches = 0
+        self.items = 0
+        self.last_batch_size = 0
+        self.max_seen_batch_size = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.total_encode_ms = 0.0
+
+    def _ensure_worker(self) -> asyncio.AbstractEventLoop:
+        """Start (or restart) the batching task on the running loop."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        return loop
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed one text; returns a 1D float32 vector."""
+        cached = self.embedder.query_cache.get(text)
+        if cached is not None:
+            return cached
+        loop = self._ensure_worker()
+        fut = loop.create_future()
+        await self._queue.put((text, fut, perf_counter()))
+        vec = await fut
+        self.embedder.query_cache.set(text, vec)
+        return vec
+
+    async def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Embed several texts through the same batching queue."""
+        if not texts:
+            return np.zeros((0, self.embedder.dimension), dtype=np.float32)
+        vecs = await asyncio.gather(*(self.embed(t) for t in texts))
+        return np.vstack(vecs)
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future, float]]:
+        """Wait for one request, then gather more until the window or size cap is hit."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.window_s
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # identical texts in one batch are encoded once
+            unique: Dict[str, int] = {}
+            for text, _, _ in batch:
+                unique.setdefault(text, len(unique))
+            texts = list(unique.keys())
+
+            dispatched = perf_counter()
+            try:
+                embs = await loop.run_in_executor(self._executor, self.embedder.encode, texts)
+            except Exception as e:
+                print(f"[EmbeddingBatcher] Batch encode failed: {e}")
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            done = perf_counter()
+
+            self._record(batch, dispatched, done)
+            for text, fut, _ in batch:
+                if not fut.done():
+                    fut.set_result(embs[unique[text]])
+
+    def _record(self, batch, dispatched: float, done: float):
+        size = len(batch)
+        self.batches += 1
+        self.items += size
+        self.last_batch_size = size
+        self.max_seen_batch_size = max(self.max_seen_batch_size, size)
+        for _, _, enqueued in batch:
+            wait_ms = (dispatched - enqueued) * 1000
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.total_encode_ms += (done - dispatched) * 1000
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, batch size and wait time metrics."""
+        return {
+            "window_ms": self.window_s * 1000,
+            "max_batch_size": self.max_batch_size,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "last_batch_size": self.last_batch_size,
+            "max_seen_batch_size": self.max_seen_batch_size,
+            "avg_wait_ms": round(self.total_wait_ms / self.items, 3) if self.items else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+            "avg_encode_ms": round(self.total_encode_ms / self.batches, 3) if self.batches else 0.0,
+        }
+
+# singleton instance
+EMBEDDING_BATCHER = EmbeddingBatcher()
@@ -0,0 +1,125 @@
+# backend/app/services/embedding_service.py
+
+import os
+import threading
+from time import time
+from typing import List, Dict, Any
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from app.services.cache import QUERY_EMBEDDING_CACHE, QueryEmbeddingCache
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+
+
+def _process_rss_bytes() -> int:
+    """Current resident set size of this process (0 if it cannot be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+
+class EmbeddingService:
+    """
+    Owns the process-wide SentenceTransformer.
+    The model is loaded once, on first use, and shared by every caller.
+    """
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME,
+                 query_cache: QueryEmbeddingCache = QUERY_EMBEDDING_CACHE):
+        self.model_name = model_name
+        self.query_cache = query_cache
+        self._model: SentenceTransformer | None = None
+        self._lock = threading.Lock()
+        self.load_time_ms: float | None = None
+        self.rss_delta_bytes: int | None = None
+        self.param_bytes: int | None = None
+        self.encode_calls = 0
+        self.encoded_texts = 0
+
+    @property
+    def model(self) -> SentenceTransformer:
+        """Load the model on first access (thread-safe)."""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    rss_before = _process_rss_bytes()
+                    start = time()
+                    model = SentenceTransformer(self.model_name)
+                    self.load_time_ms = round((time() - start) * 1000, 2)
+                    self.rss_delta_bytes = max(_process_rss_bytes() - rss_before, 0)
+                    try:
+                        self.param_bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+                    except Exception:
+                        self.param_bytes = None
+                    self._model = model
+                    print(f"[EmbeddingService] Loaded {self.model_name} in {self.load_time_ms} ms")
+        return self._model
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def dimension(self) -> int:
+        return int(self.model.get_sentence_embedding_dimension())
+
+    @property
+    def tokenizer(self):
+        """The model's (HF) tokenizer, or None if the model does not expose one."""
+        return getattr(self.model, "tokenizer", None)
+
+    @property
+    def max_seq_length(self) -> int | None:
+        """Tokens the model reads per text; anything longer is truncated."""
+        return getattr(self.model, "max_seq_length", None)
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """Embed texts and return a 2D float32 array (one row per text)."""
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        embs = self.model.encode(texts, convert_to_numpy=True, batch_size=batch_size)
+        embs = np.asarray(embs, dtype=np.float32)
+        if embs.ndim == 1:
+            embs = embs.reshape(1, -1)
+        self.encode_calls += 1
+        self.encoded_texts += len(texts)
+        return embs
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed one search query, reusing cached vectors for equivalent text."""
+        vec = self.query_cache.get(query)
+        if vec is None:
+            vec = self.encode([query])[0]
+            self.query_cache.set(query, vec)
+        return vec
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed many queries: cached vectors are reused, the rest go through one encode call."""
+        vecs: List[np.ndarray | None] = [self.query_cache.get(q) for q in queries]
+        missing = list(dict.fromkeys(q for q, v in zip(queries, vecs) if v is None))
+        if missing:
+            fresh = dict(zip(missing, self.encode(missing)))
+            for q, vec in fresh.items():
+                self.query_cache.set(q, vec)
+            vecs = [fresh[q] if v is None else v for q, v in zip(queries, vecs)]
+        if not vecs:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.vstack(vecs).astype(np.float32, copy=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Load time and memory footprint of the shared model."""
+        return {
+            "model_name": self.model_name,
+            "loaded": self.is_loaded,
+            "load_time_ms": self.load_time_ms,
+            "model_param_bytes": self.param_bytes,
+            "rss_delta_bytes": self.rss_delta_bytes,
+            "process_rss_bytes": _process_rss_bytes(),
+            "encode_calls": self.encode_calls,
+            "encoded_texts": self.encoded_texts,
+        }
+
+# singleton instance
+EMBEDDING_SERVICE = EmbeddingService()
@@ -0,0 +1,251 @@
+# backend/app/services/engine_registry.py
+
+import os
+import asyncio
+import threading
+from collections import deque
+from time import perf_counter
+from typing import Dict, Any, Optional
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+except ImportError:  # needs greenlet (sqlalchemy[asyncio]); queries then run in the threadpool
+    AsyncEngine = Any
+    create_async_engine = None
+
+from app.services.cache import connection_fingerprint
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# seconds; recycle before typical server/proxy idle timeouts drop the connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+_LATENCY_SAMPLES = 1000
+
+# async driver used for each sync backend; others have no async path here
+_ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+class PoolStats:
+    """Checkout latency and saturation counters for one engine's pool."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.peak_checked_out = 0
+        self.latencies_ms: deque = deque(maxlen=_LATENCY_SAMPLES)
+
+    def record(self, ms: float, checked_out: int):
+        with self.lock:
+            self.checkouts += 1
+            self.latencies_ms.append(ms)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            samples = sorted(self.latencies_ms)
+            checkouts, timeouts, peak = self.checkouts, self.timeouts, self.peak_checked_out
+        def pct(p: float) -> Optional[float]:
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3) if samples else None
+        return {
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "peak_checked_out": peak,
+            "checkout_ms_avg": round(sum(samples) / len(samples), 3) if samples else None,
+            "checkout_ms_p50": pct(0.50),
+            "checkout_ms_p95": pct(0.95),
+            "checkout_ms_max": round(samples[-1], 3) if samples else None,
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long callers wait for a connection."""
+    _depth = threading.local()
+
+    def _do_get(self):
+        # QueuePool._do_get recurses on overflow races; only time the outermost call
+        depth = getattr(self._depth, "n", 0)
+        stats: Optional[PoolStats] = getattr(self, "_stats", None)
+        if depth or stats is None:
+            return super()._do_get()
+        self._depth.n = 1
+        start = perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            with stats.lock:
+                stats.timeouts += 1
+            raise
+        finally:
+            self._depth.n = 0
+        stats.record((perf_counter() - start) * 1000, self.checkedout())
+        return conn
+
+
+class EngineRegistry:
+    """
+    One SQLAlchemy engine (and connection pool) per connection string, shared
+    by schema discovery, the query engine and ingestion writes.
+    """
+    def __init__(self):
+        self._engines: Dict[str, Engine] = {}
+        self._stats: Dict[str, PoolStats] = {}
+        # None marks a connection string whose async driver is unavailable
+        self._async_engines: Dict[str, Optional[AsyncEngine]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, connection_string: str) -> Engine:
+        engine = self._engines.get(connection_string)
+        if engine is not None:
+            return engine
+        with self._lock:
+            engine = self._engines.get(connection_string)
+            if engine is None:
+                engine = self._create(connection_string)
+                self._engines[connection_string] = engine
+                print(f"[EngineRegistry] Created engine {connection_fingerprint(connection_string)} "
+                      f"({engine.dialect.name}, pool={type(engine.pool).__name__})")
+            return engine
+
+    def _create(self, connection_string: str) -> Engine:
+        if make_url(connection_string).get_backend_name() == "sqlite":
+            # SQLite picks its own pool (singleton for :memory:); sizing options don't apply
+            return create_engine(connection_string, future=True, pool_pre_ping=DB_POOL_PRE_PING)
+        engine = create_engine(
+            connection_string,
+            future=True,
+            poolclass=InstrumentedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+        stats = PoolStats()
+        engine.pool._stats = stats
+        self._stats[connection_string] = stats
+        return engine
+
+    def get_async(self, connection_string: str) -> Optional[AsyncEngine]:
+        """
+        Async engine for the same database (asyncpg for PostgreSQL), or None
+        when there is no async driver for it.
+        """
+        if connection_string in self._async_engines:
+            return self._async_engines[connection_string]
+        with self._lock:
+            if connection_string not in self._async_engines:
+                self._async_engines[connection_string] = self._create_async(connection_string)
+            return self._async_engines[connection_string]
+
+    def _create_async(self, connection_string: str) -> Optional[AsyncEngine]:
+        url = make_url(connection_string)
+        driver = _ASYNC_DRIVERS.get(url.get_backend_name())
+        if driver is None or create_async_engine is None:
+            return None
+        url = url.set(drivername=f"{url.get_backend_name()}+{driver}")
+        try:
+            if url.get_backend_name() == "sqlite":
+                engine = create_async_engine(url, pool_pre_ping=DB_POOL_PRE_PING)
+            else:
+                engine = create_async_engine(
+                    url,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_timeout=DB_POOL_TIMEOUT,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_pre_ping=DB_POOL_PRE_PING,
+                )
+        except Exception as e:
+            print(f"[EngineRegistry] Async driver {driver} unavailable ({e}); using the sync engine.")
+            return None
+        print(f"[EngineRegistry] Created async engine {connection_fingerprint(connection_string)} ({driver})")
+        return engine
+
+    def disable_async(self, connection_string: str, reason: Any = None):
+        """
+        Stop using the async engine for a connection string (its driver failed
+        where the sync one may not: unsupported URL options, auth/SSL
+        differences); later callers get None and run in the threadpool.
+        """
+        with self._lock:
+            async_engine = self._async_engines.get(connection_string)
+            self._async_engines[connection_string] = None
+        if async_engine is None:
+            return
+        print(f"[EngineRegistry] Async engine {connection_fingerprint(connection_string)} unusable ({reason}); "
+              f"using the sync engine.")
+        self._dispose_async(async_engine)
+
+    def _dispose_async(self, async_engine: AsyncEngine):
+        try:
+            asyncio.get_running_loop().create_task(async_engine.dispose())
+        except RuntimeError:
+            # no event loop to close the connections on; just drop the pool
+            async_engine.sync_engine.dispose(close=False)
+
+    def dispose(self, connection_string: str):
+        """Close every pooled connection for a connection string and forget the engine."""
+        with self._lock:
+            engine = self._engines.pop(connection_string, None)
+            async_engine = self._async_engines.pop(connection_string, None)
+            self._stats.pop(connection_string, None)
+        if engine is not None:
+            engine.dispose()
+            print(f"[EngineRegistry] Disposed engine {connection_fingerprint(connection_string)}")
+        if async_engine is not None:
+            self._dispose_async(async_engine)
+
+    def dispose_all(self):
+        for connection_string in set(self._engines) | set(self._async_engines):
+            self.dispose(connection_string)
+
+    def _pool_info(self, engine: Engine) -> Dict[str, Any]:
+        pool = engine.pool
+        info: Dict[str, Any] = {"dialect": engine.dialect.name, "pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            max_overflow = getattr(pool, "_max_overflow", DB_MAX_OVERFLOW)
+            capacity = pool.size() + max(max_overflow, 0)
+            checked_out = pool.checkedout()
+            info.update({
+                "size": pool.size(),
+                "max_overflow": max_overflow,
+                "checked_out": checked_out,
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "saturation": round(checked_out / capacity, 4) if capacity else None,
+            })
+        return info
+
+    def get_stats(self) -> Dict[str, Any]:
+        pools = {}
+        for connection_string, engine in list(self._engines.items()):
+            info = self._pool_info(engine)
+            stats = self._stats.get(connection_string)
+            if stats is not None:
+                info.update(stats.snapshot())
+            pools[connection_fingerprint(connection_string)] = info
+        async_pools = {
+            connection_fingerprint(cs): self._pool_info(engine.sync_engine)
+            for cs, engine in list(self._async_engines.items()) if engine is not None
+        }
+        return {
+            "engines": len(pools),
+            "async_pools": async_pools,
+            "config": {
+                "pool_size": DB_POOL_SIZE,
+                "max_overflow": DB_MAX_OVERFLOW,
+                "pool_timeout": DB_POOL_TIMEOUT,
+                "pool_recycle": DB_POOL_RECYCLE,
+                "pool_pre_ping": DB_POOL_PRE_PING,
+            },
+            "pools": pools,
+        }
+
+# singleton instance
+ENGINE_REGISTRY = EngineRegistry()
@@ -0,0 +1,331 @@
+# backend/app/services/ingestion_jobs.py
+
+import os
+import uuid
+import asyncio
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, BrokenExecutor
+from datetime import datetime
+from time import perf_counter
+from typing import List, Dict, Any, Optional, AsyncIterator
+import numpy as np
+
+from starlette.concurrency import run_in_threadpool
+
+from app.services.document_reader import is_pdf, pdf_page_count, read_pdf_pages, iter_text_blocks
+from app.services.retrieval import RetrievalEngine, RETRIEVAL_ENGINE
+from app.services.chunker import ChunkStats
+from app.services.job_store import IngestionJobStore, INGESTION_JOB_STORE, INGEST_JOB_HISTORY
+
+# PDF text extraction is CPU-bound and holds the GIL, so it runs in worker processes
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# PDF pages extracted per worker task; a few tasks per worker are kept in flight
+INGEST_PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "8"))
+INGEST_PARSE_WINDOW = int(os.getenv("INGEST_PARSE_WINDOW", "2"))
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "256"))
+# chunks embedded, indexed and persisted together as they leave the chunker; bounds a job's memory
+INGEST_INDEX_BATCH = int(os.getenv("INGEST_INDEX_BATCH", "1024"))
+# seconds between progress writes to the shared job store (stage changes are always written)
+INGEST_JOB_PUBLISH_SECONDS = float(os.getenv("INGEST_JOB_PUBLISH_SECONDS", "0.5"))
+
+STAGES = ("parse", "chunk", "embed", "index", "persist")
+
+
+
+class PersistSink:
+    """
+    Last stage of a job: write() receives each batch of newly indexed chunks
+    (and the structured rows extracted from them); finish() runs once all
+    files are done and returns what is merged into the job result.
+    """
+    def write(self, chunks: List[Dict[str, Any]], extracted_rows: List[Dict[str, Any]]):
+        pass
+
+    def finish(self) -> Dict[str, Any]:
+        return {}
+
+
+class IngestionJob:
+    """Status of one upload moving through parse -> chunk -> embed -> index -> persist."""
+    def __init__(self, paths: List[str], filenames: List[str], store: Optional[IngestionJobStore] = None):
+        self.id = uuid.uuid4().hex
+        self.paths = paths
+        self.filenames = filenames
+        self.status = "queued"
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.error: Optional[str] = None
+        self.result: Dict[str, Any] = {}
+        self.stages: Dict[str, Dict[str, Any]] = {
+            name: {"status": "pending", "done": 0, "total": None, "duration_ms": None} for name in STAGES
+        }
+        self.task: Optional[asyncio.Task] = None
+        self.store = store
+        self._published_at = 0.0
+
+    def publish(self, force: bool = True):
+        """Hand the current status to the shared store's writer thread (progress-only updates are throttled)."""
+        if self.store is None:
+            return
+        now = perf_counter()
+        if not force and now - self._published_at < INGEST_JOB_PUBLISH_SECONDS:
+            return
+        self._published_at = now
+        self.store.publish(self.to_dict())
+
+    def start_stage(self, name: str, total: Optional[int] = None):
+        stage = self.stages[name]
+        stage.update({"status": "running", "total": total, "done": 0})
+        stage["_start"] = perf_counter()
+        self.publish()
+
+    def advance(self, name: str, done: int):
+        self.stages[name]["done"] = done
+        self.publish(force=False)
+
+    def finish_stage(self, name: str, done: Optional[int] = None):
+        stage = self.stages[name]
+        if done is not None:
+            stage["done"] = done
+        stage["status"] = "completed"
+        stage["duration_ms"] = round((perf_counter() - stage.pop("_start", perf_counter())) * 1000, 2)
+        self.publish()
+
+    def to_dict(self) -> Dict[str, Any]:
+        stages = {}
+        for name, stage in self.stages.items():
+            info = {k: v for k, v in stage.items() if not k.startswith("_")}
+            total = info.get("total")
+            info["progress"] = round(info["done"] / total, 4) if total else (1.0 if info["status"] == "completed" else 0.0)
+            stages[name] = info
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "filenames": self.filenames,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "stages": stages,
+            # a copy: the store's writer thread serializes it while the job keeps running
+            "result": dict(self.result),
+            "error": self.error,
+        }
+
+
+class IngestionJobManager:
+    """
+    Runs uploads as background jobs so ingestion never blocks the event loop.
+    PDF pages are extracted in a process pool and streamed, in order, into the
+    chunker; chunking, embedding, indexing and DB writes run in the threadpool.
+    """
+    def __init__(self, retrieval: RetrievalEngine = RETRIEVAL_ENGINE, parse_workers: int = INGEST_PARSE_WORKERS,
+                 store: Optional[IngestionJobStore] = INGESTION_JOB_STORE):
+        self.retrieval = retrieval
+        self.store = store
+        self.parse_workers = max(parse_workers, 1)
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+        self._pool_unavailable = False
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._parse_pool is None:
+            # spawn: never fork a process that already runs model/event-loop threads
+            self._parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+        return self._parse_pool
+
+    def submit(self, paths: List[str], filenames: List[str], persist: Optional[PersistSink] = None) -> IngestionJob:
+        """Queue a job for already-saved files; the files are deleted when it finishes."""
+        job = IngestionJob(paths, filenames, self.store)
+        job.publish()
+        self.jobs[job.id] = job
+        # bounded history of finished jobs
+        while len(self.jobs) > INGEST_JOB_HISTORY:
+            oldest = next(iter(self.jobs.values()))
+            if oldest.status in ("queued", "running"):
+                break
+            self.jobs.popitem(last=False)
+        job.task = asyncio.get_running_loop().create_task(self._run(job, persist))
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status of a job run by this worker or, through the shared store, by any other."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.store is None:
+            return None
+        try:
+            return self.store.get(job_id)
+        except Exception as e:
+            print(f"[Ingestion] Could not read status of job {job_id}: {e}")
+            return None
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """Newest jobs first, from every worker sharing the store."""
+        local = [job.to_dict() for job in reversed(list(self.jobs.values()))]
+        if self.store is None:
+            return local
+        try:
+            shared = self.store.recent(INGEST_JOB_HISTORY)
+        except Exception as e:
+            print(f"[Ingestion] Could not read ingestion jobs: {e}")
+            return local
+        # this worker's own jobs are fresher than their throttled copies in the store
+        own = {state["job_id"]: state for state in local}
+        merged = [own.pop(state["job_id"], state) for state in shared]
+        return sorted(merged + list(own.values()), key=lambda state: state["created_at"], reverse=True)
+
+    async def _read_pages(self, path: str, start: int, stop: int) -> List[str]:
+        if not self._pool_unavailable:
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._pool(), read_pdf_pages, path, start, stop)
+            except (OSError, BrokenExecutor) as e:
+                # no usable process pool (e.g. restricted environment): parse in threads instead
+                if not self._pool_unavailable:
+                    print(f"[Ingestion] Process pool unavailable ({e}); parsing in threads.")
+                self._pool_unavailable = True
+                self._parse_pool = None
+        return await run_in_threadpool(read_pdf_pages, path, start, stop)
+
+    async def _iter_pages(self, path: str) -> AsyncIterator[List[str]]:
+        """
+        A file's text in order, a few pages at a time. PDF page ranges are
+        extracted in parallel, but only a small window of them is in flight,
+        so memory stays bounded however long the document is.
+        """
+        if not is_pdf(path):
+            blocks = iter_text_blocks(path)
+            while True:
+                block = await run_in_threadpool(next, blocks, None)
+                if block is None:
+                    return
+                yield [block]
+        total = await run_in_threadpool(pdf_page_count, path)
+        window = self.parse_workers * max(INGEST_PARSE_WINDOW, 1)
+        in_flight: deque = deque()
+        try:
+            for start in range(0, total, INGEST_PAGES_PER_TASK):
+                in_flight.append(asyncio.ensure_future(self._read_pages(path, start, start + INGEST_PAGES_PER_TASK)))
+                if len(in_flight) >= window:
+                    yield await in_flight.popleft()
+            while in_flight:
+                yield await in_flight.popleft()
+        finally:
+            for fut in in_flight:
+                fut.cancel()
+
+    def _embed(self, job: IngestionJob, texts: List[str]) -> np.ndarray:
+        stage = job.stages["embed"]
+        start = perf_counter()
+        parts = []
+        for i in range(0, len(texts), INGEST_EMBED_BATCH):
+            parts.append(self.retrieval.embedder.encode(texts[i:i + INGEST_EMBED_BATCH], batch_size=32))
+            job.advance("embed", stage["done"] + len(parts[-1]))
+        stage["_busy"] = stage.get("_busy", 0.0) + perf_counter() - start
+        return np.vstack(parts)
+
+    async def _index_batch(self, job: IngestionJob, chunks: List[Dict[str, Any]],
+                           persist: Optional[PersistSink], totals: Dict[str, int]):
+        """Embed, index and persist one batch of chunks straight from the chunker."""
+        if not chunks:
+            return
+        totals["chunks"] += len(chunks)
+        chunks = await run_in_threadpool(self.retrieval.new_chunks, chunks)
+        if not chunks:
+            return
+        totals["new"] += len(chunks)
+        embeddings = await run_in_threadpool(self._embed, job, [c["text"] for c in chunks])
+        added = await run_in_threadpool(self.retrieval.index_chunks, chunks, embeddings)
+        del embeddings
+        totals["added"] += len(added)
+        job.advance("index", totals["added"])
+        if persist is not None and added:
+            # only newly indexed chunks are regex-scanned and written to the database
+            rows = await run_in_threadpool(self.retrieval.dp.extract_structured_rows, added)
+            await run_in_threadpool(persist.write, added, rows)
+        job.advance("persist", totals["added"])
+
+    async def _run(self, job: IngestionJob, persist: Optional[PersistSink]):
+        """
+        Pages stream into each file's chunker, and every INGEST_INDEX_BATCH
+        chunks are embedded, indexed and persisted before more are read, so
+        a job holds one batch at a time however large its files are. A file
+        is recorded as ingested once its last batch is persisted.
+        """
+        job.status = "running"
+        job.publish()
+        dp = self.retrieval.dp
+        try:
+            # byte-identical re-uploads are skipped before any parsing
+            files = await run_in_threadpool(self.retrieval.changed_files, job.paths, job.filenames)
+            chunk_stats = ChunkStats()
+            # the stages overlap: every batch passes through all of them
+            for name in STAGES:
+                job.start_stage(name, total=len(files) if name in ("parse", "chunk") else None)
+            totals = {"chunks": 0, "new": 0, "added": 0}
+            pages = 0
+            for done, (path, filename, digest) in enumerate(files, start=1):
+                stream = dp.chunk_stream(filename, chunk_stats)
+                batch: List[Dict[str, Any]] = []
+                async for page_batch in self._iter_pages(path):
+                    pages += len(page_batch)
+                    # PDF pages are newline-terminated, as when the whole text is read at once
+                    text = page_batch[0] if not is_pdf(path) else "".join(t + "\n" for t in page_batch if t)
+                    batch.extend(await run_in_threadpool(stream.feed, text))
+                    if len(batch) >= INGEST_INDEX_BATCH:
+                        await self._index_batch(job, batch, persist, totals)
+                        batch = []
+                job.advance("parse", done)
+                batch.extend(await run_in_threadpool(stream.close))
+                job.advance("chunk", done)
+                await self._index_batch(job, batch, persist, totals)
+                await run_in_threadpool(self.retrieval.record_files, [(path, filename, digest)],
+                                        {filename: stream.emitted})
+            job.stages["parse"]["pages"] = pages
+
+            embed = job.stages["embed"]
+            busy = embed.pop("_busy", 0.0)
+            if busy:
+                embed["texts_per_sec"] = round(embed["done"] / busy, 1)
+            for name in ("parse", "chunk", "embed", "index"):
+                job.finish_stage(name)
+
+            job.result = {
+                "processed_chunks": totals["added"],
+                "indexed_chunks": totals["added"],
+                "unchanged_chunks": totals["chunks"] - totals["new"],
+                "skipped_files": [name for name in job.filenames if name not in {f[1] for f in files}],
+                "retrieval_backend": self.retrieval.backend.name,
+                "chunking": chunk_stats.to_dict(),
+            }
+            if persist is not None:
+                job.result.update(await run_in_threadpool(persist.finish))
+            job.finish_stage("persist")
+
+            job.status = "completed"
+        except Exception as e:
+            print(f"[Ingestion] Job {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+            for stage in job.stages.values():
+                if stage["status"] == "running":
+                    stage["status"] = "failed"
+                    stage.pop("_start", None)
+                    stage.pop("_busy", None)
+        finally:
+            job.finished_at = datetime.now()
+            job.publish()
+            for path in job.paths:
+                try:
+                    if os.path.exists(path):
+                        os.remove(path)
+                except Exception as cleanup_err:
+                    print(f"[Ingestion] Cleanup warning: {cleanup_err}")
+
+# singleton instance
+INGESTION_JOBS = IngestionJobManager()
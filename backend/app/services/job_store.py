@@ -0,0 +1,116 @@
+# backend/app/services/job_store.py
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional
+
+# Ingestion job status shared by every worker on the host, so any of them can answer a status poll
+INGEST_JOB_STORE_PATH = os.getenv("INGEST_JOB_STORE_PATH", "indexes/ingestion_jobs.db")
+# finished jobs kept (in memory and in the store)
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "200"))
+
+
+class IngestionJobStore:
+    """
+    Latest status of each ingestion job (the IngestionJob.to_dict() document)
+    in SQLite WAL mode next to the query cache. The worker running a job
+    publishes it; whichever worker receives a status request reads it.
+    Published states are written by a background thread, so a busy database
+    never blocks the event loop; only the newest state of a job is kept.
+    """
+    def __init__(self, path: str = INGEST_JOB_STORE_PATH, history: int = INGEST_JOB_HISTORY):
+        self.path = path
+        self.history = history
+        self._local = threading.local()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._writer: Optional[threading.Thread] = None
+        self._writing = False
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_created ON ingestion_jobs (created_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; autocommit, waits on other writers."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def publish(self, state: Dict[str, Any]):
+        """Queue a job state for the writer thread (never blocks on the database)."""
+        with self._cond:
+            self._pending[state["job_id"]] = state
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, daemon=True, name="ingestion-job-store")
+                self._writer.start()
+            self._cond.notify()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every published state is written; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._writing, timeout)
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                states, self._pending = list(self._pending.values()), {}
+                self._writing = True
+            try:
+                for state in states:
+                    self.save(state)
+                if any(state["status"] not in ("queued", "running") for state in states):
+                    self.prune(self.history)
+            except Exception as e:
+                print(f"[JobStore] Could not store ingestion job status: {e}")
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
+
+    def save(self, state: Dict[str, Any]):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO ingestion_jobs (job_id, status, created_at, state, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (state["job_id"], state["status"], state["created_at"], json.dumps(state, default=str), time.time()),
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT state FROM ingestion_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        """Newest first."""
+        rows = self._conn().execute(
+            "SELECT state FROM ingestion_jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def prune(self, keep: int):
+        """Drop finished jobs beyond the newest `keep` ones."""
+        self._conn().execute("""
+            DELETE FROM ingestion_jobs WHERE job_id IN (
+                SELECT job_id FROM ingestion_jobs WHERE status NOT IN ('queued', 'running')
+                 ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (keep,))
+
+# singleton instance
+INGESTION_JOB_STORE = IngestionJobStore()
@@ -0,0 +1,54 @@
+# backend/app/services/keyword_matcher.py
+
+from collections import deque
+from typing import Dict, List, Set
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over a fixed keyword -> label map. Built once;
+    labels(text) finds every keyword occurring anywhere in text (substring
+    semantics, like `kw in text`) in a single left-to-right pass.
+    """
+    def __init__(self, keywords: Dict[str, str]):
+        # state 0 is the root; goto[s] maps a character to the next state
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[Set[str]] = [set()]
+        for kw, label in keywords.items():
+            state = 0
+            for ch in kw.lower():
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(set())
+                state = nxt
+            self.output[state].add(label)
+
+        # breadth-first failure links; each state inherits the labels of its suffix states
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.output[nxt] |= self.output[self.fail[nxt]]
+
+    def labels(self, text: str) -> Set[str]:
+        """Labels of every keyword found in text (case-insensitive)."""
+        found: Set[str] = set()
+        state = 0
+        goto, fail, output = self.goto, self.fail, self.output
+        for ch in text.lower():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                found |= output[state]
+        return found
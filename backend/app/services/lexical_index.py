@@ -0,0 +1,113 @@
+# backend/app/services/lexical_index.py
+
+import os
+import math
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class LexicalIndex:
+    """
+    In-process BM25 inverted index over chunk text. Postings are append-only
+    typed arrays (doc numbers and term frequencies, 4 bytes each) scored with
+    NumPy views, so adding chunks never rebuilds anything and a query never
+    touches the embedding model.
+    """
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.chunk_ids: List[str] = []
+        self._numbers: Dict[str, int] = {}
+        self.doc_lengths = array("I")
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.total_length = 0
+        # arrays cannot grow while NumPy views of them exist, so adds and searches serialize
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def add(self, chunks: List[Dict[str, Any]]) -> int:
+        """Index chunks not seen before; returns how many were added."""
+        added = 0
+        with self._lock:
+            for chunk in chunks:
+                chunk_id = chunk["chunk_id"]
+                if chunk_id in self._numbers:
+                    continue
+                number = len(self.chunk_ids)
+                self._numbers[chunk_id] = number
+                self.chunk_ids.append(chunk_id)
+                tokens = tokenize(chunk.get("text", ""))
+                self.doc_lengths.append(len(tokens))
+                self.total_length += len(tokens)
+                for term, freq in Counter(tokens).items():
+                    entry = self.postings.get(term)
+                    if entry is None:
+                        entry = self.postings[term] = (array("I"), array("I"))
+                    entry[0].append(number)
+                    entry[1].append(freq)
+                added += 1
+        return added
+
+    def mask_for(self, chunk_ids: set) -> np.ndarray:
+        """Boolean mask over this index's chunks that are in chunk_ids (for filtered search)."""
+        with self._lock:
+            return np.fromiter((c in chunk_ids for c in self.chunk_ids), dtype=bool, count=len(self.chunk_ids))
+
+    def search(self, query: str, top_k: int = 5, mask: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """
+        [(chunk_id, bm25 score)] best first; chunks sharing no term with the query are omitted,
+        as are chunks outside mask (see mask_for) when one is given.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self.chunk_ids)
+            if n == 0 or top_k <= 0:
+                return []
+            avgdl = self.total_length / n or 1.0
+            norm = self.k1 * (1 - self.b + self.b * np.frombuffer(self.doc_lengths, dtype=np.uint32) / avgdl)
+            scores = np.zeros(n, dtype=np.float32)
+            for term in terms:
+                entry = self.postings.get(term)
+                if entry is None:
+                    continue
+                docs = np.frombuffer(entry[0], dtype=np.uint32)
+                freqs = np.frombuffer(entry[1], dtype=np.uint32).astype(np.float32)
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                # a document appears at most once per posting list, so fancy-index += is safe
+                scores[docs] += idf * freqs * (self.k1 + 1) / (freqs + norm[docs])
+                del docs  # release the view while the lock is still held (freqs is a copy)
+            if mask is not None:
+                # chunks added after the mask was taken were never checked against the filter
+                scores[len(mask):] = 0
+                scores[:len(mask)][~mask[:n]] = 0
+            hits = np.flatnonzero(scores)
+            if len(hits) > top_k:
+                hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+            hits = hits[np.argsort(-scores[hits], kind="stable")]
+            return [(self.chunk_ids[i], float(scores[i])) for i in hits]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            postings = sum(len(docs) for docs, _ in self.postings.values())
+            return {
+                "chunks": len(self.chunk_ids),
+                "terms": len(self.postings),
+                "postings": postings,
+                "postings_bytes": postings * 8,
+                "avg_chunk_tokens": round(self.total_length / len(self.chunk_ids), 1) if self.chunk_ids else None,
+            }
@@ -1,126 +1,487 @@
 # backend/app/services/query_engine.py
 
-from app.services.schema_discovery import SchemaDiscovery
-from app.services.document_processor import DocumentProcessor
-from app.services.cache import QueryCache # NEW IMPORT
-from sentence_transformers import SentenceTransformer
-from rapidfuzz import process as rf_process
-from sqlalchemy import text, create_engine
+from app.services.schema_discovery import SchemaDiscovery, schema_fingerprint
+from app.services.retrieval import RetrievalEngine, RETRIEVAL_ENGINE
+from app.services.engine_registry import ENGINE_REGISTRY
+from app.services.cache import (
+    QueryCache, QUERY_CACHE, QUERY_EMBEDDING_CACHE, DOCS_VERSION,
+    connection_fingerprint, schema_version_name, table_version_name,
+)
+from app.services.column_index import ColumnIndex
+from app.services.keyword_matcher import KeywordMatcher
+from sqlalchemy import text, exc as sa_exc
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+import os
 import re
-from typing import Dict, Any, List, Optional
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+# "async": run SQL on the async engine (asyncpg) when the driver is installed;
+# "sync": always run the blocking engine in the threadpool
+QUERY_SQL_MODE = os.getenv("QUERY_SQL_MODE", "async").lower()
+# distinct SQL statements of one batch run at most this many at a time
+QUERY_BATCH_SQL_WORKERS = int(os.getenv("QUERY_BATCH_SQL_WORKERS", "4"))
+# largest page a list query returns; beyond that callers page or stream
+QUERY_MAX_PAGE_ROWS = int(os.getenv("QUERY_MAX_PAGE_ROWS", "1000"))
+# rows fetched per round trip from a server-side cursor when streaming
+QUERY_STREAM_BATCH_ROWS = int(os.getenv("QUERY_STREAM_BATCH_ROWS", "500"))
+
+# Document keywords (high confidence for DOC) win over SQL keywords
+DOC_KEYWORDS = ["who", "what", "when", "where", "summary", "describe", "details"]
+SQL_KEYWORDS = ["count", "sum", "average", "list", "how many", "top", "highest", "lowest"]
+_QUERY_KEYWORDS = KeywordMatcher({**{kw: "sql" for kw in SQL_KEYWORDS}, **{kw: "doc" for kw in DOC_KEYWORDS}})
+
+# Try to extract a keyword (name, role, etc.) from the query
+_HOW_MANY_RE = re.compile(r"how many\s+(\w+)", re.I)
+# queries asking for the rows themselves rather than a count
+_LIST_RE = re.compile(r"\b(list|show|display)\b", re.I)
+
+def _async_incompatible(e: Exception) -> bool:
+    """
+    Whether a failed async connect means the async driver can't serve this
+    connection at all: driver missing, URL options it doesn't take (TypeError/
+    ValueError from the driver, possibly wrapped) or an interface error. A
+    connection that was lost rather than refused doesn't count.
+    """
+    if getattr(e, "connection_invalidated", False):
+        return False
+    if isinstance(e, (ImportError, TypeError, ValueError, sa_exc.ArgumentError, sa_exc.InterfaceError)):
+        return True
+    return isinstance(getattr(e, "orig", None), (TypeError, ValueError))
 
 class QueryEngine:
-    def __init__(self, connection_string: str, schema: Dict[str, Any]): 
-        # Schema is passed in, but we re-analyze to ensure consistency (optional, but robust)
-        self.schema = SchemaDiscovery(connection_string).analyze_database()
-        self.engine = create_engine(connection_string)
-        
-        # DP and Cache are initialized here, but DP is immediately OVERRIDDEN by schema.py 
-        # to use the global, persistent DocumentProcessor instance.
-        self.dp = DocumentProcessor()
-        self.cache = QueryCache()
+    def __init__(self, connection_string: str, schema: Dict[str, Any], column_index: Optional[ColumnIndex] = None):
+        # reuse the schema the caller just discovered; only analyze if none was given
+        self.schema = schema if schema and schema.get("tables") is not None else \
+            SchemaDiscovery(connection_string).analyze_database()
+        self.engine = ENGINE_REGISTRY.get(connection_string)
+        self.connection_string = connection_string
+        self.async_engine = ENGINE_REGISTRY.get_async(connection_string) if QUERY_SQL_MODE == "async" else None
+        # namespaces cache keys so a shared cache backend never mixes databases
+        self.connection_fingerprint = connection_fingerprint(connection_string)
         
+        # shared, process-wide retrieval engine: the same index ingestion writes to and
+        # the same search path the /query route uses
+        self.retrieval: RetrievalEngine = RETRIEVAL_ENGINE
+        self.cache: QueryCache = QUERY_CACHE
+        # only invalidates cached results if the schema actually changed
+        self.cache.set_versions({self.schema_version_name: schema_fingerprint(self.schema)})
+        self.column_index = self._column_index_for(self.schema, column_index)
+        self._target_table = self._resolve_target_table(self.schema)
+
+    @staticmethod
+    def _column_index_for(schema: Dict[str, Any], column_index: Optional[ColumnIndex] = None) -> ColumnIndex:
+        # a prebuilt index (e.g. from the schema snapshot) is reused only if it matches this schema
+        if column_index is not None and column_index.version == schema_fingerprint(schema):
+            return column_index
+        return ColumnIndex(schema)
+
+    def update_schema(self, schema: Dict[str, Any], column_index: Optional[ColumnIndex] = None):
+        """
+        Swap in a refreshed schema without rebuilding the engine. Cached results
+        survive unless the structural fingerprint changed.
+        """
+        self.schema = schema
+        self.cache.set_versions({self.schema_version_name: schema_fingerprint(schema)})
+        if column_index is not None or self.column_index.version != schema_fingerprint(schema):
+            self.column_index = self._column_index_for(schema, column_index)
+        self._target_table = self._resolve_target_table(schema)
+
+    def cache_key(self, user_query: str, limit: int, offset: int, retrieval_mode: Optional[str] = None,
+                  after: Any = None, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> str:
+        key = f"{self.connection_fingerprint}|{user_query}|{limit}|{offset}"
+        # doc results differ per retrieval mode (keyed as resolved, so None and the
+        # default share an entry) and ANN search depth, SQL pages per keyset cursor
+        key = f"{key}|{RetrievalEngine.resolve_mode(retrieval_mode)}"
+        if after is not None:
+            key = f"{key}|after={after!r}"
+        if nprobe is not None:
+            key = f"{key}|nprobe={nprobe}"
+        if ef_search is not None:
+            key = f"{key}|ef_search={ef_search}"
+        return key
+
+    @property
+    def schema_version_name(self) -> str:
+        return schema_version_name(self.connection_fingerprint)
+
+    def version_snapshot(self, qtype: str) -> Dict[str, str]:
+        """Versions of everything a result of this query type may depend on, read before it runs."""
+        names = [self.schema_version_name]
+        table = self.target_table()
+        if qtype in ("sql", "hybrid") and table:
+            names.append(table_version_name(self.connection_fingerprint, table))
+        if qtype in ("doc", "hybrid"):
+            names.append(DOCS_VERSION)
+        return self.cache.versions(names)
+
+    def cache_dependencies(self, results: Dict[str, Any]) -> List[str]:
+        """Data versions a result depends on: the schema, the table it queried, the doc index."""
+        deps = [self.schema_version_name]
+        if "sql_results" in results:
+            table = self.target_table()
+            if table:
+                deps.append(table_version_name(self.connection_fingerprint, table))
+        if "doc_results" in results:
+            deps.append(DOCS_VERSION)
+        return deps
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Result-cache stats plus the shared query-embedding cache counters."""
+        stats: Dict[str, Any] = dict(self.cache.get_stats())
+        stats["query_embeddings"] = QUERY_EMBEDDING_CACHE.get_stats()
+        return stats
+
     def classify_query(self, q: str) -> str:
         """
         Classifies query as 'sql', 'doc', or 'hybrid'.
+        One pass of the precompiled keyword automaton finds every keyword.
         """
-        ql = q.lower()
-        
-        # 1. Document keywords (high confidence for DOC)
-        doc_keywords = ["who", "what", "when", "where", "summary", "describe", "details"]
-        if any(kw in ql for kw in doc_keywords):
+        found = _QUERY_KEYWORDS.labels(q)
+        if "doc" in found:
             return "doc"
-        
-        # 2. SQL keywords (high confidence for SQL)
-        sql_keywords = ["count", "sum", "average", "list", "how many", "top", "highest", "lowest"]
-        if any(kw in ql for kw in sql_keywords):
+        if "sql" in found:
             return "sql"
-        
-        # 3. Default fallback
         return "hybrid"
 
-    def map_to_columns(self, q: str, topn=3):
-        # Creates list of column names for fuzzy matching (T.col format)
-        col_names = []
-        for tname, tinfo in self.schema["tables"].items():
-            for c in tinfo.get("columns", []):
-                col_names.append(f"{tname}.{c['name']}")
-        
-        # returns list of tuples (col, score, idx)
-        return rf_process.extract(q, col_names, limit=topn)
+    def map_to_columns(self, q: str, topn=3, semantic: bool = False):
+        """
+        Best-matching "table.column" names for q, as (col, score, idx) tuples.
+        Uses the precomputed column index; semantic=True ranks by embedding
+        similarity when the index was built with embeddings.
+        """
+        if semantic and self.column_index.embeddings is not None:
+            return self.column_index.semantic_match(self.retrieval.embedder.embed_query(q), topn)
+        return self.column_index.match(q, topn)
 
-    def generate_sql(self, q: str, limit: int, offset: int) -> tuple[Optional[str], dict]:
-        emp_table = None
-        for k, v in self.schema.get("inferences", {}).items():
+    @staticmethod
+    def _resolve_target_table(schema: Dict[str, Any]) -> Optional[str]:
+        if not schema.get("tables"):
+            return None
+        for k, v in schema.get("inferences", {}).items():
             if v == "employees":
-                emp_table = k
-                break
-        if not self.schema.get("tables"):
+                return k
+        return list(schema["tables"].keys())[0]
+
+    def target_table(self) -> Optional[str]:
+        """Table generated SQL runs against: the inferred employees table, else the first one."""
+        return self._target_table
+
+    def keyset_column(self, table: Optional[str] = None) -> Optional[str]:
+        """Single-column primary key of table (default: the target table), used for keyset pagination."""
+        table = table or self.target_table()
+        pk = self.schema.get("tables", {}).get(table, {}).get("primary_key") or []
+        return pk[0] if len(pk) == 1 else None
+
+    def _quote(self, name: str) -> str:
+        return self.engine.dialect.identifier_preparer.quote(name)
+
+    def _page_sql(self, table: str, limit: Optional[int], offset: int, after: Any) -> tuple[str, dict]:
+        """
+        Row listing paged in the database. With a single-column primary key the
+        page is ordered by it and `after` (the last key of the previous page)
+        seeks straight to the next page; otherwise LIMIT/OFFSET is used.
+        """
+        key = self.keyset_column(table)
+        sql = f"SELECT * FROM {self._quote(table)}"
+        params: Dict[str, Any] = {}
+        if key and after is not None:
+            sql += f" WHERE {self._quote(key)} > :after"
+            params["after"] = after
+        if key:
+            sql += f" ORDER BY {self._quote(key)}"
+        if limit is not None:
+            sql += " LIMIT :limit"
+            params["limit"] = limit
+        if offset and not (key and after is not None):
+            sql += " OFFSET :offset"
+            params["offset"] = offset
+        return sql, params
+
+    def generate_sql(self, q: str, limit: Optional[int], offset: int, after: Any = None,
+                     stream: bool = False) -> tuple[Optional[str], dict]:
+        """
+        SQL and bind parameters for q. List/show queries return rows one page
+        at a time (limit capped at QUERY_MAX_PAGE_ROWS); stream=True lifts the
+        cap, and limit=None then reads every row.
+        """
+        table = self.target_table()
+        if table is None:
             return None, {}
-        table = emp_table or list(self.schema["tables"].keys())[0]
 
-        # Try to extract a keyword (name, role, etc.) from the query
-        keyword_match = re.search(r"how many\s+(\w+)", q, re.I)
+        keyword_match = _HOW_MANY_RE.search(q)
         if keyword_match:
             keyword = keyword_match.group(1)
             sql = f"SELECT COUNT(*) as count FROM {table} WHERE name ILIKE :kw"
             params = {"kw": f"%{keyword}%"}
+        elif _LIST_RE.search(q):
+            if stream:
+                sql, params = self._page_sql(table, limit, max(offset, 0), after)
+            else:
+                limit = max(1, min(limit or QUERY_MAX_PAGE_ROWS, QUERY_MAX_PAGE_ROWS))
+                # one row past the page tells page_info whether another page exists
+                sql, params = self._page_sql(table, limit + 1, max(offset, 0), after)
+                params["page_rows"] = limit
         else:
             sql = f"SELECT COUNT(*) as count FROM {table}"
             params = {}
 
         return sql, params
 
+    def page_info(self, rows: List[Dict[str, Any]], params: dict) -> Optional[Dict[str, Any]]:
+        """
+        Where the next page starts for a paged list query (None for other
+        statements). rows may include the extra row fetched past the page.
+        """
+        if "page_rows" not in params:
+            return None
+        size = params["page_rows"]
+        key = self.keyset_column()
+        has_more = len(rows) > size
+        page: Dict[str, Any] = {"limit": size, "rows": min(len(rows), size), "has_more": has_more, "keyset": key}
+        if key:
+            page["next_after"] = rows[size - 1].get(key) if has_more else None
+        else:
+            page["next_offset"] = params.get("offset", 0) + size if has_more else None
+        return page
+
+    def _sql_outcome(self, rows: List[Dict[str, Any]], params: dict, start: float) -> Dict[str, Any]:
+        elapsed_ms = round((perf_counter() - start) * 1000, 2)
+        page = self.page_info(rows, params)
+        if page is not None:
+            # drop the row fetched past the page
+            rows = rows[:page["limit"]]
+        out: Dict[str, Any] = {"sql_results": rows, "sql_time_ms": elapsed_ms}
+        if page is not None:
+            out["sql_page"] = page
+        return out
+
+    def run_sql(self, sql: str, params: dict) -> List[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            res = conn.execute(text(sql), params)
+            # Use .mappings() for reliable dict conversion
+            return [dict(r) for r in res.mappings()]
+
+    async def _aconnect(self):
+        """
+        An open async connection, or None when there is no async engine or its
+        driver cannot handle this connection (it may reject what the sync one
+        accepts, e.g. asyncpg and `sslmode`); the async engine is then dropped
+        for this connection string and SQL goes through the threadpool. Any
+        other failure (database down, pool timeout, too many connections) is
+        raised and reported as a SQL error.
+        """
+        if self.async_engine is None:
+            return None
+        try:
+            return await self.async_engine.connect().start()
+        except Exception as e:
+            if not _async_incompatible(e):
+                raise
+            ENGINE_REGISTRY.disable_async(self.connection_string, e)
+            self.async_engine = None
+            return None
+
+    async def arun_sql(self, sql: str, params: dict) -> List[Dict[str, Any]]:
+        """Run SQL without blocking the event loop (async engine, else the threadpool)."""
+        conn = await self._aconnect()
+        if conn is None:
+            return await run_in_threadpool(self.run_sql, sql, params)
+        async with conn:
+            res = await conn.execute(text(sql), params)
+            return [dict(r) for r in res.mappings()]
+
+    def iter_sql(self, sql: str, params: dict,
+                 batch_rows: int = QUERY_STREAM_BATCH_ROWS) -> Iterator[Tuple[List[str], List[list]]]:
+        """
+        Rows of sql read from a server-side cursor, batch_rows at a time, as
+        (columns, rows) with rows as value lists; memory stays at one batch.
+        An empty result still yields its columns once.
+        """
+        with self.engine.connect() as conn:
+            # yield_per implies stream_results: a named/server-side cursor where the driver has one
+            res = conn.execute(text(sql), params, execution_options={"yield_per": batch_rows})
+            columns = list(res.keys())
+            empty = True
+            for rows in res.partitions(batch_rows):
+                empty = False
+                yield columns, [list(r) for r in rows]
+            if empty:
+                yield columns, []
+
+    async def astream_sql(self, sql: str, params: dict,
+                          batch_rows: int = QUERY_STREAM_BATCH_ROWS) -> AsyncIterator[Tuple[List[str], List[list]]]:
+        """iter_sql for the event loop: async engine cursor, else the blocking one in the threadpool."""
+        conn = await self._aconnect()
+        if conn is None:
+            async for batch in iterate_in_threadpool(self.iter_sql(sql, params, batch_rows)):
+                yield batch
+            return
+        async with conn:
+            res = await conn.stream(text(sql), params)
+            columns = list(res.keys())
+            empty = True
+            async for rows in res.partitions(batch_rows):
+                empty = False
+                yield columns, [list(r) for r in rows]
+            if empty:
+                yield columns, []
+
+    @property
+    def sql_execution_mode(self) -> str:
+        return "async" if self.async_engine is not None else "threadpool"
 
+    async def _sql_branch(self, user_query: str, limit: int, offset: int, after: Any = None) -> Dict[str, Any]:
+        sql, params = self.generate_sql(user_query, limit, offset, after=after)
+        if sql is None:
+            return {}
+        start = perf_counter()
+        try:
+            rows = await self.arun_sql(sql, params)
+        except Exception as e:
+            print(f"SQL Execution Error: {e}")
+            return {"sql_error": str(e)}
+        return self._sql_outcome(rows, params, start)
 
-    def process_query(self, user_query: str, limit: int, offset: int):
-        # 1. CACHE CHECK
-        cache_key = f"{user_query}|{limit}|{offset}"
+    async def _doc_branch(self, user_query: str, top_k: int, nprobe: Optional[int],
+                          ef_search: Optional[int], retrieval_mode: Optional[str] = None) -> Dict[str, Any]:
+        start = perf_counter()
+        # embeds through the micro-batcher so concurrent requests share one forward pass
+        docs = await self.retrieval.asearch(user_query, top_k=top_k, nprobe=nprobe, ef_search=ef_search,
+                                            mode=retrieval_mode)
+        out: Dict[str, Any] = {"doc_results": docs, "doc_time_ms": round((perf_counter() - start) * 1000, 2)}
+        if not docs and await run_in_threadpool(self.retrieval.count) == 0:
+            out["doc_warning"] = "No documents ingested yet."
+        return out
+
+    async def aprocess_query(self, user_query: str, limit: int, offset: int,
+                             nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                             retrieval_mode: Optional[str] = None, after: Any = None) -> Dict[str, Any]:
+        """
+        Answer one query (cached). For hybrid queries the SQL and
+        document branches run concurrently, so latency is max(sql, doc).
+        after is the keyset cursor (sql_page.next_after) of the previous page.
+        """
+        cache_key = self.cache_key(user_query, limit, offset, retrieval_mode, after, nprobe, ef_search)
         cached_result = self.cache.get(cache_key)
-        
         if cached_result:
             cached_result["cache_status"] = "HIT"
-            cached_result["cache_stats"] = self.cache.get_stats()
+            cached_result["cache_stats"] = self.cache_stats()
             return cached_result
-        
-        # 2. EXECUTE
+
         qtype = self.classify_query(user_query)
-        results = {"query": user_query, "query_type": qtype}
-        
-        # SQL Execution
+        results: Dict[str, Any] = {"query": user_query, "query_type": qtype}
+        versions = self.version_snapshot(qtype)
+
+        branches = []
         if qtype in ("sql", "hybrid"):
-            sql, params = self.generate_sql(user_query, limit, offset) 
-            
-            if sql is not None:
-                try:
-                    with self.engine.connect() as conn:
-                        res = conn.execute(text(sql), params)
-                        # Use .mappings() for reliable dict conversion
-                        rows = [dict(r) for r in res.mappings()] 
-                        
-                    results["sql_results"] = rows
-                except Exception as e:
-                    # Log SQL error but continue if possible
-                    print(f"SQL Execution Error: {e}")
-                    results["sql_error"] = str(e)
-                
-        # Document Search (safe)
+            branches.append(self._sql_branch(user_query, limit, offset, after))
         if qtype in ("doc", "hybrid"):
-            # ensure dp is available and has chunks
-            if not getattr(self, "dp", None) or self.dp.index is None or len(self.dp.chunks_metadata) == 0:
-                results["doc_results"] = []
-                results["doc_warning"] = "No documents ingested yet."
-            else:
-                topk = min(5, len(self.dp.chunks_metadata))
-                docs = self.dp.search(user_query, top_k=topk)
-                results["doc_results"] = docs
-            
-        # 3. CACHE SAVE
+            branches.append(self._doc_branch(user_query, min(5, limit), nprobe, ef_search, retrieval_mode))
+        for partial in await asyncio.gather(*branches):
+            results.update(partial)
+        results["sql_execution_mode"] = self.sql_execution_mode
+
         if "sql_results" in results or "doc_results" in results:
-             self.cache.set(cache_key, results)
-             results["cache_status"] = "MISS"
+            self.cache.set(cache_key, results, query_type=qtype, depends_on=self.cache_dependencies(results),
+                           versions=versions)
+            results["cache_status"] = "MISS"
         else:
-             results["cache_status"] = "N/A" # Query failed or produced no results
-        
-        results["cache_stats"] = self.cache.get_stats()
+            results["cache_status"] = "N/A"
+
+        results["cache_stats"] = self.cache_stats()
         return results
+
+    def _run_statement(self, sql: str, params: dict) -> Dict[str, Any]:
+        start = perf_counter()
+        try:
+            rows = self.run_sql(sql, params)
+        except Exception as e:
+            print(f"SQL Execution Error: {e}")
+            return {"sql_error": str(e)}
+        return self._sql_outcome(rows, params, start)
+
+    def process_queries(self, queries: List[str], limit: int, offset: int,
+                        nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                        retrieval_mode: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Answer many queries at once. Repeated queries are answered once, all
+        doc queries are embedded in a single model call, and identical SQL is
+        executed once and shared; SQL runs while documents are searched.
+        Returns {"results": [...] in input order, "batch_stats": {...}}.
+        """
+        start = perf_counter()
+        answers: Dict[str, Dict[str, Any]] = {}
+        pending: Dict[str, Tuple[str, str]] = {}  # cache key -> (query, query type)
+        cache_hits = 0
+        for q in queries:
+            key = self.cache_key(q, limit, offset, retrieval_mode, nprobe=nprobe, ef_search=ef_search)
+            if key in answers or key in pending:
+                continue
+            cached_result = self.cache.get(key)
+            if cached_result:
+                cached_result["cache_status"] = "HIT"
+                answers[key] = cached_result
+                cache_hits += 1
+            else:
+                pending[key] = (q, self.classify_query(q))
+
+        # one snapshot covers every dependency a query of the batch can have
+        versions = self.version_snapshot("hybrid") if pending else {}
+
+        # plan: group queries by the statement they compile to
+        statements: Dict[Tuple[str, tuple], List[str]] = {}
+        for key, (q, qtype) in pending.items():
+            answers[key] = {"query": q, "query_type": qtype}
+            if qtype in ("sql", "hybrid"):
+                sql, params = self.generate_sql(q, limit, offset)
+                if sql is not None:
+                    statements.setdefault((sql, tuple(sorted(params.items()))), []).append(key)
+
+        doc_keys = [key for key, (_, qtype) in pending.items() if qtype in ("doc", "hybrid")]
+        doc_ms = 0.0
+        with ThreadPoolExecutor(max_workers=max(1, min(QUERY_BATCH_SQL_WORKERS, len(statements)))) as pool:
+            futures = {stmt: pool.submit(self._run_statement, stmt[0], dict(stmt[1])) for stmt in statements}
+            if doc_keys:
+                doc_start = perf_counter()
+                doc_lists = self.retrieval.search_many([pending[k][0] for k in doc_keys], top_k=min(5, limit),
+                                                       mode=retrieval_mode,
+                                                       nprobe=nprobe, ef_search=ef_search)
+                doc_ms = round((perf_counter() - doc_start) * 1000, 2)
+                no_docs = not any(doc_lists) and self.retrieval.count() == 0
+                for key, docs in zip(doc_keys, doc_lists):
+                    answers[key]["doc_results"] = docs
+                    if no_docs:
+                        answers[key]["doc_warning"] = "No documents ingested yet."
+            for stmt, future in futures.items():
+                outcome = future.result()
+                for key in statements[stmt]:
+                    answers[key].update(outcome)
+
+        for key, (_, qtype) in pending.items():
+            results = answers[key]
+            if "sql_results" in results or "doc_results" in results:
+                self.cache.set(key, results, query_type=qtype, depends_on=self.cache_dependencies(results),
+                               versions=versions)
+                results["cache_status"] = "MISS"
+            else:
+                results["cache_status"] = "N/A"
+
+        sql_queries = sum(len(keys) for keys in statements.values())
+        return {
+            "results": [answers[self.cache_key(q, limit, offset, retrieval_mode, nprobe=nprobe, ef_search=ef_search)]
+                        for q in queries],
+            "batch_stats": {
+                "queries": len(queries),
+                "unique_queries": len(answers),
+                "cache_hits": cache_hits,
+                "sql_queries": sql_queries,
+                "sql_statements_executed": len(statements),
+                "doc_queries_embedded": len(doc_keys),
+                "doc_time_ms": doc_ms,
+                "total_time_ms": round((perf_counter() - start) * 1000, 2),
+            },
+            "cache_stats": self.cache_stats(),
+        }
@@ -0,0 +1,438 @@
+# backend/app/services/retrieval.py
+
+import os
+import threading
+from abc import ABC, abstractmethod
+from time import perf_counter
+from typing import List, Dict, Any, Optional
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from app.services.document_processor import DocumentProcessor, DOCUMENT_PROCESSOR, file_digest
+from app.services.lexical_index import LexicalIndex
+from app.services.search_filter import ChunkFilter
+from app.services.embedding_service import EMBEDDING_SERVICE, EmbeddingService
+from app.services.embedding_batcher import EMBEDDING_BATCHER, EmbeddingBatcher
+
+# Vector index used for document retrieval: "faiss" (default) or "chroma"
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "faiss").lower()
+# "hybrid": dense + BM25 fused with reciprocal rank fusion; "dense"; "lexical": BM25 only, no embedding model
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+RETRIEVAL_MODES = ("hybrid", "dense", "lexical")
+# RRF constant and how deep each ranked list is read before fusing
+RRF_K = int(os.getenv("RRF_K", "60"))
+RRF_CANDIDATES = int(os.getenv("RRF_CANDIDATES", "20"))
+# what the per-result score of each retrieval mode means
+SCORE_KINDS = {"hybrid": "rrf", "dense": "l2_distance", "lexical": "bm25"}
+
+
+class RetrievalBackend(ABC):
+    """
+    A vector index the RetrievalEngine can write to and search.
+    Backends never embed text themselves; they receive precomputed vectors.
+    Search results are dicts of {"id","chunk_id","text","source","metadata","distance"}.
+    """
+    name = "base"
+
+    @abstractmethod
+    def add(self, chunks: List[Dict[str, Any]], embeddings: np.ndarray) -> List[str]:
+        """Index chunks not already present; returns the chunk ids actually added."""
+
+    @abstractmethod
+    def existing_ids(self, chunk_ids: List[str]) -> set:
+        ...
+
+    @abstractmethod
+    def iter_chunks(self, start: int = 0) -> List[Dict[str, Any]]:
+        """
+        Indexed chunks as {"chunk_id","text"} in index order, from position start
+        on (used to build and catch up the lexical index; the order is append-only).
+        """
+
+    @abstractmethod
+    def get_chunks(self, chunk_ids: List[str]) -> List[Dict[str, Any]]:
+        """Search-result dicts (distance None) for the given ids, in that order; unknown ids are skipped."""
+
+    @abstractmethod
+    def filter_ids(self, filters: Optional[ChunkFilter]) -> Optional[set]:
+        """chunk_ids passing filters, or None when there is nothing to filter."""
+
+    @abstractmethod
+    def search(self, qvec: np.ndarray, top_k: int = 5, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None, filters: Optional[ChunkFilter] = None) -> List[Dict[str, Any]]:
+        """Nearest chunks to qvec; filters are applied inside the index, not after it."""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "chunks": self.count()}
+
+
+class FaissBackend(RetrievalBackend):
+    """Persistent FAISS index owned by DocumentProcessor."""
+    name = "faiss"
+
+    def __init__(self, dp: DocumentProcessor = DOCUMENT_PROCESSOR):
+        self.dp = dp
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_id_source: tuple = (None, 0)
+
+    def add(self, chunks: List[Dict[str, Any]], embeddings: np.ndarray) -> List[str]:
+        return self.dp.add_embeddings(chunks, embeddings)
+
+    def existing_ids(self, chunk_ids: List[str]) -> set:
+        return self.dp.existing_chunk_ids(chunk_ids)
+
+    @staticmethod
+    def _doc(hit: Dict[str, Any]) -> Dict[str, Any]:
+        metadata = {k: v for k, v in hit.items() if k not in ("text", "distance")}
+        return {
+            "id": hit.get("chunk_id"),
+            "chunk_id": hit.get("chunk_id"),
+            "text": hit.get("text", ""),
+            "source": hit.get("source", ""),
+            "metadata": metadata,
+            "distance": hit.get("distance"),
+        }
+
+    def iter_chunks(self, start: int = 0) -> List[Dict[str, Any]]:
+        self.dp.refresh_if_changed()
+        return self.dp.chunks_metadata[start:] if start else self.dp.chunks_metadata
+
+    def get_chunks(self, chunk_ids: List[str]) -> List[Dict[str, Any]]:
+        chunks = self.iter_chunks()
+        # chunks_metadata only grows in place or is replaced on reload
+        if self._by_id_source != (id(chunks), len(chunks)):
+            self._by_id = {c["chunk_id"]: c for c in chunks}
+            self._by_id_source = (id(chunks), len(chunks))
+        return [self._doc(self._by_id[i]) for i in chunk_ids if i in self._by_id]
+
+    def filter_ids(self, filters: Optional[ChunkFilter]) -> Optional[set]:
+        return self.dp.filter_chunk_ids(filters)
+
+    def search(self, qvec: np.ndarray, top_k: int = 5, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None, filters: Optional[ChunkFilter] = None) -> List[Dict[str, Any]]:
+        hits = self.dp.search_by_vector(qvec, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filters=filters)
+        return [self._doc(hit) for hit in hits]
+
+    def count(self) -> int:
+        self.dp.refresh_if_changed()
+        return len(self.dp.chunks_metadata)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, **self.dp.index_stats()}
+
+
+class ChromaBackend(RetrievalBackend):
+    """Persistent Chroma collection (chromadb is only imported when selected)."""
+    name = "chroma"
+
+    def __init__(self):
+        from app.services.vector_store import VECTOR_STORE
+        self.store = VECTOR_STORE
+
+    def add(self, chunks: List[Dict[str, Any]], embeddings: np.ndarray) -> List[str]:
+        known = self.existing_ids([c["chunk_id"] for c in chunks])
+        keep = [i for i, c in enumerate(chunks) if c["chunk_id"] not in known]
+        if not keep:
+            return []
+        chunks = [chunks[i] for i in keep]
+        ids = [c["chunk_id"] for c in chunks]
+        texts = [c["text"] for c in chunks]
+        self.store.add_embeddings(ids, texts, chunks, np.asarray(embeddings)[keep])
+        return ids
+
+    def existing_ids(self, chunk_ids: List[str]) -> set:
+        return self.store.existing_ids(chunk_ids)
+
+    def iter_chunks(self, start: int = 0) -> List[Dict[str, Any]]:
+        return [{"chunk_id": hit["id"], "text": hit["text"]} for hit in self.store.get_all(start=start)]
+
+    def get_chunks(self, chunk_ids: List[str]) -> List[Dict[str, Any]]:
+        found = {hit["id"]: hit for hit in self.store.get_by_ids(chunk_ids)}
+        return [{
+            "id": i,
+            "chunk_id": i,
+            "text": found[i]["text"],
+            "source": found[i]["metadata"].get("source", ""),
+            "metadata": found[i]["metadata"],
+            "distance": None,
+        } for i in chunk_ids if i in found]
+
+    def filter_ids(self, filters: Optional[ChunkFilter]) -> Optional[set]:
+        where = filters.where() if filters is not None else None
+        return self.store.ids_where(where) if where is not None else None
+
+    def search(self, qvec: np.ndarray, top_k: int = 5, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None, filters: Optional[ChunkFilter] = None) -> List[Dict[str, Any]]:
+        top_k = min(top_k, self.count())
+        if top_k <= 0:
+            return []
+        docs = []
+        where = filters.where() if filters is not None else None
+        for hit in self.store.query_by_embedding(qvec, top_k=top_k, where=where):
+            docs.append({
+                "id": hit["id"],
+                "chunk_id": hit["id"],
+                "text": hit["text"],
+                "source": hit["metadata"].get("source", ""),
+                "metadata": hit["metadata"],
+                "distance": hit["distance"],
+            })
+        return docs
+
+    def count(self) -> int:
+        return self.store.count()
+
+
+class RetrievalEngine:
+    """
+    Single ingestion + search path for documents.
+    Each chunk is embedded exactly once and written to one backend: ingestion
+    jobs go through changed_files / new_chunks / index_chunks / record_files,
+    and the query route and QueryEngine both search through here.
+    """
+    def __init__(self, dp: DocumentProcessor = DOCUMENT_PROCESSOR, backend: Optional[RetrievalBackend] = None,
+                 embedder: EmbeddingService = EMBEDDING_SERVICE, batcher: EmbeddingBatcher = EMBEDDING_BATCHER):
+        self.dp = dp
+        self.backend = backend or build_retrieval_backend(dp=dp)
+        self.embedder = embedder
+        self.batcher = batcher
+        self._lexical: Optional[LexicalIndex] = None
+        self._lexical_lock = threading.Lock()
+
+    def changed_files(self, file_paths: List[str], filenames: List[str]) -> List[tuple]:
+        """(path, filename, file_hash) for files whose exact bytes were not ingested before."""
+        files = []
+        for path, filename in zip(file_paths, filenames):
+            digest = file_digest(path)
+            if self.dp.is_file_ingested(filename, digest):
+                print(f"[RetrievalEngine] {filename} is unchanged; skipping.")
+                continue
+            files.append((path, filename, digest))
+        return files
+
+    def record_files(self, files: List[tuple], chunk_counts: Dict[str, int]):
+        """
+        Mark files as ingested once their chunks are indexed. chunk_counts is
+        how many chunks each file produced (indexed now or before). A file that
+        produced none is not recorded: the readers swallow parse errors, so an
+        empty extraction may be a transient failure, and its next upload is parsed again.
+        """
+        empty = [name for _, name, _ in files if not chunk_counts.get(name)]
+        if empty:
+            print(f"[RetrievalEngine] No chunks extracted from {', '.join(empty)}; not marking as ingested.")
+        self.dp.record_ingested_files([(name, digest, chunk_counts[name])
+                                       for _, name, digest in files if chunk_counts.get(name)])
+
+    def new_chunks(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop chunks whose content-hash id is already indexed (or repeated in this batch)."""
+        known = self.backend.existing_ids([c["chunk_id"] for c in chunks]) if chunks else set()
+        fresh = []
+        for c in chunks:
+            if c["chunk_id"] not in known:
+                known.add(c["chunk_id"])
+                fresh.append(c)
+        return fresh
+
+    def index_chunks(self, chunks: List[Dict[str, Any]], embeddings: np.ndarray) -> List[Dict[str, Any]]:
+        """Write already-embedded chunks to the backend; returns the chunks actually added."""
+        if not chunks:
+            return []
+        # the BM25 index takes the new tail before a query can see the larger count
+        with self._lexical_lock:
+            added = set(self.backend.add(chunks, embeddings))
+            if self._lexical is not None:
+                self._catch_up_lexical()
+        return [c for c in chunks if c["chunk_id"] in added]
+
+    def count(self) -> int:
+        return self.backend.count()
+
+    @property
+    def lexical(self) -> LexicalIndex:
+        """BM25 index over every indexed chunk, caught up if another worker appended to the backend."""
+        index = self._lexical
+        if index is None or len(index) != self.count():
+            with self._lexical_lock:
+                index = self._catch_up_lexical()
+        return index
+
+    def build_lexical(self) -> LexicalIndex:
+        """Build the BM25 index up front (at startup) instead of on the first query."""
+        with self._lexical_lock:
+            return self._catch_up_lexical()
+
+    def _catch_up_lexical(self) -> LexicalIndex:
+        # caller holds _lexical_lock
+        index = self._lexical
+        count = self.count()
+        if index is not None and len(index) > count:
+            index = None  # the backend was replaced underneath
+        if index is not None and len(index) < count:
+            # the index order is append-only: only the tail is new
+            index.add(self.backend.iter_chunks(start=len(index)))
+            if len(index) < count:
+                index = None  # the tail did not line up; start over
+        if index is None:
+            index = LexicalIndex()
+            index.add(self.backend.iter_chunks())
+            print(f"[RetrievalEngine] Built BM25 index over {len(index)} chunks")
+        self._lexical = index
+        return index
+
+    @staticmethod
+    def resolve_mode(mode: Optional[str]) -> str:
+        mode = (mode or RETRIEVAL_MODE).lower()
+        if mode not in RETRIEVAL_MODES:
+            print(f"[RetrievalEngine] Unknown retrieval mode '{mode}'; using dense.")
+            return "dense"
+        return mode
+
+    def _lexical_mask(self, filters: Optional[ChunkFilter], mode: str) -> Optional[np.ndarray]:
+        """BM25 restricted to the chunks passing filters (computed once per call or batch)."""
+        if mode == "dense" or filters is None or filters.is_empty:
+            return None
+        return self.lexical.mask_for(self.backend.filter_ids(filters) or set())
+
+    def _search_vector(self, query: str, qvec: Optional[np.ndarray], top_k: int, nprobe: Optional[int],
+                       ef_search: Optional[int], mode: str, filters: Optional[ChunkFilter] = None,
+                       lexical_mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        if mode == "dense":
+            return self.backend.search(qvec, top_k=top_k, nprobe=nprobe, ef_search=ef_search, filters=filters)
+        if lexical_mask is None:
+            lexical_mask = self._lexical_mask(filters, mode)
+        depth = max(top_k, RRF_CANDIDATES)
+        lexical = self.lexical.search(query, depth if mode == "hybrid" else top_k, mask=lexical_mask)
+        if mode == "lexical":
+            docs = self.backend.get_chunks([chunk_id for chunk_id, _ in lexical])
+            scores = dict(lexical)
+            for doc in docs:
+                doc["score"] = round(scores[doc["chunk_id"]], 4)
+            return docs
+        dense = self.backend.search(qvec, top_k=depth, nprobe=nprobe, ef_search=ef_search, filters=filters)
+        return self._fuse(dense, lexical, top_k)
+
+    def _fuse(self, dense: List[Dict[str, Any]], lexical: List[tuple], top_k: int) -> List[Dict[str, Any]]:
+        """Reciprocal rank fusion: score = sum over lists of 1 / (RRF_K + rank)."""
+        scores: Dict[str, float] = {}
+        matched: Dict[str, List[str]] = {}
+        for name, ranked in (("dense", [d["chunk_id"] for d in dense]), ("lexical", [c for c, _ in lexical])):
+            for rank, chunk_id in enumerate(ranked, start=1):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+                matched.setdefault(chunk_id, []).append(name)
+        best = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        docs = {d["chunk_id"]: d for d in dense}
+        missing = [c for c in best if c not in docs]
+        if missing:
+            docs.update((d["chunk_id"], d) for d in self.backend.get_chunks(missing))
+        fused = []
+        for chunk_id in best:
+            doc = docs.get(chunk_id)
+            if doc is not None:
+                fused.append({**doc, "score": round(scores[chunk_id], 6), "matched_by": matched[chunk_id]})
+        return fused
+
+    def search(self, query: str, top_k: int = 5, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None, mode: Optional[str] = None,
+               filters: Optional[ChunkFilter] = None) -> List[Dict[str, Any]]:
+        """Blocking search (embeds through the shared query-embedding cache unless lexical-only)."""
+        if self.count() == 0:
+            return []
+        mode = self.resolve_mode(mode)
+        qvec = self.embedder.embed_query(query) if mode != "lexical" else None
+        return self._search_vector(query, qvec, top_k, nprobe, ef_search, mode, filters)
+
+    def search_many(self, queries: List[str], top_k: int = 5, nprobe: Optional[int] = None,
+                    ef_search: Optional[int] = None, mode: Optional[str] = None,
+                    filters: Optional[ChunkFilter] = None) -> List[List[Dict[str, Any]]]:
+        """Search several queries; all of them are embedded in a single model call."""
+        if not queries or self.count() == 0:
+            return [[] for _ in queries]
+        mode = self.resolve_mode(mode)
+        qvecs = self.embedder.embed_queries(queries) if mode != "lexical" else [None] * len(queries)
+        lexical_mask = self._lexical_mask(filters, mode)
+        return [self._search_vector(q, qvec, top_k, nprobe, ef_search, mode, filters, lexical_mask)
+                for q, qvec in zip(queries, qvecs)]
+
+    def search_batch(self, queries: List[str], top_k: int = 5, nprobe: Optional[int] = None,
+                     ef_search: Optional[int] = None, mode: Optional[str] = None,
+                     filters: Optional[ChunkFilter] = None) -> Dict[str, Any]:
+        """
+        Filtered multi-query search with compact results: per query, parallel
+        lists of chunk ids and scores plus its search latency; the text and
+        metadata of each matched chunk appear once under "chunks".
+        Queries are embedded in one model call (embed_ms) and filters are
+        evaluated once for the whole batch.
+        """
+        start = perf_counter()
+        mode = self.resolve_mode(mode)
+        out: Dict[str, Any] = {
+            "mode": mode,
+            "score": SCORE_KINDS[mode],
+            "filters": filters.to_dict() if filters is not None else None,
+            "ids": [], "scores": [], "latency_ms": [], "chunks": {},
+            "embed_ms": 0.0,
+        }
+        if not queries or self.count() == 0:
+            out["ids"] = [[] for _ in queries]
+            out["scores"] = [[] for _ in queries]
+            out["latency_ms"] = [0.0 for _ in queries]
+            out["total_ms"] = round((perf_counter() - start) * 1000, 3)
+            return out
+
+        t = perf_counter()
+        qvecs = self.embedder.embed_queries(queries) if mode != "lexical" else [None] * len(queries)
+        out["embed_ms"] = round((perf_counter() - t) * 1000, 3)
+        lexical_mask = self._lexical_mask(filters, mode)
+        chunks = out["chunks"]
+        for query, qvec in zip(queries, qvecs):
+            t = perf_counter()
+            docs = self._search_vector(query, qvec, top_k, nprobe, ef_search, mode, filters, lexical_mask)
+            out["latency_ms"].append(round((perf_counter() - t) * 1000, 3))
+            out["ids"].append([d["chunk_id"] for d in docs])
+            out["scores"].append([round(float(d["score"] if "score" in d else d["distance"]), 6) for d in docs])
+            for d in docs:
+                if d["chunk_id"] not in chunks:
+                    metadata = d.get("metadata") or {}
+                    chunks[d["chunk_id"]] = {
+                        "text": d["text"],
+                        "source": d["source"],
+                        "doc_type": metadata.get("doc_type"),
+                        "ingested_at": metadata.get("ingested_at"),
+                    }
+        out["total_ms"] = round((perf_counter() - start) * 1000, 3)
+        return out
+
+    async def asearch(self, query: str, top_k: int = 5, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None, mode: Optional[str] = None,
+                      filters: Optional[ChunkFilter] = None) -> List[Dict[str, Any]]:
+        """Event-loop friendly search: micro-batched embedding, index lookup in the threadpool."""
+        if await run_in_threadpool(self.count) == 0:
+            return []
+        mode = self.resolve_mode(mode)
+        qvec = await self.batcher.embed(query) if mode != "lexical" else None
+        return await run_in_threadpool(self._search_vector, query, qvec, top_k, nprobe, ef_search, mode, filters)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.backend.get_stats()
+        stats["retrieval_mode"] = RETRIEVAL_MODE
+        stats["lexical"] = self._lexical.get_stats() if self._lexical is not None else None
+        return stats
+
+
+def build_retrieval_backend(kind: str = RETRIEVAL_BACKEND, dp: DocumentProcessor = DOCUMENT_PROCESSOR) -> RetrievalBackend:
+    """Create the backend selected by RETRIEVAL_BACKEND."""
+    if kind == "chroma":
+        try:
+            return ChromaBackend()
+        except Exception as e:
+            print(f"[RetrievalEngine] Chroma backend unavailable ({e}); falling back to FAISS.")
+    elif kind != "faiss":
+        print(f"[RetrievalEngine] Unknown retrieval backend '{kind}'; using FAISS.")
+    return FaissBackend(dp)
+
+# singleton instance
+RETRIEVAL_ENGINE = RetrievalEngine()
@@ -1,40 +1,204 @@
 # backend/app/services/schema_discovery.py
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import NoSuchTableError
 from sqlalchemy.engine.reflection import Inspector
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import os
 import re
+import json
+import hashlib
+from app.services.engine_registry import ENGINE_REGISTRY, DB_POOL_SIZE
+
+# "fast": bulk catalog reflection; "inspector": one round of catalog queries per table
+SCHEMA_DISCOVERY_MODE = os.getenv("SCHEMA_DISCOVERY_MODE", "fast").lower()
+SCHEMA_SAMPLE_ROWS = int(os.getenv("SCHEMA_SAMPLE_ROWS", "5"))
+SCHEMA_SAMPLE_WORKERS = int(os.getenv("SCHEMA_SAMPLE_WORKERS", "8"))
+
+# one row per table: everything that would change what reflection returns for it
+_PG_TABLE_SIGNATURES = text("""
+    SELECT c.relname,
+           (SELECT string_agg(a.attname || ':' || format_type(a.atttypid, a.atttypmod) || ':' || a.attnotnull,
+                              ',' ORDER BY a.attnum)
+              FROM pg_attribute a
+             WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped)
+           || '|' ||
+           coalesce((SELECT string_agg(pg_get_constraintdef(k.oid), ',' ORDER BY k.conname)
+                       FROM pg_constraint k
+                      WHERE k.conrelid = c.oid AND k.contype IN ('p', 'f', 'u')), '')
+      FROM pg_class c
+      JOIN pg_namespace n ON n.oid = c.relnamespace
+     WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p')
+""")
+_SQLITE_TABLE_SIGNATURES = text(
+    "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+)
+
+def schema_fingerprint(schema: Dict[str, Any]) -> str:
+    """Stable hash of the structural part of a schema (tables, columns, keys; not samples)."""
+    structure = {
+        tname: {
+            "columns": tinfo.get("columns", []),
+            "primary_key": tinfo.get("primary_key", []),
+            "foreign_keys": tinfo.get("foreign_keys", []),
+        }
+        for tname, tinfo in schema.get("tables", {}).items()
+    }
+    payload = json.dumps(structure, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
 
 class SchemaDiscovery:
     def __init__(self, connection_string: str):
         self.connection_string = connection_string
-        self.engine = create_engine(connection_string, pool_pre_ping=True)
+        self.engine = ENGINE_REGISTRY.get(connection_string)
 
     def analyze_database(self) -> Dict[str, Any]:
-        inspector: Inspector = inspect(self.engine)
-        tables = inspector.get_table_names()
+        """
+        Tables, columns, keys and a few sample rows per table.
+        The catalog is read in bulk (one query per kind of object, not per table)
+        and samples are fetched concurrently.
+        """
+        signatures = self.table_signatures()
+        tables = self._read_catalog(inspect(self.engine))
+
+        samples = self.fetch_samples(list(tables))
         schema = {"tables": {}}
-        for table in tables:
-            cols = inspector.get_columns(table)
-            pk = inspector.get_primary_keys(table) if hasattr(inspector, "get_primary_keys") else []
-            fks = inspector.get_foreign_keys(table)
-            # Sample data (limit 5) safely
-            sample = []
-            try:
-                with self.engine.connect() as conn:
-                    res = conn.execute(text(f"SELECT * FROM {table} LIMIT 5"))
-                    sample = [dict(row) for row in res]
-            except Exception:
-                sample = []
-            schema["tables"][table] = {
-            "columns": [{ "name": c["name"], "type": str(c["type"])} for c in cols],
-            "primary_key": pk,
-            "foreign_keys": fks,
-            "sample": sample,
-            }
+        for table, info in tables.items():
+            info["sample"] = samples.get(table, [])
+            schema["tables"][table] = info
         # optional: infer roles like employees/departments by name heuristics
         schema["inferences"] = self._infer_table_roles(schema)
+        schema["catalog"] = self._catalog_info(signatures)
         return schema
 
+    def table_signatures(self) -> Optional[Dict[str, str]]:
+        """
+        Cheap per-table DDL signature straight from the system catalog, or None
+        when the dialect has no such query (callers then fall back to a full scan).
+        """
+        dialect = self.engine.dialect.name
+        try:
+            with self.engine.connect() as conn:
+                if dialect == "postgresql":
+                    rows = conn.execute(_PG_TABLE_SIGNATURES).all()
+                elif dialect == "sqlite":
+                    rows = conn.execute(_SQLITE_TABLE_SIGNATURES).all()
+                else:
+                    return None
+        except Exception as e:
+            print(f"[SchemaDiscovery] Catalog fingerprint failed: {e}")
+            return None
+        return {name: hashlib.sha1((sig or "").encode()).hexdigest()[:16] for name, sig in rows}
+
+    @staticmethod
+    def _catalog_info(signatures: Optional[Dict[str, str]]) -> Dict[str, Any]:
+        if signatures is None:
+            return {"fingerprint": None, "tables": None}
+        payload = json.dumps(signatures, sort_keys=True)
+        return {"fingerprint": hashlib.sha1(payload.encode()).hexdigest()[:16], "tables": signatures}
+
+    def refresh(self, schema: Dict[str, Any], resample: List[str] = ()) -> tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Bring a previously discovered schema up to date.
+        Only tables whose catalog signature changed (or that are new) are
+        re-inspected; tables in resample (e.g. just written to) get fresh sample rows.
+        Returns (new schema, summary of what changed). The input schema is not mutated.
+        """
+        old_signatures = (schema.get("catalog") or {}).get("tables")
+        signatures = self.table_signatures()
+        if not schema.get("tables") or old_signatures is None or signatures is None:
+            return self.analyze_database(), {"mode": "full"}
+
+        added = [t for t in signatures if t not in old_signatures]
+        changed = [t for t in signatures if t in old_signatures and signatures[t] != old_signatures[t]]
+        removed = [t for t in old_signatures if t not in signatures]
+        summary = {"mode": "incremental", "added": added, "changed": changed, "removed": removed}
+        if not (added or changed or removed or resample):
+            summary["unchanged"] = True
+            return schema, summary
+
+        tables = {t: info for t, info in schema["tables"].items() if t in signatures}
+        reflect = added + changed
+        if reflect:
+            reflected = self._read_catalog(inspect(self.engine), only=reflect)
+            # tables dropped since their signatures were read are not returned
+            dropped = [t for t in reflect if t not in reflected]
+            for table in dropped:
+                tables.pop(table, None)
+                signatures.pop(table, None)
+            if dropped:
+                reflect = [t for t in reflect if t in reflected]
+                summary["added"] = [t for t in added if t in reflected]
+                summary["changed"] = [t for t in changed if t in reflected]
+                summary["removed"] = removed + [t for t in dropped if t in old_signatures]
+            tables.update(reflected)
+        to_sample = list(dict.fromkeys(reflect + [t for t in resample if t in tables]))
+        samples = self.fetch_samples(to_sample)
+        for table in to_sample:
+            tables[table] = {**tables[table], "sample": samples.get(table, [])}
+        summary["resampled"] = to_sample
+
+        new_schema = {"tables": dict(sorted(tables.items()))}
+        new_schema["inferences"] = self._infer_table_roles(new_schema)
+        new_schema["catalog"] = self._catalog_info(signatures)
+        return new_schema, summary
+
+    def _read_catalog(self, inspector: Inspector, only: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        if SCHEMA_DISCOVERY_MODE == "fast" and hasattr(inspector, "get_multi_columns"):
+            return self._read_catalog_bulk(inspector, only)
+        return self._read_catalog_per_table(inspector, only)
+
+    def _read_catalog_bulk(self, inspector: Inspector, only: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        # SQLAlchemy's get_multi_* reflect every table in a handful of catalog queries
+        columns = inspector.get_multi_columns(filter_names=only)
+        pks = inspector.get_multi_pk_constraint(filter_names=only)
+        fks = inspector.get_multi_foreign_keys(filter_names=only)
+        tables = {}
+        for key in sorted(columns, key=lambda k: k[1]):
+            tables[key[1]] = {
+                "columns": [{"name": c["name"], "type": str(c["type"])} for c in columns[key]],
+                "primary_key": (pks.get(key) or {}).get("constrained_columns", []),
+                "foreign_keys": fks.get(key, []),
+            }
+        return tables
+
+    def _read_catalog_per_table(self, inspector: Inspector, only: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        tables = {}
+        for table in (only if only is not None else inspector.get_table_names()):
+            try:
+                cols = inspector.get_columns(table)
+                pk = inspector.get_pk_constraint(table).get("constrained_columns", [])
+                fks = inspector.get_foreign_keys(table)
+            except NoSuchTableError:
+                continue  # dropped while the catalog was being read
+            tables[table] = {
+                "columns": [{"name": c["name"], "type": str(c["type"])} for c in cols],
+                "primary_key": pk,
+                "foreign_keys": fks,
+            }
+        return tables
+
+    def _sample_table(self, table: str) -> List[Dict[str, Any]]:
+        # Sample data (limit N) safely
+        try:
+            quoted = self.engine.dialect.identifier_preparer.quote(table)
+            with self.engine.connect() as conn:
+                res = conn.execute(text(f"SELECT * FROM {quoted} LIMIT {SCHEMA_SAMPLE_ROWS}"))
+                return [dict(row) for row in res.mappings()]
+        except Exception:
+            return []
+
+    def fetch_samples(self, tables: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Sample rows for each table, SCHEMA_SAMPLE_WORKERS at a time."""
+        if not tables or SCHEMA_SAMPLE_ROWS <= 0:
+            return {}
+        # never ask for more concurrent connections than the pool can hand out
+        workers = max(1, min(SCHEMA_SAMPLE_WORKERS, len(tables), DB_POOL_SIZE))
+        if workers == 1:
+            return {t: self._sample_table(t) for t in tables}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="schema-sample") as pool:
+            return dict(zip(tables, pool.map(self._sample_table, tables)))
+
     def _infer_table_roles(self, schema):
         roles = {}
         for tname, tinfo in schema["tables"].items():
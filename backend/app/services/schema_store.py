@@ -0,0 +1,162 @@
+# backend/app/services/schema_store.py
+
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, Any, Optional, Tuple
+from sqlalchemy.engine import make_url
+
+from app.services.cache import connection_fingerprint
+from app.services.cache_backends import serialize_result, deserialize_result
+
+# Discovered schemas persisted per connection so restarted/other workers start warm
+SCHEMA_SNAPSHOT_PATH = os.getenv("SCHEMA_SNAPSHOT_PATH", "indexes/schema_snapshots.db")
+# Password for warm starting from a snapshot (stored URLs have it masked); DATABASE_URL also works
+SCHEMA_DB_PASSWORD = os.getenv("SCHEMA_DB_PASSWORD")
+
+
+def hide_password(connection_string: str) -> str:
+    """The connection URL with its password masked (unparseable strings are not stored)."""
+    try:
+        return make_url(connection_string).render_as_string(hide_password=True)
+    except Exception:
+        return ""
+
+
+class SchemaSnapshotStore:
+    """
+    On-disk schema snapshots keyed by connection fingerprint (SQLite in WAL mode,
+    shared by every worker on the host), plus which connection is active.
+    The connection URL is stored with its password masked; a fresh worker
+    gets the secret back from DATABASE_URL or SCHEMA_DB_PASSWORD. The file
+    and its WAL/shared-memory files are readable by the owner only.
+    """
+    def __init__(self, path: str = SCHEMA_SNAPSHOT_PATH):
+        self.path = path
+        self._local = threading.local()
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        # create the file owner-only before SQLite opens it (its -wal/-shm inherit the mode)
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_snapshots (
+                fingerprint TEXT PRIMARY KEY,
+                connection_string TEXT NOT NULL,
+                catalog_fingerprint TEXT,
+                snapshot BLOB NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # single row: the connection /connect-database last selected
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS active_connection (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                fingerprint TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._mask_stored_passwords()
+        self._restrict_permissions()
+
+    def _restrict_permissions(self):
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.chmod(self.path + suffix, 0o600)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[SchemaStore] Could not restrict permissions of {self.path + suffix}: {e}")
+
+    def _mask_stored_passwords(self):
+        """Rewrite rows saved before passwords were masked."""
+        conn = self._conn()
+        for fingerprint, connection_string in conn.execute(
+                "SELECT fingerprint, connection_string FROM schema_snapshots").fetchall():
+            masked = hide_password(connection_string)
+            if masked != connection_string:
+                conn.execute("UPDATE schema_snapshots SET connection_string = ? WHERE fingerprint = ?",
+                             (masked, fingerprint))
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; autocommit, waits on other writers."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, connection_string: str, snapshot: Dict[str, Any]):
+        """Persist a snapshot ({"schema": ..., plus any precomputed indexes})."""
+        catalog = (snapshot.get("schema") or {}).get("catalog") or {}
+        self._conn().execute(
+            "INSERT OR REPLACE INTO schema_snapshots "
+            "(fingerprint, connection_string, catalog_fingerprint, snapshot, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (connection_fingerprint(connection_string), hide_password(connection_string), catalog.get("fingerprint"),
+             serialize_result(snapshot), time.time()),
+        )
+
+    def load(self, connection_string: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT snapshot FROM schema_snapshots WHERE fingerprint = ?",
+            (connection_fingerprint(connection_string),),
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return deserialize_result(row[0])
+        except Exception as e:
+            print(f"[SchemaStore] Unreadable snapshot, ignoring it: {e}")
+            return None
+
+    def set_active(self, connection_string: str):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO active_connection (id, fingerprint, updated_at) VALUES (1, ?, ?)",
+            (connection_fingerprint(connection_string), time.time()),
+        )
+
+    def active_fingerprint(self) -> Optional[str]:
+        row = self._conn().execute("SELECT fingerprint FROM active_connection WHERE id = 1").fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _with_secret(fingerprint: str, masked: str) -> Optional[str]:
+        """
+        The full connection string behind a masked URL: the stored one when it
+        had no password, else DATABASE_URL or the URL with SCHEMA_DB_PASSWORD,
+        whichever matches the fingerprint it was saved under.
+        """
+        candidates = [masked, os.getenv("DATABASE_URL")]
+        if SCHEMA_DB_PASSWORD and masked:
+            candidates.append(make_url(masked).set(password=SCHEMA_DB_PASSWORD).render_as_string(hide_password=False))
+        for candidate in candidates:
+            if candidate and connection_fingerprint(candidate) == fingerprint:
+                return candidate
+        return None
+
+    def load_active(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(connection string, snapshot) of the active connection, if one was persisted."""
+        row = self._conn().execute("""
+            SELECT s.fingerprint, s.connection_string, s.snapshot
+              FROM active_connection a JOIN schema_snapshots s ON s.fingerprint = a.fingerprint
+             WHERE a.id = 1
+        """).fetchone()
+        if row is None:
+            return None
+        connection_string = self._with_secret(row[0], row[1])
+        if connection_string is None:
+            print(f"[SchemaStore] No password for {row[1] or row[0]}; set DATABASE_URL or SCHEMA_DB_PASSWORD "
+                  f"to warm start from its snapshot.")
+            return None
+        try:
+            return connection_string, deserialize_result(row[2])
+        except Exception as e:
+            print(f"[SchemaStore] Unreadable snapshot, ignoring it: {e}")
+            return None
+
+# singleton instance
+SCHEMA_STORE = SchemaSnapshotStore()
@@ -0,0 +1,137 @@
+# backend/app/services/search_filter.py
+
+import math
+import threading
+from array import array
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+from app.services.document_reader import doc_type_of
+
+
+def to_timestamp(value) -> Optional[float]:
+    """Epoch seconds of an ISO date/datetime (or datetime); None when not given."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}'; expected ISO format such as 2024-03-31 or 2024-03-31T12:00:00.")
+
+
+def _stored_timestamp(value) -> float:
+    # chunks indexed before ingested_at was recorded never match a date predicate
+    try:
+        return to_timestamp(value) if value else math.nan
+    except ValueError:
+        return math.nan
+
+
+class ChunkFilter:
+    """
+    Metadata predicates for document search: source file names, document
+    types (file extensions) and an ingestion time window
+    [ingested_after, ingested_before). Predicates left empty match everything.
+    """
+    def __init__(self, sources: Optional[List[str]] = None, doc_types: Optional[List[str]] = None,
+                 ingested_after=None, ingested_before=None):
+        self.sources = sorted(set(sources)) if sources else None
+        self.doc_types = sorted({t.lower().lstrip(".") for t in doc_types}) if doc_types else None
+        self.ingested_after = to_timestamp(ingested_after)
+        self.ingested_before = to_timestamp(ingested_before)
+
+    @property
+    def is_empty(self) -> bool:
+        return self.sources is None and self.doc_types is None and \
+            self.ingested_after is None and self.ingested_before is None
+
+    @property
+    def key(self) -> tuple:
+        return (tuple(self.sources or ()), tuple(self.doc_types or ()), self.ingested_after, self.ingested_before)
+
+    def to_dict(self) -> Dict[str, Any]:
+        def iso(ts: Optional[float]) -> Optional[str]:
+            return datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts is not None else None
+        return {
+            "sources": self.sources,
+            "doc_types": self.doc_types,
+            "ingested_after": iso(self.ingested_after),
+            "ingested_before": iso(self.ingested_before),
+        }
+
+    def where(self) -> Optional[Dict[str, Any]]:
+        """The same predicates as a Chroma `where` clause (None when empty)."""
+        clauses: List[Dict[str, Any]] = []
+        if self.sources is not None:
+            clauses.append({"source": {"$in": self.sources}})
+        if self.doc_types is not None:
+            clauses.append({"doc_type": {"$in": self.doc_types}})
+        if self.ingested_after is not None:
+            clauses.append({"ingested_ts": {"$gte": self.ingested_after}})
+        if self.ingested_before is not None:
+            clauses.append({"ingested_ts": {"$lt": self.ingested_before}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def mask(self, columns: "ChunkColumns") -> np.ndarray:
+        """Boolean mask over index positions of the chunks that pass every predicate."""
+        with columns.lock:
+            mask = np.ones(len(columns), dtype=bool)
+            if self.sources is not None:
+                mask &= np.isin(np.frombuffer(columns.source, dtype=np.int32), columns.lookup("source", self.sources))
+            if self.doc_types is not None:
+                mask &= np.isin(np.frombuffer(columns.doc_type, dtype=np.int32),
+                                columns.lookup("doc_type", self.doc_types))
+            if self.ingested_after is not None or self.ingested_before is not None:
+                ingested = np.frombuffer(columns.ingested, dtype=np.float64)
+                # NaN (unknown ingestion time) fails both comparisons
+                if self.ingested_after is not None:
+                    mask &= ingested >= self.ingested_after
+                if self.ingested_before is not None:
+                    mask &= ingested < self.ingested_before
+                del ingested  # release the view while the lock is still held
+            return mask
+
+
+class ChunkColumns:
+    """
+    Columnar copy of the filterable chunk metadata, one entry per index
+    position: sources and doc types as integer codes, ingestion times as
+    epoch seconds. Filters become a few vectorized comparisons instead of a
+    Python pass over every chunk dict. Append-only, like the index itself.
+    """
+    def __init__(self):
+        self.codes: Dict[str, Dict[str, int]] = {"source": {}, "doc_type": {}}
+        self.source = array("i")
+        self.doc_type = array("i")
+        self.ingested = array("d")
+        # arrays cannot grow while a filter holds NumPy views of them
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    def _code(self, column: str, value: str) -> int:
+        codes = self.codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+        return code
+
+    def lookup(self, column: str, values: List[str]) -> np.ndarray:
+        """Codes of the values seen so far (unknown values match nothing)."""
+        codes = self.codes[column]
+        return np.array([codes[v] for v in values if v in codes], dtype=np.int32)
+
+    def extend(self, chunks: List[Dict[str, Any]]):
+        with self.lock:
+            for chunk in chunks:
+                source = chunk.get("source", "")
+                self.source.append(self._code("source", source))
+                # older chunks carry no doc_type; it is derived from the file name the same way
+                self.doc_type.append(self._code("doc_type", chunk.get("doc_type") or doc_type_of(source)))
+                self.ingested.append(_stored_timestamp(chunk.get("ingested_at")))
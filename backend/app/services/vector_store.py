@@ -64,18 +64,21 @@
 # VECTOR_STORE = VectorStore()
 # backend/app/services/vector_store.py
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import os
-from sentence_transformers import SentenceTransformer
+import numpy as np
 import chromadb
 from chromadb.config import Settings
+from app.services.embedding_service import EMBEDDING_SERVICE, EmbeddingService
+from app.services.search_filter import to_timestamp
 
 PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "backend/app/chroma_store")
 CHROMA_COLLECTION_NAME = "documents"
 
 class VectorStore:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, embedder: EmbeddingService = EMBEDDING_SERVICE):
+        # shared, lazily loaded embedding model (no load at import time)
+        self.embedder = embedder
         os.makedirs(PERSIST_DIR, exist_ok=True)
         # NEW Chroma Persistent Client
         self.client = chromadb.PersistentClient(path=PERSIST_DIR)
@@ -84,36 +87,105 @@ class VectorStore:
         except Exception:
             self.col = self.client.create_collection(CHROMA_COLLECTION_NAME)
 
-    def embed_texts(self, texts: List[str]) -> List[List[float]]:
-        embs = self.model.encode(texts, convert_to_numpy=True, batch_size=32)
-        return embs.tolist()
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        # float32 rows handed to Chroma as-is (no per-float Python boxing)
+        return self.embedder.encode(texts, batch_size=32)
 
     def add_documents(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]):
         if not texts:
             return 0
-        emb = self.embed_texts(texts)
+        return self.add_embeddings(ids, texts, metadatas, self.embed_texts(texts))
+
+    def add_embeddings(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]], embeddings):
+        """Add documents whose embeddings were already computed by the caller."""
+        if not texts:
+            return 0
+        embeddings = np.asarray(embeddings, dtype=np.float32)
         # store id inside metadata to retrieve later
-        enriched_meta = [{"source": m.get("source", ""), "id": i} for m, i in zip(metadatas, ids)]
-        self.col.add(documents=texts, metadatas=enriched_meta, embeddings=emb, ids=ids)
+        enriched_meta = [self._metadata(m, i) for m, i in zip(metadatas, ids)]
+        self.col.add(documents=texts, metadatas=enriched_meta, embeddings=embeddings, ids=ids)
         return len(texts)
 
-    def query(self, query_text: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        q_emb = self.embed_texts([query_text])[0]
+    @staticmethod
+    def _metadata(meta: Dict[str, Any], chunk_id: str) -> Dict[str, Any]:
+        """Stored metadata: source, id and the filterable fields (Chroma rejects None values)."""
+        enriched = {"source": meta.get("source", ""), "id": chunk_id}
+        if meta.get("doc_type"):
+            enriched["doc_type"] = meta["doc_type"]
+        if meta.get("ingested_at"):
+            enriched["ingested_at"] = meta["ingested_at"]
+            # `where` range operators only compare numbers
+            enriched["ingested_ts"] = to_timestamp(meta["ingested_at"])
+        return enriched
+
+    def count(self) -> int:
+        return int(self.col.count())
+
+    def existing_ids(self, ids: List[str]) -> set:
+        """Subset of ids already stored in the collection."""
+        if not ids:
+            return set()
+        return set(self.col.get(ids=ids, include=[])["ids"])
+
+    def _hits(self, results: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [{"id": i, "text": text, "metadata": meta or {}}
+                for i, text, meta in zip(results["ids"], results["documents"], results["metadatas"])]
+
+    def get_by_ids(self, ids: List[str]) -> List[Dict[str, Any]]:
+        """Stored documents for the given ids (any order; unknown ids are skipped)."""
+        if not ids:
+            return []
+        return self._hits(self.col.get(ids=ids, include=["documents", "metadatas"]))
+
+    def ids_where(self, where: Dict[str, Any]) -> set:
+        """Ids of every stored document matching a `where` clause."""
+        return set(self.col.get(where=where, include=[])["ids"])
+
+    def get_all(self, page_size: int = 1000, start: int = 0) -> List[Dict[str, Any]]:
+        """Every stored document from insertion position start on, fetched a page at a time."""
+        docs: List[Dict[str, Any]] = []
+        while True:
+            page = self._hits(self.col.get(limit=page_size, offset=start + len(docs),
+                                           include=["documents", "metadatas"]))
+            docs.extend(page)
+            if len(page) < page_size:
+                return docs
+
+    def query(self, query_text: str, top_k: int = 5, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        q_emb = self.embedder.embed_query(query_text)
+        return self.query_by_embedding(q_emb, top_k=top_k, where=where)
+
+    def query_by_embedding(self, q_emb: np.ndarray, top_k: int = 5,
+                           where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Search with a precomputed query vector (e.g. from the embedding batcher)."""
+        q_emb = np.asarray(q_emb, dtype=np.float32).reshape(1, -1)
+        return self.query_by_embeddings(q_emb, top_k=top_k, where=where)[0]
+
+    def query_by_embeddings(self, q_embs: np.ndarray, top_k: int = 5,
+                            where: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Search with a batch of query vectors (one row each). `where` filters on
+        stored metadata (source, doc_type, ingested_ts) inside Chroma.
+        """
         results = self.col.query(
-            query_embeddings=[q_emb],
+            query_embeddings=np.asarray(q_embs, dtype=np.float32),
             n_results=top_k,
+            where=where,
             include=["documents", "metadatas", "distances"]  # no "ids"
         )
 
-        docs = []
-        for i in range(len(results["documents"][0])):
-            docs.append({
-                "id": results["metadatas"][0][i].get("id"),
-                "text": results["documents"][0][i],
-                "metadata": results["metadatas"][0][i],
-                "distance": results["distances"][0][i]
-            })
-        return docs
+        batches = []
+        for documents, metadatas, distances in zip(results["documents"], results["metadatas"], results["distances"]):
+            docs = []
+            for text, meta, distance in zip(documents, metadatas, distances):
+                docs.append({
+                    "id": meta.get("id"),
+                    "text": text,
+                    "metadata": meta,
+                    "distance": distance
+                })
+            batches.append(docs)
+        return batches
 
 # singleton instance
 VECTOR_STORE = VectorStore()
@@ -0,0 +1,11 @@
+# backend/tests/conftest.py
+
+import os
+import tempfile
+
+# keep the module-level singletons (index, caches, snapshots) out of the real indexes/ directory
+_TMP = tempfile.mkdtemp(prefix="nlp-query-engine-tests-")
+os.environ.setdefault("FAISS_INDEX_DIR", os.path.join(_TMP, "indexes"))
+os.environ.setdefault("QUERY_CACHE_BACKEND", "memory")
+os.environ.setdefault("SCHEMA_SNAPSHOT_PATH", os.path.join(_TMP, "schema_snapshots.db"))
+os.environ.setdefault("INGEST_JOB_STORE_PATH", os.path.join(_TMP, "ingestion_jobs.db"))
@@ -0,0 +1,26 @@
+# backend/tests/test_cache_backends.py
+
+import pytest
+
+from app.services.cache_backends import MemoryCacheBackend, SQLiteCacheBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteCacheBackend(100, 1 << 20, path=str(tmp_path / "cache.db"))
+    return MemoryCacheBackend(100, 1 << 20)
+
+
+def test_get_returns_result_and_deps(backend):
+    backend.set("q", {"doc_results": [1, 2]}, ttl_seconds=60, query_type="doc", deps={"docs": "3"})
+    assert backend.get("q") == ({"doc_results": [1, 2]}, {"docs": "3"})
+    # no deps still comes back as an empty dict, not None
+    backend.set("q2", {"sql_results": []}, ttl_seconds=60)
+    assert backend.get("q2") == ({"sql_results": []}, {})
+    assert backend.get("missing") is None
+
+
+def test_expired_entries_are_not_returned(backend):
+    backend.set("q", {"doc_results": []}, ttl_seconds=0)
+    assert backend.get("q") is None
@@ -0,0 +1,57 @@
+# backend/tests/test_chunker.py
+
+from app.services.chunker import TokenChunker
+
+
+class WordCounter:
+    """One token per whitespace-separated word, so budgets are easy to reason about."""
+    def counts(self, texts):
+        return [len(t.split()) for t in texts]
+
+
+def sentences(n):
+    return " ".join(f"Sentence number {i} has exactly seven words." for i in range(n))
+
+
+def chunk(text, target=20, overlap=7, parts=1):
+    chunker = TokenChunker(WordCounter(), target_tokens=target, overlap_tokens=overlap)
+    step = max(len(text) // parts, 1)
+    pieces = []
+    for start in range(0, len(text), step):
+        pieces.extend(chunker.feed(text[start:start + step]))
+    return pieces + chunker.close()
+
+
+def test_chunks_stay_within_budget():
+    pieces = chunk(sentences(30), target=20, overlap=7)
+    assert len(pieces) > 1
+    for text, tokens in pieces:
+        assert tokens <= 20
+        assert tokens == len(text.split())
+
+
+def test_long_sentence_is_split_at_word_boundaries():
+    text = " ".join(f"w{i}" for i in range(55)) + "."
+    pieces = chunk(text, target=20, overlap=0)
+    assert [tokens for _, tokens in pieces] == [20, 20, 15]
+    assert " ".join(t for t, _ in pieces) == text
+
+
+def test_overlap_carries_trailing_sentences():
+    pieces = chunk(sentences(12), target=21, overlap=7)
+    for (prev, _), (nxt, _) in zip(pieces, pieces[1:]):
+        last_sentence = prev.split(". ")[-1].rstrip(".")
+        assert nxt.startswith(last_sentence)
+
+
+def test_no_overlap_when_disabled():
+    pieces = chunk(sentences(12), target=21, overlap=0)
+    words = [w for text, _ in pieces for w in text.split()]
+    assert words == sentences(12).split()
+
+
+def test_split_feeds_match_single_feed():
+    text = sentences(25) + "\nA line on its own\n\nAnother paragraph here."
+    whole = chunk(text)
+    for parts in (2, 7, 50, len(text)):
+        assert chunk(text, parts=parts) == whole
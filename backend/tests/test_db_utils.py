@@ -0,0 +1,57 @@
+# backend/tests/test_db_utils.py
+
+import csv
+import io
+
+from sqlalchemy import create_engine, text
+
+from app.services.db_utils import _copy_field, ensure_documents_table, insert_documents
+
+
+def legacy_documents_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'docs.db'}", future=True)
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE documents (
+                id SERIAL PRIMARY KEY,
+                content TEXT,
+                source_file TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        conn.execute(text("INSERT INTO documents (content, source_file) VALUES ('a', 'f'), ('a', 'f'), ('b', 'f')"))
+    return engine
+
+
+def test_documents_table_upgrades_on_sqlite(tmp_path):
+    engine = legacy_documents_engine(tmp_path)
+    ensure_documents_table(engine)
+    ensure_documents_table(engine)
+    with engine.connect() as conn:
+        columns = [row[1] for row in conn.execute(text("PRAGMA table_info(documents)"))]
+    assert "content_hash" in columns
+
+
+def test_rows_from_before_the_upgrade_are_not_inserted_again(tmp_path):
+    engine = legacy_documents_engine(tmp_path)
+    ensure_documents_table(engine)
+    inserted = insert_documents(engine, [{"text": "a", "source": "f"}, {"text": "b", "source": "f"},
+                                         {"text": "c", "source": "f"}])
+    assert inserted == 1
+    with engine.connect() as conn:
+        hashed = conn.execute(text("SELECT COUNT(*) FROM documents WHERE content_hash IS NOT NULL")).scalar()
+    # the stored duplicate of 'a' keeps a NULL hash
+    assert hashed == 3
+
+
+def test_copy_field_keeps_null_and_empty_string_apart():
+    # COPY csv: a bare empty field is NULL, a quoted one is ''
+    assert _copy_field(None) == ""
+    assert _copy_field("") == '""'
+    assert _copy_field(0) == '"0"'
+
+
+def test_copy_fields_survive_quotes_commas_and_newlines():
+    values = ['say "hi"', "a,b", "line one\nline two", "\r\n"]
+    line = ",".join(_copy_field(v) for v in values) + "\n"
+    assert next(csv.reader(io.StringIO(line, newline=""))) == values
@@ -0,0 +1,40 @@
+# backend/tests/test_keyword_matcher.py
+
+import random
+
+from app.services.keyword_matcher import KeywordMatcher
+
+
+def naive(keywords, text):
+    return {label for kw, label in keywords.items() if kw.lower() in text.lower()}
+
+
+def test_overlapping_and_nested_keywords_are_all_found():
+    keywords = {"he": "a", "she": "b", "his": "c", "hers": "d"}
+    matcher = KeywordMatcher(keywords)
+    # "ushers" holds she, he and hers, overlapping one another
+    assert matcher.labels("ushers") == {"a", "b", "d"}
+    assert matcher.labels("this") == {"c"}
+    assert matcher.labels("nothing here") == {"a"}
+
+
+def test_keyword_reached_only_through_a_failure_link():
+    # "abcd" fails after "abc" into "bc"; "bcx" must still match from there
+    matcher = KeywordMatcher({"abcd": "long", "bcx": "short"})
+    assert matcher.labels("abcx") == {"short"}
+    assert matcher.labels("abcd") == {"long"}
+
+
+def test_matching_is_case_insensitive_and_multiword():
+    matcher = KeywordMatcher({"how many": "sql", "Who": "doc"})
+    assert matcher.labels("HOW MANY engineers, and WHO leads them?") == {"sql", "doc"}
+    assert matcher.labels("how  many") == set()
+
+
+def test_agrees_with_substring_search():
+    rng = random.Random(0)
+    keywords = {"".join(rng.choice("abc") for _ in range(rng.randint(1, 4))): str(i) for i in range(12)}
+    matcher = KeywordMatcher(keywords)
+    for _ in range(300):
+        text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 12)))
+        assert matcher.labels(text) == naive(keywords, text)
@@ -0,0 +1,59 @@
+# backend/tests/test_lexical_index.py
+
+import numpy as np
+
+from app.services.lexical_index import LexicalIndex
+
+
+def build(texts):
+    index = LexicalIndex()
+    index.add([{"chunk_id": f"c{i}", "text": t} for i, t in enumerate(texts)])
+    return index
+
+
+def test_bm25_ranks_by_term_frequency_and_rarity():
+    index = build([
+        "invoice total for the quarter",
+        "invoice invoice invoice overdue",
+        "quarterly report with no matching words",
+        "overdue invoice reminder",
+    ])
+    ranked = [chunk_id for chunk_id, _ in index.search("overdue invoice", top_k=10)]
+    # both terms beat one term; more occurrences beat fewer
+    assert ranked[:2] == ["c1", "c3"]
+    assert ranked[2] == "c0"
+    # chunks sharing no term with the query are left out
+    assert "c2" not in ranked
+
+
+def test_scores_are_descending_and_top_k_is_respected():
+    index = build([f"alpha {'beta ' * i}" for i in range(10)])
+    hits = index.search("beta", top_k=3)
+    assert len(hits) == 3
+    scores = [score for _, score in hits]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_adding_the_same_chunk_twice_is_ignored():
+    index = build(["alpha beta"])
+    assert index.add([{"chunk_id": "c0", "text": "alpha beta"}]) == 0
+    assert len(index) == 1
+
+
+def test_mask_restricts_results():
+    index = build(["apple pie", "apple tart", "apple crumble", "pear tart"])
+    mask = index.mask_for({"c1", "c3"})
+    assert mask.tolist() == [False, True, False, True]
+    assert [c for c, _ in index.search("apple tart", top_k=10, mask=mask)] == ["c1", "c3"]
+
+
+def test_chunks_added_after_the_mask_are_excluded():
+    index = build(["apple pie", "apple tart"])
+    mask = index.mask_for({"c0", "c1"})
+    index.add([{"chunk_id": "c2", "text": "apple apple apple"}])
+    assert {c for c, _ in index.search("apple", top_k=10, mask=mask)} == {"c0", "c1"}
+
+
+def test_empty_mask_matches_nothing():
+    index = build(["apple pie"])
+    assert index.search("apple", mask=np.zeros(1, dtype=bool)) == []
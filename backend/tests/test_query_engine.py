@@ -0,0 +1,59 @@
+# backend/tests/test_query_engine.py
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.services.query_engine import QueryEngine
+
+
+def engine_over(tmp_path, rows, primary_key=("id",)):
+    url = f"sqlite:///{tmp_path / 'people.db'}"
+    with create_engine(url, future=True).begin() as conn:
+        conn.execute(text("CREATE TABLE employees (id INTEGER PRIMARY KEY, name TEXT)"))
+        for i in range(1, rows + 1):
+            conn.execute(text("INSERT INTO employees (id, name) VALUES (:id, :name)"), {"id": i, "name": f"e{i}"})
+    schema = {
+        "tables": {"employees": {"columns": [{"name": "id"}, {"name": "name"}], "primary_key": list(primary_key)}},
+        "inferences": {"employees": "employees"},
+    }
+    return QueryEngine(url, schema)
+
+
+def page(qe, limit, offset=0, after=None):
+    sql, params = qe.generate_sql("list employees", limit, offset, after=after)
+    return qe._sql_outcome(qe.run_sql(sql, params), params, 0.0)
+
+
+def test_keyset_page_seeks_past_the_cursor(tmp_path):
+    qe = engine_over(tmp_path, 0)
+    sql, params = qe.generate_sql("list employees", 10, 30, after=7)
+    assert sql == 'SELECT * FROM employees WHERE id > :after ORDER BY id LIMIT :limit'
+    # the cursor replaces the offset; one extra row is fetched to detect a next page
+    assert params == {"after": 7, "limit": 11, "page_rows": 10}
+
+
+def test_without_a_single_column_key_pages_by_offset(tmp_path):
+    qe = engine_over(tmp_path, 0, primary_key=())
+    sql, params = qe.generate_sql("list employees", 10, 30, after=7)
+    assert sql == "SELECT * FROM employees LIMIT :limit OFFSET :offset"
+    assert params == {"limit": 11, "offset": 30, "page_rows": 10}
+
+
+@pytest.mark.parametrize("rows, has_more", [(4, False), (5, False), (6, True)])
+def test_has_more_only_when_rows_remain(tmp_path, rows, has_more):
+    out = page(engine_over(tmp_path, rows), 5)
+    assert len(out["sql_results"]) == min(rows, 5)
+    assert out["sql_page"]["has_more"] is has_more
+    assert out["sql_page"]["next_after"] == (5 if has_more else None)
+
+
+def test_following_next_after_walks_every_row_once(tmp_path):
+    qe = engine_over(tmp_path, 12)
+    seen, after = [], None
+    while True:
+        out = page(qe, 5, after=after)
+        seen += [row["id"] for row in out["sql_results"]]
+        if not out["sql_page"]["has_more"]:
+            break
+        after = out["sql_page"]["next_after"]
+    assert seen == list(range(1, 13))
@@ -0,0 +1,89 @@
+# backend/tests/test_retrieval.py
+
+import numpy as np
+
+from app.services.retrieval import RRF_K, RetrievalBackend, RetrievalEngine
+
+
+class StaticBackend(RetrievalBackend):
+    """An in-memory backend: chunks in insertion order, no vectors."""
+    name = "static"
+
+    def __init__(self, chunk_ids):
+        self.chunks = {c: {"id": c, "chunk_id": c, "text": c, "source": "s.txt", "metadata": {}, "distance": None}
+                       for c in chunk_ids}
+
+    def add(self, chunks, embeddings):
+        new = [c for c in chunks if c["chunk_id"] not in self.chunks]
+        for c in new:
+            self.chunks[c["chunk_id"]] = {"id": c["chunk_id"], "chunk_id": c["chunk_id"], "text": c["text"],
+                                          "source": "s.txt", "metadata": {}, "distance": None}
+        return [c["chunk_id"] for c in new]
+
+    def existing_ids(self, chunk_ids):
+        return {c for c in chunk_ids if c in self.chunks}
+
+    def iter_chunks(self, start=0):
+        return [{"chunk_id": c, "text": d["text"]} for c, d in self.chunks.items()][start:]
+
+    def get_chunks(self, chunk_ids):
+        return [dict(self.chunks[c]) for c in chunk_ids if c in self.chunks]
+
+    def filter_ids(self, filters):
+        return None
+
+    def search(self, qvec, top_k=5, nprobe=None, ef_search=None, filters=None):
+        return []
+
+    def count(self):
+        return len(self.chunks)
+
+
+def dense_hits(chunk_ids):
+    return [{"id": c, "chunk_id": c, "text": c, "source": "s.txt", "metadata": {}, "distance": float(i)}
+            for i, c in enumerate(chunk_ids)]
+
+
+def test_rrf_prefers_chunks_ranked_by_both_lists():
+    engine = RetrievalEngine(backend=StaticBackend(["a", "b", "c", "d"]))
+    fused = engine._fuse(dense_hits(["a", "b", "c"]), [("c", 9.0), ("d", 5.0), ("a", 1.0)], top_k=4)
+    assert [d["chunk_id"] for d in fused] == ["a", "c", "b", "d"]
+    assert fused[0]["score"] == round(1 / (RRF_K + 1) + 1 / (RRF_K + 3), 6)
+    assert fused[0]["matched_by"] == ["dense", "lexical"]
+    assert fused[2]["matched_by"] == ["dense"]
+    assert fused[3]["matched_by"] == ["lexical"]
+
+
+def test_rrf_fetches_lexical_only_hits_from_the_backend():
+    engine = RetrievalEngine(backend=StaticBackend(["x", "y"]))
+    fused = engine._fuse([], [("y", 2.0), ("x", 1.0), ("gone", 0.5)], top_k=5)
+    # ids the backend no longer has are dropped
+    assert [d["chunk_id"] for d in fused] == ["y", "x"]
+    assert all(d["text"] == d["chunk_id"] for d in fused)
+
+
+def test_rrf_respects_top_k():
+    engine = RetrievalEngine(backend=StaticBackend([]))
+    fused = engine._fuse(dense_hits(["a", "b", "c"]), [("b", 1.0)], top_k=2)
+    assert [d["chunk_id"] for d in fused] == ["b", "a"]
+
+
+def test_lexical_index_is_built_once_and_caught_up_incrementally():
+    backend = StaticBackend(["alpha", "beta"])
+    engine = RetrievalEngine(backend=backend)
+    index = engine.build_lexical()
+    assert len(index) == 2
+    # another worker appended to the shared backend
+    backend.add([{"chunk_id": "gamma", "text": "gamma"}], None)
+    assert engine.lexical is index and len(index) == 3
+    engine.index_chunks([{"chunk_id": "delta", "text": "delta"}], np.zeros((1, 4), dtype=np.float32))
+    assert engine._lexical is index and len(index) == 4
+    assert [c for c, _ in engine.lexical.search("delta")] == ["delta"]
+
+
+def test_lexical_index_is_rebuilt_when_the_backend_shrinks():
+    backend = StaticBackend(["alpha", "beta"])
+    engine = RetrievalEngine(backend=backend)
+    index = engine.build_lexical()
+    backend.chunks.pop("beta")
+    assert engine.lexical is not index and len(engine.lexical) == 1
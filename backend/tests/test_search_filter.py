@@ -0,0 +1,52 @@
+# backend/tests/test_search_filter.py
+
+import pytest
+
+from app.services.search_filter import ChunkColumns, ChunkFilter
+
+CHUNKS = [
+    {"source": "a.pdf", "doc_type": "pdf", "ingested_at": "2024-01-10T00:00:00"},
+    {"source": "b.txt", "doc_type": "txt", "ingested_at": "2024-02-10T00:00:00"},
+    # indexed before doc_type / ingested_at were stored
+    {"source": "c.PDF"},
+    {"source": "a.pdf", "doc_type": "pdf", "ingested_at": "2024-03-01T00:00:00"},
+]
+
+
+def selected(chunk_filter):
+    columns = ChunkColumns()
+    columns.extend(CHUNKS)
+    return [i for i, keep in enumerate(chunk_filter.mask(columns)) if keep]
+
+
+def test_empty_filter_selects_everything():
+    assert ChunkFilter().is_empty
+    assert selected(ChunkFilter()) == [0, 1, 2, 3]
+
+
+def test_predicates_combine_with_and():
+    assert selected(ChunkFilter(sources=["a.pdf"])) == [0, 3]
+    # doc types are normalized; the legacy chunk's type comes from its file name
+    assert selected(ChunkFilter(doc_types=[".PDF"])) == [0, 2, 3]
+    assert selected(ChunkFilter(sources=["a.pdf", "b.txt"], doc_types=["txt"])) == [1]
+    assert selected(ChunkFilter(sources=["missing.pdf"])) == []
+
+
+def test_time_window_is_half_open_and_skips_unknown_times():
+    window = ChunkFilter(ingested_after="2024-02-10", ingested_before="2024-03-01")
+    assert selected(window) == [1]
+    assert selected(ChunkFilter(ingested_after="2024-01-01")) == [0, 1, 3]
+
+
+def test_where_clause_matches_the_mask_predicates():
+    chunk_filter = ChunkFilter(sources=["b.txt"], ingested_before="2024-03-01")
+    assert chunk_filter.where() == {"$and": [
+        {"source": {"$in": ["b.txt"]}},
+        {"ingested_ts": {"$lt": chunk_filter.ingested_before}},
+    ]}
+    assert ChunkFilter().where() is None
+
+
+def test_invalid_dates_are_rejected():
+    with pytest.raises(ValueError):
+        ChunkFilter(ingested_after="last tuesday")
@@ -38,7 +38,22 @@ export default function DocumentUploader() {
           'Content-Type': 'multipart/form-data', 
         },
       });
-      setStatusMsg(`Ingestion successful. Processed ${res.data.processed_chunks} chunks.`);
+      // Ingestion runs as a background job; poll until it finishes
+      const jobUrl = `/api/ingestion-jobs/${res.data.job_id}`;
+      let job = res.data;
+      while (job.status !== 'completed' && job.status !== 'failed') {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        job = (await axios.get(jobUrl)).data;
+        const running = Object.entries(job.stages || {}).find(([, s]) => s.status === 'running');
+        if (running) {
+          setStatusMsg(`Ingesting: ${running[0]} (${Math.round(running[1].progress * 100)}%)`);
+        }
+      }
+      if (job.status === 'failed') {
+        setStatusMsg(`Ingestion Error: ${job.error}`);
+        return;
+      }
+      setStatusMsg(`Ingestion successful. Processed ${job.result.processed_chunks} chunks.`);
       setFiles([]); // Clear files after successful upload
     } catch (e) {
       setStatusMsg(`Upload Error: ${e.response?.data?.detail || e.message}`);